@@ -0,0 +1,49 @@
+"""
+Render time of a DX7 bank with `BankRenderer`: all voices in one call against one call per voice.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.bank_benchmark
+"""
+import argparse
+import json
+import os
+
+from neural_synth_modeler.benchmark.pipeline_benchmark import measure
+from neural_synth_modeler.converter.dexed.dexed_converter import DexedConverter
+from neural_synth_modeler.inferencer.dexed.bank_renderer import BankRenderer, decode_voices
+
+BANK = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../inferencer/dexed/Dexed_01.syx")
+
+
+def run(syx_path, durations, repeats):
+    renderer = BankRenderer()
+    voices = decode_voices(DexedConverter().serializeToDict(syx_path))
+    single = [{k: v[i:i + 1] for k, v in voices.items()} for i in range(len(voices["alg"]))]
+    results = {}
+    for duration_secs in durations:
+        batched = measure(lambda: renderer.render(voices, duration_secs=duration_secs), repeats)
+        sequential = measure(lambda: [renderer.render(v, duration_secs=duration_secs) for v in single], repeats)
+        results["{}s".format(duration_secs)] = {
+            "voices": len(single),
+            "batched_ms": batched["p50_ms"],
+            "sequential_ms": sequential["p50_ms"],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--syx-path", default=BANK)
+    parser.add_argument("--durations", nargs="+", type=float, default=[0.5, 1.0, 4.0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.syx_path, args.durations, args.repeats)
+    print("{:<8} {:>8} {:>12} {:>15} {:>8}".format("clip", "voices", "batched ms", "sequential ms", "x"))
+    for key, r in results.items():
+        print("{:<8} {:>8} {:>12.2f} {:>15.2f} {:>8.2f}".format(
+            key, r["voices"], r["batched_ms"], r["sequential_ms"], r["sequential_ms"] / r["batched_ms"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
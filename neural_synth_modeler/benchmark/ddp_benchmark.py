@@ -0,0 +1,123 @@
+"""
+Data-parallel scaling of WTSv2 and DDX7 training on CPU (gloo), from 1 to N processes.
+
+Weak scaling: every rank trains `--steps` steps of `--batch-size` per epoch on its own shard of synthetic data,
+so n processes see n times the samples. Each run trains two epochs and reports the second one; samples/s
+are counted over all ranks, efficiency is samples/s relative to n times the 1-process run. Every rank
+uses cpu_count // n intra-op threads.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.ddp_benchmark --model ddx7 --nprocs 1 2 4 8
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import h5py
+import numpy as np
+import torch
+import yaml
+from torch.utils.data import Subset
+
+from neural_synth_modeler.benchmark.loader_benchmark import write_synthetic_dataset
+from neural_synth_modeler.inferencer.dexed.models.ddx7.data_utils.h5_dataset import h5RowDataset
+from neural_synth_modeler.train.vital.datasets import VitalFeatureShardDataset, pack_features
+from neural_synth_modeler.utils.distributed import cleanup, init, is_main_process, launch, shard_sampler
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../inferencer/vital/config.yaml")
+
+
+def write_synthetic_rows(path, n, duration_secs=1.0, sr=16000, hop=64, seed=0):
+    """
+    h5RowDataset file of n decaying sines with matching f0 / loudness / rms frames
+    """
+    rng = np.random.default_rng(seed)
+    n_frames = int(duration_secs * sr) // hop
+    t = np.arange(n_frames * hop) / sr
+    with h5py.File(path, "w") as h5f:
+        h5f.attrs["layout"] = "rows"
+        audio = h5f.create_dataset("audio", (n, len(t)), dtype=np.float32)
+        f0 = h5f.create_dataset("f0", (n, n_frames), dtype=np.float32)
+        loudness = h5f.create_dataset("loudness", (n, n_frames), dtype=np.float32)
+        rms = h5f.create_dataset("rms", (n, n_frames), dtype=np.float32)
+        for i in range(n):
+            hz = rng.uniform(110, 880)
+            audio[i] = 0.5 * np.sin(2 * np.pi * hz * t) * np.exp(-t)
+            f0[i] = hz
+            frame_t = np.arange(n_frames) * hop / sr
+            loudness[i] = -20 - 20 * frame_t
+            rms[i] = -10 - 20 * frame_t
+    return path
+
+
+def make_trainer(model_name, dataset, batch_size, rank, world_size):
+    sampler = shard_sampler(dataset, shuffle=True) if world_size > 1 else None
+    if model_name == "vital":
+        from neural_synth_modeler.train.vital.trainer import Trainer, build_model, make_loader
+        with open(CONFIG_PATH) as f:
+            config = yaml.safe_load(f)
+        loader = make_loader(dataset, batch_size, shuffle=True, sampler=sampler)
+        return Trainer(build_model(config, "cpu"), loader, train_config=config["train"])
+    from neural_synth_modeler.train.dexed.trainer import DDX7Trainer, build_model, load_recipe, make_loader
+    loader = make_loader(dataset, batch_size, shuffle=True, sampler=sampler)
+    return DDX7Trainer(build_model(load_recipe("model", "tcnres_f0ld_fmstr_noreverb")), loader)
+
+
+def worker(rank, world_size, model_name, data_path, batch_size, steps, result_path):
+    init(rank, world_size)
+    if model_name == "vital":
+        dataset = VitalFeatureShardDataset(data_path)
+    else:
+        dataset = h5RowDataset(16000, data_path, ["audio", "f0", "loudness", "rms"])
+    dataset = Subset(dataset, range(batch_size * steps * world_size))
+    torch.manual_seed(0)
+    trainer = make_trainer(model_name, dataset, batch_size, rank, world_size)
+    trainer.train_epoch()
+    stats = trainer.train_epoch()
+    if is_main_process():
+        with open(result_path, "w") as f:
+            json.dump({k: stats[k] for k in ["steps_per_sec", "samples_per_sec", "train_loss"]}, f)
+    cleanup()
+
+
+def run(model_name, nprocs, batch_size, steps):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        n_items = batch_size * steps * max(nprocs)
+        if model_name == "vital":
+            audio_dir, param_dir = os.path.join(tmp_dir, "audio"), os.path.join(tmp_dir, "params")
+            write_synthetic_dataset(audio_dir, param_dir, n_items)
+            data_path = os.path.join(tmp_dir, "shards")
+            pack_features(audio_dir, param_dir, data_path)
+        else:
+            data_path = write_synthetic_rows(os.path.join(tmp_dir, "rows.h5"), n_items)
+
+        result_path = os.path.join(tmp_dir, "result.json")
+        for n in nprocs:
+            launch(worker, n, model_name, data_path, batch_size, steps, result_path)
+            with open(result_path) as f:
+                results[n] = json.load(f)
+    base = results[nprocs[0]]["samples_per_sec"] / nprocs[0]
+    for n, r in results.items():
+        r["efficiency"] = r["samples_per_sec"] / (base * n)
+    return {"model": model_name, "cpu_count": os.cpu_count(), "runs": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="ddx7", choices=["ddx7", "vital"])
+    parser.add_argument("--nprocs", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--batch-size", type=int, default=4, help="per rank")
+    parser.add_argument("--steps", type=int, default=4, help="optimizer steps per epoch and rank")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.model, args.nprocs, args.batch_size, args.steps)
+    print("{:<8} {:>10} {:>12} {:>11}".format("procs", "steps/s", "samples/s", "efficiency"))
+    for n, r in results["runs"].items():
+        print("{:<8} {:>10.3f} {:>12.2f} {:>11.2f}".format(n, r["steps_per_sec"], r["samples_per_sec"],
+                                                          r["efficiency"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
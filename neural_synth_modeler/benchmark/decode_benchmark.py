@@ -0,0 +1,56 @@
+"""
+Decode + resample latency of `load_audio` against `librosa.load(fname, sr=16000)` with librosa 0.9's default
+resampler (kaiser_best), over WAV / FLAC clips at 16 / 44.1 / 48 kHz.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.decode_benchmark
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from neural_synth_modeler.benchmark.pipeline_benchmark import measure
+from neural_synth_modeler.utils.audio import load_audio, write_synthetic_audio
+
+SR = 16000
+CLIPS = [(16000, "PCM_16", "WAV"), (44100, "PCM_16", "WAV"), (48000, "FLOAT", "WAV"), (44100, "PCM_16", "FLAC")]
+
+
+def run(duration_secs, repeats, resamplers):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for sr, subtype, fmt in CLIPS:
+            fname = os.path.join(tmp_dir, "clip_{}.{}".format(sr, fmt.lower()))
+            y, _ = librosa.load(write_synthetic_audio(os.path.join(tmp_dir, "src.wav"), duration_secs, sr=sr), sr=None)
+            sf.write(fname, np.stack([y, y], axis=1), sr, subtype=subtype, format=fmt)
+
+            key = "{}_{}_{}".format(fmt.lower(), sr, subtype.lower())
+            results[key] = {"librosa_kaiser_best_ms": measure(
+                lambda: librosa.load(fname, sr=SR, res_type="kaiser_best"), repeats)["p50_ms"]}
+            for resampler in resamplers:
+                results[key]["load_audio_{}_ms".format(resampler)] = measure(
+                    lambda: load_audio(fname, SR, resampler=resampler), repeats)["p50_ms"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=4)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--resamplers", nargs="+", default=["polyphase", "soxr_hq"])
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.duration, args.repeats, args.resamplers)
+    columns = list(next(iter(results.values())).keys())
+    print("{:<20}".format("clip") + "".join("{:>28}".format(c) for c in columns))
+    for key, r in results.items():
+        print("{:<20}".format(key) + "".join("{:>28.2f}".format(r[c]) for c in columns))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
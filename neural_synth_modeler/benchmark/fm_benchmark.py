@@ -0,0 +1,71 @@
+"""
+Render time of the FM operator graph engine (`ddx7/fm_graph.py`) against the hand-coded fm_* synths of `ddx7/core.py`,
+without autograd: the graph with the same phase wrapping (`exact=True`, identical output), and with the shared phase
+wrapped once (`wrap_omega`, what FMSynth uses).
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.fm_benchmark
+"""
+import argparse
+import json
+
+import torch
+
+from neural_synth_modeler.benchmark.pipeline_benchmark import measure
+from neural_synth_modeler.inferencer.dexed.models.ddx7 import core
+from neural_synth_modeler.inferencer.dexed.models.ddx7.fm_graph import fm_synth
+
+HAND_CODED = {
+    'fmstrings': core.fm_string_synth,
+    'fmflute': core.fm_flute_synth,
+    'fmbrass': core.fm_brass_synth,
+    'fmablbrass': core.fm_ablbrass_synth,
+    '2stack2': core.fm_2stack2,
+    '1stack2': core.fm_1stack2,
+    '1stack4': core.fm_1stack4,
+}
+FR = torch.tensor([1, 1, 1, 1, 3, 14])
+SAMPLE_RATE = 16000
+
+
+def run(synths, batch_sizes, seconds, repeats):
+    results = {}
+    for batch_size in batch_sizes:
+        length = int(seconds * SAMPLE_RATE)
+        pitch = (100 + 400 * torch.rand(batch_size, 1, 1)).expand(batch_size, length, 1).contiguous()
+        ol = 2 * torch.rand(batch_size, length, 6)
+        for name in synths:
+            graph = fm_synth(name, exact=True)
+            fast = fm_synth(name)
+            with torch.no_grad():
+                assert torch.equal(graph(pitch, ol, FR, SAMPLE_RATE, 2), HAND_CODED[name](pitch, ol, FR, SAMPLE_RATE, 2))
+                hand_coded = measure(lambda: HAND_CODED[name](pitch, ol, FR, SAMPLE_RATE, 2), repeats)
+                exact = measure(lambda: graph(pitch, ol, FR, SAMPLE_RATE, 2), repeats)
+                wrap_omega = measure(lambda: fast(pitch, ol, FR, SAMPLE_RATE, 2), repeats)
+            results["{}_b{}".format(name, batch_size)] = {
+                "hand_coded_ms": hand_coded["p50_ms"],
+                "graph_ms": exact["p50_ms"],
+                "graph_wrap_omega_ms": wrap_omega["p50_ms"],
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synths", nargs="+", default=list(HAND_CODED))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8])
+    parser.add_argument("--seconds", type=float, default=4.0)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.synths, args.batch_sizes, args.seconds, args.repeats)
+    print("{:<16} {:>14} {:>10} {:>8} {:>16} {:>8}".format(
+        "synth", "hand-coded ms", "graph ms", "x", "wrap omega ms", "x"))
+    for key, r in results.items():
+        print("{:<16} {:>14.2f} {:>10.2f} {:>8.2f} {:>16.2f} {:>8.2f}".format(
+            key, r["hand_coded_ms"], r["graph_ms"], r["hand_coded_ms"] / r["graph_ms"],
+            r["graph_wrap_omega_ms"], r["hand_coded_ms"] / r["graph_wrap_omega_ms"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
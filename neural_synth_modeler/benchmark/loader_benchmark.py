@@ -0,0 +1,106 @@
+"""
+Training data loader throughput: `VitalAudioParamDataset` (WAV decode + pickled feature dict per sample) against
+`VitalFeatureShardDataset` (packed memory-mapped shards), over a synthetic dataset of 4s samples.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.loader_benchmark --samples 256 --workers 0 2
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+from neural_synth_modeler.train.vital.datasets import (
+    ShardShuffleSampler, VitalAudioParamDataset, VitalFeatureShardDataset, pack_features
+)
+from neural_synth_modeler.utils.audio import write_synthetic_audio
+
+SR = 16000
+DURATION_SECS = 4
+BLOCK_SIZE = 160
+N_MFCC = 30
+
+
+def write_synthetic_dataset(audio_dir, param_dir, n_samples):
+    """
+    WAVs and feature dicts shaped like the WTSv2 training data
+    """
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(param_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    n_frames = SR * DURATION_SECS // BLOCK_SIZE
+    for i in range(n_samples):
+        write_synthetic_audio(os.path.join(audio_dir, "{:05d}.wav".format(i)), DURATION_SECS, sr=SR,
+                              f0=float(rng.uniform(100, 800)))
+        params = {
+            "pitch": rng.uniform(100, 800, (n_frames, 1)),
+            "loudness": rng.standard_normal((n_frames, 1)),
+            "times": np.linspace(0, DURATION_SECS, 126),
+            # preprocess always puts an onset on frame 0
+            "onset_frames": np.concatenate([[0], np.sort(rng.choice(np.arange(1, 126), int(rng.integers(0, 3)),
+                                                                    replace=False))]),
+            "mfcc": rng.standard_normal((N_MFCC, n_frames)),
+        }
+        np.save(os.path.join(param_dir, "{:05d}.npy".format(i)), params, allow_pickle=True)
+
+
+def throughput(loader, epochs=2):
+    """
+    samples per second over the epochs after the first one (worker start-up and page cache warm-up excluded)
+    """
+    for _ in loader:
+        pass
+    start, n = time.perf_counter(), 0
+    for _ in range(epochs):
+        for batch in loader:
+            n += len(batch[0])
+    return n / (time.perf_counter() - start)
+
+
+def run(n_samples, workers, batch_size=1, epochs=2):
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_dir, param_dir = os.path.join(tmp_dir, "audio"), os.path.join(tmp_dir, "params")
+        shards_dir = os.path.join(tmp_dir, "shards")
+        write_synthetic_dataset(audio_dir, param_dir, n_samples)
+        start = time.perf_counter()
+        pack_features(audio_dir, param_dir, shards_dir, shard_size=max(1, n_samples // 4))
+        results["pack_secs"] = time.perf_counter() - start
+
+        files = VitalAudioParamDataset(audio_dir, param_dir)
+        shards = VitalFeatureShardDataset(shards_dir)
+        for num_workers in workers:
+            # batch_size 1: onset_frames differ in length between samples, as in the unpacked dataset
+            results["workers_{}".format(num_workers)] = {
+                "files_samples_per_sec": throughput(
+                    DataLoader(files, batch_size=batch_size, shuffle=True, num_workers=num_workers), epochs),
+                "shards_samples_per_sec": throughput(
+                    DataLoader(shards, batch_size=batch_size, sampler=ShardShuffleSampler(shards),
+                               num_workers=num_workers), epochs),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--workers", nargs="+", type=int, default=[0, 2])
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.samples, args.workers, epochs=args.epochs)
+    print("packed {} samples in {:.1f}s".format(args.samples, results["pack_secs"]))
+    print("{:<12} {:>16} {:>16} {:>8}".format("workers", "files samples/s", "shards samples/s", "x"))
+    for key, r in results.items():
+        if key.startswith("workers_"):
+            print("{:<12} {:>16.1f} {:>16.1f} {:>8.1f}".format(
+                key[len("workers_"):], r["files_samples_per_sec"], r["shards_samples_per_sec"],
+                r["shards_samples_per_sec"] / r["files_samples_per_sec"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
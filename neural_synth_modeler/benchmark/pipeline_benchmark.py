@@ -0,0 +1,298 @@
+"""
+Stage-by-stage speed benchmark of the audio -> preset pipeline, for Vital and Dexed.
+
+Every stage is timed over synthetic and bundled audio at several durations and batch sizes, reporting
+p50 / p95 latency, throughput and peak RSS. Results are written as JSON and can be compared to a stored
+baseline, failing when a stage got slower than the allowed tolerance.
+Every run also times a fixed calibration workload. Against a baseline from another machine, stages are compared
+relative to it, so the gate still catches regressions when the runner differs from where the baseline was recorded.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.pipeline_benchmark --output bench.json
+    python -m neural_synth_modeler.benchmark.pipeline_benchmark --quick \
+        --compare neural_synth_modeler/benchmark/baseline.json --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+import torch
+
+from neural_synth_modeler.converter.dexed.dexed_converter import DexedConverter
+from neural_synth_modeler.converter.vital.vital_converter import VitalConverter
+from neural_synth_modeler.inferencer.dexed.dexed_inferencer import DexedInferencer
+from neural_synth_modeler.inferencer.vital.models.preprocessor import preprocess
+from neural_synth_modeler.inferencer.vital.vital_inferencer import VitalInferencer, VitalInferenceInput
+from neural_synth_modeler.utils.audio import write_synthetic_audio
+from neural_synth_modeler.utils.pitch_extractor import extract_pitch
+
+SR = 16000
+VITAL_BLOCK_SIZE = 160
+DEXED_BLOCK_SIZE = 64
+VITAL_CHECKPOINT = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "../inferencer/vital/checkpoints/model.pt"
+)
+DEXED_CHECKPOINT = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "../inferencer/dexed/checkpoints/state_best.pth"
+)
+INIT_VITAL = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../inferencer/vital/init.vital")
+BUNDLED_AUDIO = {
+    "vital": "test/test_audio/vital_test_synth_1.wav",
+    "dexed": "test/test_audio/dexed_test_audio_1.wav",
+}
+
+# pitch_backend None means the backend from vital/config.yaml
+FULL_CONFIG = {"durations": [1, 2, 4], "batch_sizes": [2, 4, 8], "repeats": 10, "pitch_backend": None}
+QUICK_CONFIG = {"durations": [4], "batch_sizes": [2], "repeats": 3, "pitch_backend": None}
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(fn, repeats, warmup=1):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = perf_counter()
+        fn()
+        times.append(perf_counter() - t0)
+    times = np.array(times)
+    return {
+        "p50_ms": float(np.percentile(times, 50) * 1000),
+        "p95_ms": float(np.percentile(times, 95) * 1000),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def calibration_workload(signal=np.sin(np.arange(4 * SR) * 0.05).astype(np.float32)):
+    """
+    fixed mix of the work the pipeline does: torch matmuls, an STFT, numpy FFTs and a pure-Python loop
+    """
+    a = torch.linspace(-1, 1, 256 * 256).reshape(256, 256)
+    for _ in range(8):
+        a = torch.tanh(a @ a / 256)
+    torch.stft(torch.from_numpy(signal), 1024, 256, window=torch.hann_window(1024), return_complex=True).abs().sum()
+    np.abs(np.fft.rfft(signal.reshape(-1, 1000), axis=1)).sum()
+    sum(i * i for i in range(100000))
+
+
+def record(results, synth, stage, audio_name, duration_secs, batch_size, stats):
+    stats = dict(stats)
+    stats["throughput_items_per_sec"] = batch_size / (stats["p50_ms"] / 1000)
+    stats["audio_secs_per_sec"] = batch_size * duration_secs / (stats["p50_ms"] / 1000)
+    results["{}/{}/{}/{}s/b{}".format(synth, stage, audio_name, duration_secs, batch_size)] = stats
+
+
+def skip(results, synth, stage, audio_name, duration_secs, batch_size, reason):
+    results["{}/{}/{}/{}s/b{}".format(synth, stage, audio_name, duration_secs, batch_size)] = {"skipped": reason}
+
+
+def tile_batch(inputs, batch_size):
+    """
+    `preprocess` output repeated to `batch_size`, in `WTSv2.forward` argument order
+    """
+    y, pitch, loudness, times, onset_frames, mfcc = inputs
+    tile = lambda t: t[:1].repeat(batch_size, *([1] * (t.dim() - 1)))
+    return tile(y), tile(mfcc), tile(pitch), tile(loudness), times, onset_frames
+
+
+def bench_vital(results, audio_files, config):
+    inferencer = VitalInferencer(device="cpu")
+    for duration_secs in config["durations"]:
+        model = inferencer.build_model("cpu", duration_secs=duration_secs)
+        if os.path.exists(VITAL_CHECKPOINT):
+            model.load_state_dict(torch.load(VITAL_CHECKPOINT, map_location=torch.device("cpu")))
+        model.eval()
+        signal_length = SR * duration_secs
+
+        for audio_name, path in audio_files(duration_secs):
+            r = lambda stage, bs, stats: record(results, "vital", stage, audio_name, duration_secs, bs, stats)
+
+            run_preprocess = lambda: preprocess(path, SR, VITAL_BLOCK_SIZE, signal_length=signal_length,
+                                                pitch_backend=config["pitch_backend"])
+            r("preprocess", 1, measure(run_preprocess, config["repeats"]))
+            inputs = run_preprocess()
+            y = inputs[0][0].numpy()
+            r("extract_pitch", 1, measure(lambda: extract_pitch(y, SR, VITAL_BLOCK_SIZE, backend=config["pitch_backend"]),
+                                          config["repeats"]))
+
+            for batch_size in config["batch_sizes"]:
+                batch = tile_batch(inputs, batch_size)
+                with torch.no_grad():
+                    r("WTSv2.forward", batch_size, measure(lambda: model(*batch), config["repeats"]))
+
+            if not os.path.exists(INIT_VITAL):
+                for stage in ["convert_to_preset", "parseToPluginFile"]:
+                    skip(results, "vital", stage, audio_name, duration_secs, 1, "init.vital template not found")
+                continue
+
+            inference_input = VitalInferenceInput()
+            (inference_input.y, inference_input.pitch, inference_input.loudness,
+             inference_input.times, inference_input.onset_frames, inference_input.mfcc) = inputs
+            inference_output = inferencer.inference(model, inference_input, "cpu")
+            r("convert_to_preset", 1, measure(lambda: inferencer.convert_to_preset(inference_output), config["repeats"]))
+
+            def parse_to_plugin_file():
+                converter = VitalConverter()
+                converter.dict = inferencer.convert_to_preset(inference_output)
+                converter.parseToPluginFile(os.path.join(tempfile.gettempdir(), "bench_output.vital"))
+            r("parseToPluginFile", 1, measure(parse_to_plugin_file, config["repeats"]))
+
+
+def bench_dexed(results, audio_files, config):
+    inferencer = DexedInferencer(device="cpu")
+    model = inferencer.load_model(DEXED_CHECKPOINT, "cpu")
+
+    # ddx7 pads loudness to a fixed 4s window while f0 follows the audio length, so Dexed only runs on 4s clips
+    for duration_secs in [d for d in config["durations"] if d == 4]:
+        for audio_name, path in audio_files(duration_secs):
+            r = lambda stage, bs, stats: record(results, "dexed", stage, audio_name, duration_secs, bs, stats)
+
+            run_preprocess = lambda: inferencer.preprocess(path, pitch_backend=config["pitch_backend"])
+            r("preprocess", 1, measure(run_preprocess, config["repeats"]))
+            inference_input = run_preprocess()
+            audio = inference_input.x["audio"][0, :, 0].numpy()
+            r("extract_pitch", 1, measure(lambda: extract_pitch(audio, SR, DEXED_BLOCK_SIZE, backend=config["pitch_backend"]),
+                                          config["repeats"]))
+
+            for batch_size in config["batch_sizes"]:
+                x = {k: v[:1].repeat(batch_size, *([1] * (v.dim() - 1))) for k, v in inference_input.x.items()}
+                with torch.no_grad():
+                    r("DDSP_Decoder.forward", batch_size, measure(lambda: model(x), config["repeats"]))
+
+            inference_output = inferencer.inference(model, inference_input, "cpu")
+            r("convert_to_preset", 1, measure(lambda: inferencer.convert_to_preset(inference_output), config["repeats"]))
+
+            def parse_to_plugin_file():
+                converter = DexedConverter()
+                converter.dict = inferencer.convert_to_preset(inference_output)
+                converter.parseToPluginFile(os.path.join(tempfile.gettempdir(), "bench_output.syx"))
+            r("parseToPluginFile", 1, measure(parse_to_plugin_file, config["repeats"]))
+
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "vital_checkpoint": os.path.exists(VITAL_CHECKPOINT),
+    }
+
+
+def run(config, synths=("vital", "dexed")):
+    tmp_dir = tempfile.mkdtemp()
+
+    def audio_files_for(synth):
+        def audio_files(duration_secs):
+            synthetic = os.path.join(tmp_dir, "synthetic_{}s.wav".format(duration_secs))
+            if not os.path.exists(synthetic):
+                write_synthetic_audio(synthetic, duration_secs)
+            files = [("synthetic", synthetic)]
+            if os.path.exists(BUNDLED_AUDIO[synth]):
+                files.append(("bundled", BUNDLED_AUDIO[synth]))
+            return files
+        return audio_files
+
+    results = {}
+    calibration = measure(calibration_workload, max(config["repeats"], 10))
+    if "vital" in synths:
+        bench_vital(results, audio_files_for("vital"), config)
+    if "dexed" in synths:
+        bench_dexed(results, audio_files_for("dexed"), config)
+    return {"machine": machine_info(), "config": config, "calibration_ms": calibration["p50_ms"], "results": results}
+
+
+# machine_info keys that must match for absolute latencies to be comparable. the platform string is left out,
+# it changes with every kernel update of the CI runner image
+COMPARABLE_MACHINE_KEYS = ["python", "torch", "cpu_count", "torch_threads", "vital_checkpoint"]
+
+
+def comparable(current, baseline):
+    """
+    True when the baseline was recorded on the same kind of machine, so absolute latencies can be compared
+    """
+    return all(current["machine"].get(key) == baseline["machine"].get(key) for key in COMPARABLE_MACHINE_KEYS)
+
+
+def compare(current, baseline, tolerance):
+    """
+    returns the list of regressions: stages whose p50 grew by more than `tolerance` (relative) over the baseline.
+    against a baseline from a different machine / setup, each p50 is first divided by the calibration time of
+    its own run.
+    """
+    scale = 1.0
+    if not comparable(current, baseline):
+        print("Baseline was recorded on a different machine / setup, comparing p50 relative to the calibration run")
+        print("  baseline: {} calibration {:.2f} ms".format(baseline["machine"], baseline["calibration_ms"]))
+        print("  current:  {} calibration {:.2f} ms".format(current["machine"], current["calibration_ms"]))
+        scale = baseline["calibration_ms"] / current["calibration_ms"]
+
+    regressions = []
+    for key, stats in current["results"].items():
+        base = baseline["results"].get(key)
+        if base is None or "skipped" in stats or "skipped" in base:
+            continue
+        ratio = stats["p50_ms"] * scale / base["p50_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append((key, base["p50_ms"], stats["p50_ms"], ratio))
+            flag = "  REGRESSION"
+        print("{:<60} {:>10.2f} -> {:>10.2f} ms  x{:.2f}{}".format(key, base["p50_ms"], stats["p50_ms"], ratio, flag))
+    return regressions
+
+
+def print_table(report):
+    print("{:<60} {:>10} {:>10} {:>12} {:>10}".format("stage", "p50 ms", "p95 ms", "items/s", "RSS MB"))
+    for key, stats in report["results"].items():
+        if "skipped" in stats:
+            print("{:<60} skipped: {}".format(key, stats["skipped"]))
+            continue
+        print("{:<60} {:>10.2f} {:>10.2f} {:>12.2f} {:>10.1f}".format(
+            key, stats["p50_ms"], stats["p95_ms"], stats["throughput_items_per_sec"], stats["peak_rss_mb"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="single duration / batch size, fewer repeats (for CI)")
+    parser.add_argument("--synths", nargs="+", default=["vital", "dexed"])
+    parser.add_argument("--repeats", type=int, default=None)
+    parser.add_argument("--pitch-backend", default=None, help="pitch backend for every pipeline (default: config)")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p50 slowdown")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    config = dict(QUICK_CONFIG if args.quick else FULL_CONFIG)
+    if args.repeats is not None:
+        config["repeats"] = args.repeats
+    if args.pitch_backend is not None:
+        config["pitch_backend"] = args.pitch_backend
+
+    report = run(config, synths=args.synths)
+    print_table(report)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline["config"] != report["config"]:
+            sys.exit("Baseline was recorded with config {}, this run is {}".format(baseline["config"], report["config"]))
+        regressions = compare(report, baseline, args.tolerance)
+        print("{} regression(s) over {:.0%} tolerance".format(len(regressions), args.tolerance))
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
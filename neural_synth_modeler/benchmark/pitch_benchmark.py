@@ -0,0 +1,100 @@
+"""
+Accuracy-vs-latency benchmark for the pitch backends in `utils/pitch_extractor.py`.
+
+Synthetic clips (sine / sawtooth at known pitches) are scored against their ground truth,
+the bundled test clips are scored against `crepe_full`, which is what the model was trained with.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.pitch_benchmark --output pitch_benchmark.json
+"""
+import argparse
+import glob
+import json
+import os
+from time import perf_counter
+
+import librosa
+import numpy as np
+
+from neural_synth_modeler.utils.pitch_extractor import PITCH_BACKENDS, extract_pitch
+from neural_synth_modeler.inferencer.vital.models.utils import sawtooth_waveform
+
+SR = 16000
+BLOCK_SIZE = 160
+TEST_AUDIO_GLOB = "test/test_audio/*.wav"
+SYNTHETIC_PITCHES = [82.41, 130.81, 220.0, 440.0, 880.0]
+
+
+def synthetic_clips(duration_secs=4):
+    t = np.arange(SR * duration_secs) / SR
+    clips = []
+    for f in SYNTHETIC_PITCHES:
+        clips.append(("sine_{}".format(f), np.sin(2 * np.pi * f * t).astype(np.float32), f))
+        clips.append(("saw_{}".format(f), 0.5 * sawtooth_waveform(2 * np.pi * f * t).astype(np.float32), f))
+    return clips
+
+
+def cents_error(f0, ref):
+    voiced = (f0 > 0) & (ref > 0)
+    return np.abs(1200 * np.log2(f0[voiced] / ref[voiced]))
+
+
+def time_backend(backend, signal, repeats):
+    extract_pitch(signal, SR, BLOCK_SIZE, backend=backend)     # warm-up, excludes model load / caches
+    times = []
+    for _ in range(repeats):
+        t0 = perf_counter()
+        f0 = extract_pitch(signal, SR, BLOCK_SIZE, backend=backend)
+        times.append(perf_counter() - t0)
+    return f0, float(np.median(times))
+
+
+def run(backends, repeats=3, audio_glob=TEST_AUDIO_GLOB):
+    clips = [(name, y, np.full(len(y) // BLOCK_SIZE, f)) for name, y, f in synthetic_clips()]
+    for fname in sorted(glob.glob(audio_glob)):
+        y, _ = librosa.load(fname, sr=SR)
+        ref = extract_pitch(y, SR, BLOCK_SIZE, backend="crepe_full")
+        clips.append((os.path.basename(fname), y, ref))
+
+    results = {}
+    for backend in backends:
+        per_clip = []
+        for name, y, ref in clips:
+            f0, latency = time_backend(backend, y, repeats)
+            err = cents_error(f0, ref)
+            per_clip.append({
+                "clip": name,
+                "audio_secs": len(y) / SR,
+                "latency_secs": latency,
+                "rpa_50c": float((err < 50).mean()) if len(err) else 0.0,    # raw pitch accuracy
+                "median_cents_error": float(np.median(err)) if len(err) else float("nan"),
+            })
+        results[backend] = {
+            "clips": per_clip,
+            "rtf": sum(c["latency_secs"] for c in per_clip) / sum(c["audio_secs"] for c in per_clip),
+            "rpa_50c": float(np.mean([c["rpa_50c"] for c in per_clip])),
+            "median_cents_error": float(np.nanmedian([c["median_cents_error"] for c in per_clip])),
+        }
+    return results
+
+
+def print_table(results):
+    print("{:<12} {:>10} {:>10} {:>14}".format("backend", "RTF", "RPA@50c", "median cents"))
+    for backend, res in results.items():
+        print("{:<12} {:>10.4f} {:>10.3f} {:>14.2f}".format(
+            backend, res["rtf"], res["rpa_50c"], res["median_cents_error"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", nargs="+", default=list(PITCH_BACKENDS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--audio-glob", default=TEST_AUDIO_GLOB)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.backends, repeats=args.repeats, audio_glob=args.audio_glob)
+    print_table(results)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,132 @@
+"""
+Accuracy / speed report of the dynamic int8 Vital model (`VitalQuantizedInferencer`) against fp32.
+
+For every bundled Vital test clip, both models run the full forward pass. The report compares the
+multiscale-FFT eval loss, the predicted preset controls (ADSR, wavetable attention) and the forward latency.
+Dynamic quantization computes activation ranges on the fly, so no calibration data is needed.
+The bundled clips only serve as the accuracy check.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.quantization_report --output quantization_report.json
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import sys
+
+import numpy as np
+import torch
+
+from neural_synth_modeler.benchmark.pipeline_benchmark import VITAL_CHECKPOINT, measure
+from neural_synth_modeler.inferencer.vital.models.preprocessor import preprocess
+from neural_synth_modeler.inferencer.vital.vital_inferencer import (
+    VitalInferencer, VitalInferenceInput, quantize_model
+)
+
+SR = 16000
+BLOCK_SIZE = 160
+
+
+def model_size_mb(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def load_input(audio_fname, pitch_backend=None):
+    inference_input = VitalInferenceInput()
+    (inference_input.y, inference_input.pitch, inference_input.loudness,
+     inference_input.times, inference_input.onset_frames, inference_input.mfcc) = preprocess(
+        audio_fname, SR, BLOCK_SIZE, signal_length=SR * 4, pitch_backend=pitch_backend)
+    return inference_input
+
+
+def evaluate(inferencer, model, inference_input, repeats):
+    # the noise branch samples torch.rand, so both models get the same seed for a comparable loss
+    torch.manual_seed(0)
+    output = inferencer.inference(model, inference_input, "cpu", enable_eval=True)
+
+    def forward():
+        with torch.no_grad():
+            model(inference_input.y, inference_input.mfcc, inference_input.pitch, inference_input.loudness,
+                  inference_input.times, inference_input.onset_frames)
+    return output, measure(forward, repeats)
+
+
+def run(audio_fnames, checkpoint=VITAL_CHECKPOINT, pitch_backend=None, repeats=5):
+    inferencer = VitalInferencer(device="cpu")
+    if os.path.exists(checkpoint):
+        fp32_model = inferencer.load_model(checkpoint, "cpu")
+    else:
+        print("WARNING: {} not found, comparing randomly initialized models".format(checkpoint))
+        fp32_model = inferencer.build_model("cpu")
+        fp32_model.eval()
+    int8_model = quantize_model(fp32_model)
+
+    clips = {}
+    for audio_fname in audio_fnames:
+        inference_input = load_input(audio_fname, pitch_backend=pitch_backend)
+        fp32, fp32_stats = evaluate(inferencer, fp32_model, inference_input, repeats)
+        int8, int8_stats = evaluate(inferencer, int8_model, inference_input, repeats)
+        clips[os.path.basename(audio_fname)] = {
+            "fp32_loss": fp32.eval_dict["loss"],
+            "int8_loss": int8.eval_dict["loss"],
+            "loss_delta": int8.eval_dict["loss"] - fp32.eval_dict["loss"],
+            "adsr_max_abs_diff": max(abs(getattr(int8, k) - getattr(fp32, k)) for k in ["attack", "decay", "sustain"]),
+            "attention_max_abs_diff": float(np.abs(int8.attention_output - fp32.attention_output).max()),
+            "fp32_forward_p50_ms": fp32_stats["p50_ms"],
+            "int8_forward_p50_ms": int8_stats["p50_ms"],
+        }
+
+    loss_deltas = np.array([c["loss_delta"] for c in clips.values()])
+    fp32_ms = np.median([c["fp32_forward_p50_ms"] for c in clips.values()])
+    int8_ms = np.median([c["int8_forward_p50_ms"] for c in clips.values()])
+    summary = {
+        "mean_loss_delta": float(loss_deltas.mean()),
+        "max_loss_delta": float(loss_deltas.max()),
+        "fp32_forward_p50_ms": float(fp32_ms),
+        "int8_forward_p50_ms": float(int8_ms),
+        "speedup": float(fp32_ms / int8_ms),
+        "fp32_size_mb": model_size_mb(fp32_model),
+        "int8_size_mb": model_size_mb(int8_model),
+        "torch_threads": torch.get_num_threads(),
+        "checkpoint": os.path.exists(checkpoint),
+    }
+    return {"clips": clips, "summary": summary}
+
+
+def print_report(report):
+    print("{:<28} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+        "clip", "fp32 loss", "int8 loss", "delta", "adsr diff", "fp32 ms", "int8 ms"))
+    for name, c in report["clips"].items():
+        print("{:<28} {:>10.4f} {:>10.4f} {:>+10.4f} {:>10.4f} {:>10.1f} {:>10.1f}".format(
+            name, c["fp32_loss"], c["int8_loss"], c["loss_delta"], c["adsr_max_abs_diff"],
+            c["fp32_forward_p50_ms"], c["int8_forward_p50_ms"]))
+    s = report["summary"]
+    print("mean loss delta {:+.4f}, max {:+.4f} | forward {:.1f} -> {:.1f} ms (x{:.2f}) | size {:.1f} -> {:.1f} MB".format(
+        s["mean_loss_delta"], s["max_loss_delta"], s["fp32_forward_p50_ms"], s["int8_forward_p50_ms"],
+        s["speedup"], s["fp32_size_mb"], s["int8_size_mb"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio-glob", default="test/test_audio/vital_*.wav")
+    parser.add_argument("--checkpoint", default=VITAL_CHECKPOINT)
+    parser.add_argument("--pitch-backend", default=None)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--max-loss-delta", type=float, default=None,
+                        help="exit non-zero if any clip's loss grows by more than this")
+    args = parser.parse_args()
+
+    report = run(sorted(glob.glob(args.audio_glob)), checkpoint=args.checkpoint,
+                 pitch_backend=args.pitch_backend, repeats=args.repeats)
+    print_report(report)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_loss_delta is not None and report["summary"]["max_loss_delta"] > args.max_loss_delta:
+        sys.exit(1)
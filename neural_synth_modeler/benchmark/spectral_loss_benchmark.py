@@ -0,0 +1,80 @@
+"""
+Speed of `MultiscaleSpectralLoss` (cached windows, target + output in one STFT batch on GPU without autograd) against the previous
+loss computation (a fresh hann window per scale and call, one STFT pass per signal), plus the loss on a subset of scales.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.spectral_loss_benchmark
+"""
+import argparse
+import json
+
+import torch
+
+from neural_synth_modeler.benchmark.pipeline_benchmark import measure
+from neural_synth_modeler.inferencer.vital.models.core import MultiscaleSpectralLoss
+
+SCALES = [4096, 2048, 1024, 512, 256, 128]
+OVERLAP = 0.75
+SIGNAL_LENGTH = 64000
+SUBSET_SCALES = [2048, 512, 128]
+
+
+def reference_loss(target, output, scales=SCALES, overlap=OVERLAP):
+    def spectra(signal):
+        return [
+            torch.stft(signal, s, int(s * (1 - overlap)), s, torch.hann_window(s).to(signal), True,
+                       normalized=True, return_complex=True).abs()
+            for s in scales
+        ]
+    loss = 0
+    for s_x, s_y in zip(spectra(target), spectra(output)):
+        loss = loss + (s_x - s_y).abs().mean()
+    return loss
+
+
+def run(batch_sizes, repeats):
+    loss_module = MultiscaleSpectralLoss(SCALES, OVERLAP)
+    results = {}
+    for batch_size in batch_sizes:
+        target = torch.randn(batch_size, SIGNAL_LENGTH)
+        output = torch.randn(batch_size, SIGNAL_LENGTH, requires_grad=True)
+        assert torch.allclose(reference_loss(target, output), loss_module(target, output), rtol=1e-5)
+
+        def backward(loss_fn):
+            def fn():
+                output.grad = None
+                loss_fn(target, output).backward()
+            return fn
+
+        with torch.no_grad():
+            reference = measure(lambda: reference_loss(target, output), repeats)
+            cached = measure(lambda: loss_module(target, output), repeats)
+            subset = measure(lambda: loss_module(target, output, scales=SUBSET_SCALES), repeats)
+        results["b{}".format(batch_size)] = {
+            "eval_reference_ms": reference["p50_ms"],
+            "eval_cached_ms": cached["p50_ms"],
+            "eval_subset_ms": subset["p50_ms"],
+            "train_reference_ms": measure(backward(reference_loss), repeats)["p50_ms"],
+            "train_cached_ms": measure(backward(loss_module), repeats)["p50_ms"],
+        }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.batch_sizes, args.repeats)
+    print("{:<6} {:>14} {:>14} {:>8} {:>14} {:>14} {:>14} {:>8}".format(
+        "batch", "eval ref ms", "eval ms", "x", "eval 3 sc. ms", "train ref ms", "train ms", "x"))
+    for key, r in results.items():
+        print("{:<6} {:>14.2f} {:>14.2f} {:>8.2f} {:>14.2f} {:>14.2f} {:>14.2f} {:>8.2f}".format(
+            key, r["eval_reference_ms"], r["eval_cached_ms"], r["eval_reference_ms"] / r["eval_cached_ms"],
+            r["eval_subset_ms"],
+            r["train_reference_ms"], r["train_cached_ms"], r["train_reference_ms"] / r["train_cached_ms"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
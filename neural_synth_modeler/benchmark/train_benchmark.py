@@ -0,0 +1,74 @@
+"""
+WTSv2 training throughput (steps/s, samples/s) of the `Trainer` configurations, on packed synthetic data.
+Each configuration trains for two epochs and reports the second one, so torch.compile and worker start-up
+are not counted.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.benchmark.train_benchmark --configs fp32 bf16 accum2 compile
+"""
+import argparse
+import json
+import os
+import tempfile
+
+import torch
+import yaml
+
+from neural_synth_modeler.benchmark.loader_benchmark import write_synthetic_dataset
+from neural_synth_modeler.train.vital.datasets import VitalFeatureShardDataset, pack_features
+from neural_synth_modeler.train.vital.trainer import Trainer, build_model, make_loader
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../inferencer/vital/config.yaml")
+
+# overrides of config["train"]
+CONFIGS = {
+    "fp32": {},
+    "bf16": {"precision": "bf16"},
+    "accum2": {"grad_accum_steps": 2},
+    "compile": {"compile": True},
+    "workers0": {"num_workers": 0},
+}
+
+
+def run(config_names, batch_size, steps, device="cpu"):
+    with open(CONFIG_PATH) as f:
+        config = yaml.safe_load(f)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_dir, param_dir = os.path.join(tmp_dir, "audio"), os.path.join(tmp_dir, "params")
+        write_synthetic_dataset(audio_dir, param_dir, batch_size * steps)
+        pack_features(audio_dir, param_dir, os.path.join(tmp_dir, "shards"))
+        dataset = VitalFeatureShardDataset(os.path.join(tmp_dir, "shards"))
+
+        for name in config_names:
+            train_config = dict(config["train"], **CONFIGS[name])
+            # same number of samples per optimizer step for every configuration
+            loader_batch_size = batch_size // train_config["grad_accum_steps"]
+            loader = make_loader(dataset, loader_batch_size, shuffle=True, num_workers=train_config["num_workers"],
+                                 device=device)
+            torch.manual_seed(0)
+            trainer = Trainer(build_model(config, device), loader, train_config=train_config, device=device)
+            trainer.train_epoch()
+            stats = trainer.train_epoch()
+            results[name] = {k: stats[k] for k in ["steps_per_sec", "samples_per_sec", "train_loss"]}
+    results["torch_threads"] = torch.get_num_threads()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", nargs="+", default=["fp32", "bf16", "accum2"], choices=list(CONFIGS))
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=4, help="optimizer steps per epoch")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = run(args.configs, args.batch_size, args.steps)
+    print("{:<10} {:>10} {:>12} {:>12}".format("config", "steps/s", "samples/s", "loss"))
+    for name in args.configs:
+        r = results[name]
+        print("{:<10} {:>10.3f} {:>12.2f} {:>12.4f}".format(name, r["steps_per_sec"], r["samples_per_sec"],
+                                                            r["train_loss"]))
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -3,6 +3,7 @@ import mido
 from pathlib import Path
 from .dexed_constants import voice_struct, VOICE_PARAMETER_RANGES, header_struct,\
     header_bytes, voice_bytes, N_VOICES, N_OSC, KEYS
+from neural_synth_modeler.utils.tracing import trace
 
 
 def take(take_from, n):
@@ -127,29 +128,32 @@ class DexedConverter(SynthConverter):
             return global_params
 
         try:
-            head = encode_head()
+            with trace("preset_encode"):
+                head = encode_head()
 
-            data = []
-            assert len(self.dict) == N_VOICES
+                data = []
+                assert len(self.dict) == N_VOICES
 
-            # voices
-            last_params = None
-            for params in self.dict:
-                if len(params.keys()) == 0:
-                    params = last_params
-                else:
-                    last_params = params
-                for osc in range(N_OSC):
-                    data += encode_osc(params, osc)
+                # voices
+                last_params = None
+                for params in self.dict:
+                    if len(params.keys()) == 0:
+                        params = last_params
+                    else:
+                        last_params = params
+                    for osc in range(N_OSC):
+                        data += encode_osc(params, osc)
 
-                data += encode_global(params)
+                    data += encode_global(params)
 
 
-            this_checksum = checksum(data)
-            output = [*head, *data, this_checksum]
+                this_checksum = checksum(data)
+                output = [*head, *data, this_checksum]
             
-            message = mido.Message('sysex', data=output)
-            mido.write_syx_file(fname, [message])
+                message = mido.Message('sysex', data=output)
+
+            with trace("file_write"):
+                mido.write_syx_file(fname, [message])
             return 0
         
         except Exception as e:
@@ -3,6 +3,7 @@ import base64
 import struct
 from ..converter import SynthConverter
 from .vital_constants import N_WAVETABLES, CUSTOM_KEYS
+from neural_synth_modeler.utils.tracing import trace
 import numpy as np
 import math
 
@@ -68,45 +69,46 @@ class VitalConverter(SynthConverter):
         vital parameters value scale: https://github.com/mtytel/vital/blob/c0694a193777fc97853a598f86378bea625a6d81/src/common/synth_parameters.cpp
         value scale computation: https://github.com/mtytel/vital/blob/c0694a193777fc97853a598f86378bea625a6d81/src/plugin/value_bridge.h
         """
-        # encode custom part
-        wavetables = self.dict[CUSTOM_KEYS]["wavetables"]
-        for idx in range(N_WAVETABLES):
-            wavetable = wavetables[idx]["wavetable"]
-            wavetable_name = wavetables[idx]["name"]
-            wavetable_osc_level = wavetables[idx]["osc_level"]
+        with trace("preset_encode"):
+            # encode custom part
+            wavetables = self.dict[CUSTOM_KEYS]["wavetables"]
+            for idx in range(N_WAVETABLES):
+                wavetable = wavetables[idx]["wavetable"]
+                wavetable_name = wavetables[idx]["name"]
+                wavetable_osc_level = wavetables[idx]["osc_level"]
 
-            wavetable_str = self.base64_converter.encode(wavetable)
-            self.dict["settings"]["wavetables"][idx]["groups"][0]["components"][0]["keyframes"][0]["wave_data"] = wavetable_str
-            self.dict["settings"]["wavetables"][idx]["name"] = wavetable_name
-            self.dict["settings"]["osc_{}_level".format(idx + 1)] = wavetable_osc_level
+                wavetable_str = self.base64_converter.encode(wavetable)
+                self.dict["settings"]["wavetables"][idx]["groups"][0]["components"][0]["keyframes"][0]["wave_data"] = wavetable_str
+                self.dict["settings"]["wavetables"][idx]["name"] = wavetable_name
+                self.dict["settings"]["osc_{}_level".format(idx + 1)] = wavetable_osc_level
         
-        # switch off unused wavetables
-        if N_WAVETABLES == 1:
-            self.dict["settings"]["osc_2_on"] = 0.0
-            self.dict["settings"]["osc_3_on"] = 0.0
-        elif N_WAVETABLES == 2:
-            self.dict["settings"]["osc_3_on"] = 0.0
+            # switch off unused wavetables
+            if N_WAVETABLES == 1:
+                self.dict["settings"]["osc_2_on"] = 0.0
+                self.dict["settings"]["osc_3_on"] = 0.0
+            elif N_WAVETABLES == 2:
+                self.dict["settings"]["osc_3_on"] = 0.0
         
-        # adsr filter
-        adsrs = self.dict[CUSTOM_KEYS]["adsr"]
-        # attack is kQuartic
-        self.dict["settings"]["env_1_attack"] = math.sqrt(math.sqrt(adsrs["attack"]))
-        # attack power is kLinear
-        self.dict["settings"]["env_1_attack_power"] = adsrs["attack_power"]
-        # decay is kQuartic
-        self.dict["settings"]["env_1_decay"] = math.sqrt(math.sqrt(adsrs["decay"]))
-        # decay power is kLinear
-        self.dict["settings"]["env_1_decay_power"] = adsrs["decay_power"]
-        # sustain is kLinear
-        self.dict["settings"]["env_1_sustain"] = adsrs["sustain"]
+            # adsr filter
+            adsrs = self.dict[CUSTOM_KEYS]["adsr"]
+            # attack is kQuartic
+            self.dict["settings"]["env_1_attack"] = math.sqrt(math.sqrt(adsrs["attack"]))
+            # attack power is kLinear
+            self.dict["settings"]["env_1_attack_power"] = adsrs["attack_power"]
+            # decay is kQuartic
+            self.dict["settings"]["env_1_decay"] = math.sqrt(math.sqrt(adsrs["decay"]))
+            # decay power is kLinear
+            self.dict["settings"]["env_1_decay_power"] = adsrs["decay_power"]
+            # sustain is kLinear
+            self.dict["settings"]["env_1_sustain"] = adsrs["sustain"]
 
-        # self.dict["settings"]["env_1_delay"] = adsrs["delay"]
-        # self.dict["settings"]["env_1_hold"] = adsrs["hold"]
-        # self.dict["settings"]["env_1_release"] = adsrs["release"]
-        # self.dict["settings"]["env_1_release_power"] = adsrs["release_power"]
-        # y["settings"]["lfos"] = x_init["settings"]["lfos"]
+            # self.dict["settings"]["env_1_delay"] = adsrs["delay"]
+            # self.dict["settings"]["env_1_hold"] = adsrs["hold"]
+            # self.dict["settings"]["env_1_release"] = adsrs["release"]
+            # self.dict["settings"]["env_1_release_power"] = adsrs["release_power"]
+            # y["settings"]["lfos"] = x_init["settings"]["lfos"]
 
-        del self.dict[CUSTOM_KEYS]
+            del self.dict[CUSTOM_KEYS]
 
-        with open(fname ,"w+") as f:
+        with trace("file_write"), open(fname ,"w+") as f:
             json.dump(self.dict, f)
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""
+Batched rendering of DX7 voices, e.g. a whole 32-voice bank parsed by DexedConverter, in one call.
+
+The voices are decoded into per-operator arrays (output level, frequency ratio or fixed frequency, detune,
+envelope rates and levels) and the algorithm. The envelopes are evaluated at the FMSynth frame rate,
+upsampled like the FMSynth controls, and all voices go through fm_graph.fm_mixed at once.
+
+This is an approximation of Dexed: levels use the amp_utils fit (about 0.75 dB per step), envelope segments
+are linear in level, and feedback, LFO, pitch envelope, keyboard scaling and velocity are not rendered.
+"""
+import argparse
+import os
+import time
+import numpy as np
+import soundfile as sf
+import torch
+from neural_synth_modeler.converter.dexed.dexed_converter import DexedConverter
+from neural_synth_modeler.converter.dexed.dexed_constants import N_OSC
+from neural_synth_modeler.inferencer.dexed.models.amp_utils import dexed_ol_to_amplitude
+from neural_synth_modeler.inferencer.dexed.models.ddx7.core import upsample
+from neural_synth_modeler.inferencer.dexed.models.ddx7.fm_graph import fm_mixed
+
+LEVEL_STEP = 0.086          # log amplitude per output / envelope level step, as in amp_utils
+DETUNE_CENTS = 1.0          # pitch shift per DET step away from 7
+EG_MAX_SPEED = 99000.0      # envelope level steps per second at rate 99
+
+
+def decode_voices(voices):
+    """
+    DexedConverter voices (list of parameter dicts) -> dict of arrays, operators in ddx7 order (OP1 first).
+    The sysex stores OP6 first, so operator i is sysex oscillator 5 - i.
+    """
+    def osc(key):
+        return np.array([[v[f"{N_OSC - 1 - i}_{key}"] for i in range(N_OSC)] for v in voices])
+
+    return {
+        "alg": np.array([v["ALG"] for v in voices]),
+        "transpose": np.array([v["TRNSP"] for v in voices]) - 24,
+        "ol": osc("OL"),
+        "coarse": osc("FC"),
+        "fine": osc("FF"),
+        "fixed": osc("M"),
+        "detune": osc("DET") - 7,
+        "rates": np.stack([osc(f"R{i}") for i in range(1, 5)], -1),
+        "levels": np.stack([osc(f"L{i}") for i in range(1, 5)], -1),
+        "names": ["".join(chr(v[f"NAME CHAR {i}"]) for i in range(1, 11)).rstrip() for v in voices],
+    }
+
+
+def operator_ratios(voices, f0_hz):
+    """
+    [n, 6] operator frequency / f0: coarse (0 is 0.5) * (1 + fine / 100) in ratio mode,
+    10 ** (coarse % 4 + fine / 100) Hz in fixed mode, then detuned
+    """
+    ratio = np.where(voices["coarse"] == 0, 0.5, voices["coarse"]) * (1 + voices["fine"] / 100)
+    fixed_hz = 10.0 ** (voices["coarse"] % 4 + voices["fine"] / 100)
+    ratio = np.where(voices["fixed"] == 1, fixed_hz / f0_hz[:, None], ratio)
+    return ratio * 2 ** (voices["detune"] * DETUNE_CENTS / 1200)
+
+
+def envelope_levels(rates, levels, n_frames, frame_rate, note_off_secs):
+    """
+    [n, n_frames, 6] DX7 envelope level (0-99): from L4 to L1, L2 and L3 at rates R1-R3,
+    held at L3 until note off, then back to L4 at R4. Each rate step of 41/64 speeds a segment up by 2 ** (1/4).
+    """
+    rates = torch.as_tensor(rates, dtype=torch.float64)
+    levels = torch.as_tensor(levels, dtype=torch.float64)
+    speed = EG_MAX_SPEED * 2 ** ((rates * 41 / 64 - 63.4) / 4)          # level steps / s, [n, 6, 4]
+    t = (torch.arange(n_frames, dtype=torch.float64) / frame_rate)[None, None]
+
+    def segments(t, start_level, targets, rates, start_time):
+        # sum of clamped ramps, one per segment, each starting where the previous one ends
+        level, begin = start_level.expand(*start_level.shape[:2], t.shape[-1]), start_time
+        previous = start_level
+        for i in range(targets.shape[-1]):
+            delta = targets[..., i:i + 1] - previous
+            duration = delta.abs() / rates[..., i:i + 1]
+            ramp = ((t - begin) / duration.clamp(min=1e-9)).clamp(0, 1)
+            level = level + ramp * delta
+            begin, previous = begin + duration, targets[..., i:i + 1]
+        return level
+
+    start = levels[..., 3:4]
+    attack = segments(t, start, levels[..., :3], speed[..., :3], 0.0)
+    off = segments(t.new_full((1, 1, 1), note_off_secs), start, levels[..., :3], speed[..., :3], 0.0)
+    release = segments(t, off, start, speed[..., 3:], note_off_secs)
+    return torch.where(t < note_off_secs, attack, release).permute(0, 2, 1).float()
+
+
+class BankRenderer:
+    """
+    renders a batch of decoded DX7 voices to [n_voices, samples] audio
+    """
+    def __init__(self, sample_rate=16000, block_size=64, max_ol=2):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.max_ol = max_ol
+
+    @torch.no_grad()
+    def render(self, voices, note=60, duration_secs=4.0, note_off_secs=None):
+        """
+        voices: decode_voices output, note: MIDI note (one for all voices or one per voice)
+        """
+        n = len(voices["alg"])
+        note_off_secs = 0.75 * duration_secs if note_off_secs is None else note_off_secs
+        frame_rate = self.sample_rate / self.block_size
+        n_frames = int(duration_secs * frame_rate)
+
+        f0_hz = 440.0 * 2 ** ((np.broadcast_to(note, (n,)) + voices["transpose"] - 69) / 12)
+        fr = torch.from_numpy(operator_ratios(voices, f0_hz)).float()
+        envelope = envelope_levels(voices["rates"], voices["levels"], n_frames, frame_rate, note_off_secs)
+        level = torch.from_numpy(np.where(voices["ol"] > 0, dexed_ol_to_amplitude(voices["ol"]), 0.0)).float()
+        ol = level[:, None] * torch.exp(LEVEL_STEP * (envelope - 99))
+
+        ol_up = upsample(ol, self.block_size, 'linear')
+        f0_up = torch.from_numpy(f0_hz).float()[:, None, None].expand(n, ol_up.shape[1], 1)
+        signal = fm_mixed(f0_up, ol_up, fr, torch.from_numpy(voices["alg"]), self.sample_rate, self.max_ol)
+        return signal.squeeze(-1)
+
+    def render_bank(self, syx_path, **kwargs):
+        """
+        [32, samples] audio and the voice names of a .syx bank
+        """
+        voices = decode_voices(DexedConverter().serializeToDict(syx_path))
+        return self.render(voices, **kwargs), voices["names"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("syx_path")
+    parser.add_argument("output_dir")
+    parser.add_argument("--note", type=int, default=60)
+    parser.add_argument("--duration-secs", type=float, default=4.0)
+    args = parser.parse_args()
+
+    renderer = BankRenderer()
+    t0 = time.perf_counter()
+    audio, names = renderer.render_bank(args.syx_path, note=args.note, duration_secs=args.duration_secs)
+    print(f"Rendered {len(names)} voices in {time.perf_counter() - t0:.2f}s")
+    os.makedirs(args.output_dir, exist_ok=True)
+    peak = audio.abs().amax(1, keepdim=True).clamp(min=1e-7)
+    for i, (name, y) in enumerate(zip(names, (audio / peak).numpy())):
+        sf.write(os.path.join(args.output_dir, f"{i:02d}-{name.replace('/', '_')}.wav"), y, renderer.sample_rate)
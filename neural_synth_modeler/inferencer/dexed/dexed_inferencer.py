@@ -1,10 +1,14 @@
-from neural_synth_modeler.inferencer.inferencer import Inferencer, InferenceInput, InferenceOutput
+from neural_synth_modeler.inferencer.inferencer import Inferencer, InferenceInput, InferenceOutput, get_eval_level
 from neural_synth_modeler.inferencer.dexed.models.preprocessor import ProcessData, F0LoudnessRMSPreprocessor
 from neural_synth_modeler.inferencer.dexed.models.ddx7.models import DDSP_Decoder, TCNFMDecoder
 from neural_synth_modeler.inferencer.dexed.models.ddx7.synth import FMSynth
+from neural_synth_modeler.inferencer.dexed.models.ddx7.loss_functions import ddsp_msfft_loss
 from neural_synth_modeler.inferencer.dexed.models.amp_utils import *
+from neural_synth_modeler.inferencer.preset_index import nearest_template
 from neural_synth_modeler.converter.dexed.dexed_converter import DexedConverter
 from neural_synth_modeler.utils.pitch_extractor import extract_pitch
+from neural_synth_modeler.utils.audio import AudioTooLongError, load_audio
+from neural_synth_modeler.utils.tracing import annotate, trace
 import yaml
 import torch
 import librosa
@@ -13,6 +17,9 @@ import pickle
 import os
 import numpy as np
 
+# scales of the "loss" eval level, the same 3 as eval.loss_scales of the Vital config. "full" uses all 6
+LOSS_EVAL_SCALES = [2048, 512, 128]
+
 
 class DexedInferenceOutput(InferenceOutput):
     def __init__(self):
@@ -27,11 +34,31 @@ class DexedInferenceInput(InferenceInput):
 
 
 class DexedInferencer(Inferencer):
-    def convert(self, audio_fname, model_pt_fname=None, enable_eval=False):
+    checkpoint = "checkpoints/state_best.pth"
+    # built by `preset_index.py dexed`; without it every preset starts from Dexed_01.syx voice 1
+    preset_index = "checkpoints/preset_index.npz"
+
+    def convert(self, audio_fname, model_pt_fname=None, enable_eval=False, pitch_backend=None):
         # TODO: convert should be more like framework. preprocess -> load_model -> inference -> post_process
         if model_pt_fname is None:
-            model_pt_fname = "neural_synth_modeler/inferencer/dexed/checkpoints/state_best.pth"
-            
+            model_pt_fname = os.path.join(
+                os.path.dirname(os.path.realpath(__file__)),
+                self.checkpoint
+            )
+
+        inference_input = self.preprocess(audio_fname, pitch_backend=pitch_backend)
+        with trace("preset_template"):
+            template = nearest_template(
+                os.path.join(os.path.dirname(os.path.realpath(__file__)), self.preset_index),
+                inference_input.x["audio"][0].numpy())
+
+        model = self.get_model(model_pt_fname, self.device)
+        inference_output = self.inference(model, inference_input, self.device, enable_eval=enable_eval)
+        with trace("convert_to_preset"):
+            synth_params_dict = self.convert_to_preset(inference_output, template=template)
+        return synth_params_dict, inference_output.eval_dict
+
+    def preprocess(self, audio_fname, pitch_backend=None):
         with open(
             os.path.join(
                 os.path.dirname(os.path.realpath(__file__)),
@@ -53,12 +80,18 @@ class DexedInferencer(Inferencer):
             center=data_config["data_processor"]["center"]
         )
 
-        audio, _ = librosa.load(audio_fname, sr=data_config["data_processor"]["sr"])
+        audio, _ = load_audio(audio_fname, data_config["data_processor"]["sr"])
+        # the decoder is trained on max_len blocks, shorter clips are zero-padded and longer ones rejected
+        if len(audio) > preprocessor.audio_size:
+            raise AudioTooLongError("Audio is {:.1f}s, Dexed converts clips of up to {}s".format(
+                len(audio) / preprocessor.sr, preprocessor.max_len))
+        audio = librosa.util.fix_length(audio, size=preprocessor.audio_size)
 
-        f0 = extract_pitch(audio, data_config["data_processor"]["sr"], block_size=64)
+        f0 = extract_pitch(audio, data_config["data_processor"]["sr"], block_size=64, backend=pitch_backend)
         f0 = f0.astype(np.float32)
-        loudness = preprocessor.calc_loudness(audio)
-        rms = preprocessor.calc_rms(audio)
+        with trace("loudness"):
+            loudness = preprocessor.calc_loudness(audio)
+            rms = preprocessor.calc_rms(audio)
 
         scaler = F0LoudnessRMSPreprocessor()
         x = {
@@ -71,11 +104,7 @@ class DexedInferencer(Inferencer):
 
         inference_input = DexedInferenceInput()
         inference_input.x = x
-
-        model = self.load_model(model_pt_fname, self.device)
-        inference_output = self.inference(model, inference_input, self.device, enable_eval=enable_eval)
-        synth_params_dict = self.convert_to_preset(inference_output)
-        return synth_params_dict, inference_output.eval_dict
+        return inference_input
 
     def load_model(self, model_pt_fname, device="cuda"):
         with open(
@@ -113,6 +142,11 @@ class DexedInferencer(Inferencer):
         return model
     
     def inference(self, model, inference_input, device="cuda", enable_eval=False):
+        """
+        enable_eval: True / False or an eval level, see `get_eval_level`. the FM resynthesis is part of the
+        forward pass, so every level costs the same except for the loss STFTs.
+        """
+        eval_level = get_eval_level(enable_eval)
         if device == "cuda":
             inference_input.audio = inference_input.x["audio"].cuda()
             inference_input.f0 = inference_input.x["f0"].cuda()
@@ -120,18 +154,44 @@ class DexedInferencer(Inferencer):
             inference_input.rms = inference_input.x["rm"].cuda()
         
         # forward pass
-        synth_out = model(inference_input.x)
+        annotate("batch_size", inference_input.x["audio"].shape[0])
+        with trace("model_forward"):
+            synth_out = model(inference_input.x)
 
         inference_output = DexedInferenceOutput()
         inference_output.synth_audio = synth_out["synth_audio"]
         inference_output.ol = synth_out["ol"]
 
+        if eval_level != "off":
+            with trace("eval"):
+                self.eval(inference_input.x["audio"], synth_out["synth_audio"], inference_output, eval_level)
+
         return inference_output
-    
-    def convert_to_preset(self, inference_output):
 
+    def eval(self, y, output, inference_output, eval_level="full"):
+        with torch.no_grad():
+            if eval_level == "loss":
+                loss = ddsp_msfft_loss(y[:1], output[:1], scales=LOSS_EVAL_SCALES)
+            else:
+                loss = ddsp_msfft_loss(y[:1], output[:1])
+        inference_output.eval_dict["loss"] = loss.item()
+        if eval_level == "full":
+            inference_output.eval_dict["output"] = output[0].cpu().detach().numpy().squeeze()
+    
+    def convert_to_preset(self, inference_output, template=None):
+        """
+        template: (id, path, voice, similarity) from `nearest_template`; that bank voice is the starting point
+        of voice 1 instead of Dexed_01.syx voice 1
+        """
         dx_converter = DexedConverter()
-        params_dict = dx_converter.serializeToDict("neural_synth_modeler/inferencer/dexed/Dexed_01.syx")
+        if template is not None:
+            annotate("preset_template", template[0])
+            params_dict = dx_converter.serializeToDict(template[1])
+            params_dict[0] = dict(params_dict[template[2]])
+        else:
+            params_dict = dx_converter.serializeToDict(
+                os.path.join(os.path.dirname(os.path.realpath(__file__)), "Dexed_01.syx")
+            )
 
         lst = []
         for idx in range(6):
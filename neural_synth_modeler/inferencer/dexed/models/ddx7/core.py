@@ -4,6 +4,7 @@ import torch.fft as fft
 import numpy as np
 import librosa as li
 import math
+import functools
 
 _DB_RANGE = 80.0 #Min loudness
 _REF_DB = 20.7  # White noise, amplitude=1.0, n_fft=2048
@@ -83,6 +84,14 @@ def mean_std_loudness(dataset):
     return mean, std
 
 
+@functools.lru_cache(maxsize=64)
+def hann_window(size, device, dtype):
+    """
+    hann window cached per (size, device, dtype)
+    """
+    return torch.hann_window(size, device=device, dtype=dtype)
+
+
 def multiscale_fft(signal, scales, overlap):
     stfts = []
     for s in scales:
@@ -91,7 +100,7 @@ def multiscale_fft(signal, scales, overlap):
             s,
             int(s * (1 - overlap)),
             s,
-            torch.hann_window(s).to(signal),
+            hann_window(s, signal.device, signal.dtype),
             True,
             normalized=True,
             return_complex=True,
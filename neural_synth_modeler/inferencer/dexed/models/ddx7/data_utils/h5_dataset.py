@@ -1,6 +1,7 @@
-from torch.utils.data import Dataset
+from torch.utils.data import ConcatDataset, Dataset
 import h5py
 import numpy as np
+import os
 import random
 import torch
 import math
@@ -51,3 +52,123 @@ class h5Dataset(Dataset):
 
     def __len__(self):
         return self.dataset_len
+
+
+class h5RowDataset(Dataset):
+    '''
+    Same items as h5Dataset, from a file in the row layout written by `convert_to_rows`:
+    one [n_items, length] dataset per feature. Nothing is loaded up front. Contiguous datasets are
+    memory-mapped and items are zero-copy `torch.from_numpy` views of their row; chunked (compressed)
+    datasets are read row by row. Files are opened lazily in each DataLoader worker process.
+    '''
+    def __init__(self, sr, data_path, input_keys, max_audio_val=1, device='cpu'):
+        self.sr = sr
+        self.data_path = data_path
+        self.max_audio_val = max_audio_val
+        self.input_keys = input_keys
+        self.device = device
+        with h5py.File(data_path, 'r') as h5f:
+            if h5f.attrs.get('layout') != 'rows':
+                raise ValueError(f'{data_path} is not in the row layout, convert it with convert_to_rows')
+            self.dataset_len = len(h5f[input_keys[0]])
+        self._pid = None
+        self._h5f = None
+        self._features = None
+
+    def open(self):
+        '''
+        Per-process handles: memmaps of contiguous datasets, h5py datasets otherwise
+        '''
+        self._h5f = h5py.File(self.data_path, 'r')
+        self._features = {}
+        for k in self.input_keys:
+            ds = self._h5f[k]
+            offset = ds.id.get_offset()
+            if ds.chunks is None and ds.compression is None and offset is not None:
+                # copy-on-write, so the views are writable without touching the file
+                self._features[k] = np.memmap(self.data_path, dtype=ds.dtype, mode='c', offset=offset, shape=ds.shape)
+            else:
+                self._features[k] = ds
+        self._pid = os.getpid()
+
+    def __getstate__(self):
+        # handles are not shared with (or pickled for) worker processes
+        state = self.__dict__.copy()
+        state.update(_pid=None, _h5f=None, _features=None)
+        return state
+
+    def __getitem__(self, idx):
+        if self._pid != os.getpid():
+            self.open()
+        if idx < 0 or idx >= self.dataset_len:
+            raise IndexError(idx)
+
+        x = {}
+        for k in self.input_keys:
+            row = self._features[k][idx]
+            x[k] = torch.from_numpy(np.asarray(row)).unsqueeze(-1).to(self.device)
+        return x
+
+    def __len__(self):
+        return self.dataset_len
+
+
+class h5ShardDataset(ConcatDataset):
+    '''
+    Items of several h5 shards (e.g. the `{sr}_<n>.h5` shards of ProcessData.run_on_dirs or the `shard_XXXX.h5`
+    of DexedGenerator) as one dataset. Each shard is read by h5RowDataset or h5Dataset, depending on its layout.
+    `shard_starts` lets ShardShuffleSampler shuffle shard by shard.
+    '''
+    def __init__(self, sr, data_paths, input_keys, max_audio_val=1, device='cpu'):
+        datasets = []
+        for path in data_paths:
+            with h5py.File(path, 'r') as h5f:
+                rows = h5f.attrs.get('layout') == 'rows'
+            dataset_cls = h5RowDataset if rows else h5Dataset
+            datasets.append(dataset_cls(sr, path, input_keys, max_audio_val=max_audio_val, device=device))
+        ConcatDataset.__init__(self, datasets)
+        self.data_paths = list(data_paths)
+        self.shard_starts = np.concatenate([[0], self.cumulative_sizes])
+
+
+def convert_to_rows(src_path, dst_path, keys=('audio', 'f0', 'loudness', 'rms'), chunked=False, compression=None):
+    '''
+    Rewrites a `{counter}_{key}` file (ProcessData.save_data) as one [n_items, length] dataset per key.
+    The default contiguous layout is memory-mappable; chunked=True stores one chunk per row, which allows compression.
+    Items are copied one at a time, so the source never has to fit in RAM.
+    '''
+    with h5py.File(src_path, 'r') as src:
+        n_items = len(src.keys()) // len(keys)
+        if n_items * len(keys) != len(src.keys()):
+            raise ValueError("Unexpected dataset len.")
+
+        with h5py.File(dst_path, 'w') as dst:
+            dst.attrs['layout'] = 'rows'
+            for k in keys:
+                first = src[f'0_{k}']
+                shape = (n_items,) + first.shape
+                if chunked or compression is not None:
+                    ds = dst.create_dataset(k, shape=shape, dtype=first.dtype,
+                                            chunks=(1,) + first.shape, compression=compression)
+                else:
+                    ds = dst.create_dataset(k, shape=shape, dtype=first.dtype)
+                for i in range(n_items):
+                    item = src[f'{i}_{k}']
+                    if item.shape != first.shape:
+                        raise ValueError(f'{i}_{k} has shape {item.shape}, expected {first.shape}: '
+                                         'only fixed-length blocks (contiguous=False) can be stored as rows')
+                    ds[i] = item[()]
+    return n_items
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert a {counter}_{key} h5 file to the row layout of h5RowDataset")
+    parser.add_argument("src")
+    parser.add_argument("dst")
+    parser.add_argument("--keys", nargs="+", default=['audio', 'f0', 'loudness', 'rms'])
+    parser.add_argument("--chunked", action="store_true")
+    parser.add_argument("--compression", default=None, help="e.g. gzip or lzf, implies --chunked")
+    args = parser.parse_args()
+    n_items = convert_to_rows(args.src, args.dst, keys=args.keys, chunked=args.chunked, compression=args.compression)
+    print(f"Converted {n_items} items to {args.dst}")
@@ -0,0 +1,276 @@
+'''
+FM operator graph engine.
+
+An FM patch is a graph of operators: modulators add their output to the phase of
+the operators they modulate, and carriers are summed to the output. FMGraph sorts
+the operators of a topology into levels (an operator only depends on operators of
+lower levels) and evaluates each level with one batched sin over all its
+operators, on top of a single phase accumulation shared by all of them.
+
+DX7_ALGORITHMS holds the 32 DX7 algorithms, indexed by the ALG parameter (0-31)
+of dexed_constants. Operators are numbered 1-6 as on the DX7 panel.
+'''
+import functools
+import numpy as np
+import torch
+from neural_synth_modeler.inferencer.dexed.models.ddx7.core import cumsum_nd
+
+
+def alg(edges, carriers, feedback):
+    '''
+    edges: (modulator, modulated) pairs, carriers: operators summed to the output,
+    feedback: operator fed back into itself (or from the top of a loop, algorithms 4 and 6)
+    '''
+    return {'edges': tuple(edges), 'carriers': tuple(carriers), 'feedback': feedback}
+
+
+DX7_ALGORITHMS = [
+    alg([(2, 1), (6, 5), (5, 4), (4, 3)], [1, 3], 6),                       # 1
+    alg([(2, 1), (6, 5), (5, 4), (4, 3)], [1, 3], 2),                       # 2
+    alg([(3, 2), (2, 1), (6, 5), (5, 4)], [1, 4], 6),                       # 3
+    alg([(3, 2), (2, 1), (6, 5), (5, 4)], [1, 4], 4),                       # 4
+    alg([(2, 1), (4, 3), (6, 5)], [1, 3, 5], 6),                            # 5
+    alg([(2, 1), (4, 3), (6, 5)], [1, 3, 5], 5),                            # 6
+    alg([(2, 1), (4, 3), (5, 3), (6, 5)], [1, 3], 6),                       # 7
+    alg([(2, 1), (4, 3), (5, 3), (6, 5)], [1, 3], 4),                       # 8
+    alg([(2, 1), (4, 3), (5, 3), (6, 5)], [1, 3], 2),                       # 9
+    alg([(3, 2), (2, 1), (5, 4), (6, 4)], [1, 4], 3),                       # 10
+    alg([(3, 2), (2, 1), (5, 4), (6, 4)], [1, 4], 6),                       # 11
+    alg([(2, 1), (4, 3), (5, 3), (6, 3)], [1, 3], 2),                       # 12
+    alg([(2, 1), (4, 3), (5, 3), (6, 3)], [1, 3], 6),                       # 13
+    alg([(2, 1), (4, 3), (5, 4), (6, 4)], [1, 3], 6),                       # 14
+    alg([(2, 1), (4, 3), (5, 4), (6, 4)], [1, 3], 2),                       # 15
+    alg([(2, 1), (3, 1), (4, 3), (5, 1), (6, 5)], [1], 6),                  # 16
+    alg([(2, 1), (3, 1), (4, 3), (5, 1), (6, 5)], [1], 2),                  # 17
+    alg([(2, 1), (3, 1), (4, 1), (5, 4), (6, 5)], [1], 3),                  # 18
+    alg([(3, 2), (2, 1), (6, 4), (6, 5)], [1, 4, 5], 6),                    # 19
+    alg([(3, 1), (3, 2), (5, 4), (6, 4)], [1, 2, 4], 3),                    # 20
+    alg([(3, 1), (3, 2), (6, 4), (6, 5)], [1, 2, 4, 5], 3),                 # 21
+    alg([(2, 1), (6, 3), (6, 4), (6, 5)], [1, 3, 4, 5], 6),                 # 22
+    alg([(3, 2), (6, 4), (6, 5)], [1, 2, 4, 5], 6),                         # 23
+    alg([(6, 3), (6, 4), (6, 5)], [1, 2, 3, 4, 5], 6),                      # 24
+    alg([(6, 4), (6, 5)], [1, 2, 3, 4, 5], 6),                              # 25
+    alg([(3, 2), (5, 4), (6, 4)], [1, 2, 4], 6),                            # 26
+    alg([(3, 2), (5, 4), (6, 4)], [1, 2, 4], 3),                            # 27
+    alg([(2, 1), (4, 3), (5, 4)], [1, 3, 6], 5),                            # 28
+    alg([(4, 3), (6, 5)], [1, 2, 3, 5], 6),                                 # 29
+    alg([(4, 3), (5, 4)], [1, 2, 3, 6], 5),                                 # 30
+    alg([(6, 5)], [1, 2, 3, 4, 5], 6),                                      # 31
+    alg([], [1, 2, 3, 4, 5, 6], 6),                                         # 32
+]
+
+# Topologies of the hand-coded synths in core.py, and whether they wrap the phase
+SYNTH_TOPOLOGIES = {
+    'fmstrings': (DX7_ALGORITHMS[1], True),
+    'fmflute': (DX7_ALGORITHMS[15], True),
+    'fmbrass': (DX7_ALGORITHMS[17], True),
+    'fmablbrass': (alg([(2, 1), (3, 1), (4, 3)], [1], None), True),
+    '2stack2': (alg([(2, 1), (4, 3)], [1, 3], None), False),
+    '1stack2': (alg([(2, 1)], [1], None), False),
+    '1stack4': (alg([(2, 1), (3, 2), (4, 3)], [1], None), False),
+}
+
+
+def select(x, ops):
+    '''
+    x[ops] along the first dim, as a strided view when ops are evenly spaced
+    '''
+    step = ops[1] - ops[0] if len(ops) > 1 else 1
+    if step > 0 and list(ops) == list(range(ops[0], ops[-1] + 1, step)):
+        return x[ops[0]:ops[-1] + 1:step]
+    return torch.stack([x[op] for op in ops])
+
+
+class FMGraph:
+    '''
+    Renders one FM topology. Called like the fm_* functions of core.py:
+    pitch [batch, len, 1] and ol [batch, len, 6] give [batch, len, 1].
+    Operator feedback is not rendered, as in the hand-coded synths.
+
+    wrap: wrap every operator phase to [0, 2pi), like fm_string_synth and the other
+    wrapping synths of core.py. The output is then identical to theirs.
+    wrap_omega: with integer frequency ratios, wrap the shared phase once instead.
+    This skips the remainder per operator (the slowest op of a level), but rounds
+    the phases differently.
+    '''
+    def __init__(self, edges, carriers, wrap=False, wrap_omega=False):
+        edges = [(m - 1, c - 1) for m, c in edges]
+        carriers = [c - 1 for c in carriers]
+        modulators = {op: [m for m, c in edges if c == op] for op in range(6)}
+
+        @functools.lru_cache(maxsize=None)
+        def depth(op):
+            return 1 + max(map(depth, modulators[op])) if modulators[op] else 0
+
+        # only operators on a path to a carrier are rendered
+        used, stack = set(), list(carriers)
+        while stack:
+            op = stack.pop()
+            if op not in used:
+                used.add(op)
+                stack.extend(modulators[op])
+        levels = [[] for _ in range(1 + max(depth(op) for op in used))]
+        for op in sorted(used):
+            levels[depth(op)].append(op)
+
+        self.wrap = wrap
+        self.wrap_omega = wrap_omega
+        # per level: operators, and the modulators of each of them (summed in operator order)
+        self.levels = [(level, [sorted(modulators[op]) for op in level]) for level in levels]
+        # carriers are summed from the highest operator down, like the hand-coded synths
+        self.carriers = sorted(carriers, reverse=True)
+
+    def __call__(self, pitch, ol, fr, sampling_rate, max_ol, use_safe_cumsum=False):
+        if use_safe_cumsum:
+            omega = cumsum_nd(2 * np.pi * pitch / sampling_rate, 2 * np.pi)
+        else:
+            omega = torch.cumsum(2 * np.pi * pitch / sampling_rate, 1)
+        omega = omega.squeeze(-1)                                   # [batch, len], shared by all operators
+        fr = torch.as_tensor(fr, device=omega.device).to(omega.dtype)
+        # with integer ratios, wrapping the shared phase once wraps every operator phase
+        wrap_ops = self.wrap
+        if self.wrap and self.wrap_omega and torch.equal(fr, fr.round()):
+            omega = omega % (2 * np.pi)
+            wrap_ops = False
+        ol = ol.permute(2, 0, 1)                                    # [6, batch, len] view
+        # without autograd, every level is computed in place in its phase buffer
+        inplace = not (torch.is_grad_enabled() and (ol.requires_grad or omega.requires_grad))
+
+        outs = {}
+        for level, modulators in self.levels:
+            index = torch.tensor(level, device=omega.device)
+            phase = fr[index][:, None, None] * omega                # [n_ops, batch, len]
+            if inplace:
+                if modulators[0]:
+                    mod = torch.empty_like(phase)
+                    for m, mods in zip(mod, modulators):
+                        if len(mods) == 1:
+                            torch.mul(outs[mods[0]], 2 * np.pi, out=m)
+                            continue
+                        torch.add(outs[mods[0]], outs[mods[1]], out=m)
+                        for op in mods[2:]:
+                            m.add_(outs[op])
+                        m.mul_(2 * np.pi)
+                    phase.add_(mod)
+                if wrap_ops:
+                    phase.remainder_(2 * np.pi)
+                out = phase.sin_()
+                for o, op in zip(out, level):
+                    o.mul_(ol[op])
+            else:
+                if modulators[0]:
+                    mod = []
+                    for mods in modulators:
+                        m = outs[mods[0]]
+                        for op in mods[1:]:
+                            m = m + outs[op]
+                        mod.append(m)
+                    phase = phase + 2 * np.pi * torch.stack(mod)
+                if wrap_ops:
+                    phase = phase % (2 * np.pi)
+                out = select(ol, level) * torch.sin(phase)
+            outs.update(zip(level, out))
+
+        signal = outs[self.carriers[0]]
+        for op in self.carriers[1:]:
+            signal = signal + outs[op]
+        return (signal / max_ol).unsqueeze(-1)
+
+
+@functools.lru_cache(maxsize=None)
+def fm_algorithm(algorithm):
+    '''
+    FMGraph of a DX7 algorithm, indexed by the ALG parameter (0-31)
+    '''
+    topology = DX7_ALGORITHMS[algorithm]
+    return FMGraph(topology['edges'], topology['carriers'], wrap=True, wrap_omega=True)
+
+
+@functools.lru_cache(maxsize=None)
+def fm_synth(name, exact=False):
+    '''
+    FMGraph of one of the FMSynth synth_module names. the recipe ratios are integers, so the shared phase
+    is wrapped once (wrap_omega); exact=True wraps every operator phase like the hand-coded fm_* functions
+    and gives bit-identical samples and gradients
+    '''
+    topology, wrap = SYNTH_TOPOLOGIES[name]
+    return FMGraph(topology['edges'], topology['carriers'], wrap, wrap_omega=not exact)
+
+
+@functools.lru_cache(maxsize=None)
+def algorithm_table():
+    '''
+    modulation [32, 6, 6] (modulator, operator) and carrier [32, 6] weights of the DX7 algorithms
+    '''
+    modulation, carrier = torch.zeros(32, 6, 6), torch.zeros(32, 6)
+    for i, topology in enumerate(DX7_ALGORITHMS):
+        for m, c in topology['edges']:
+            modulation[i, m - 1, c - 1] = 1
+        for c in topology['carriers']:
+            carrier[i, c - 1] = 1
+    return modulation, carrier
+
+
+MIXED_BLOCK_SIZE = 2 ** 18
+
+
+def mixed_phase(pitch, fr, sampling_rate):
+    '''
+    shared phase [batch, len] of fm_mixed voices, wrapped for the voices with integer ratios as in fm_algorithm
+    (a remainder per operator would cost more than the sin, so other voices are not wrapped, like fm_2stack2)
+    '''
+    omega = torch.cumsum(2 * np.pi * pitch / sampling_rate, 1).squeeze(-1)
+    fr = torch.as_tensor(fr, device=omega.device).to(omega.dtype).expand(len(omega), 6)
+    integer = (fr == fr.round()).all(1)
+    if integer.all():
+        return omega % (2 * np.pi)
+    if integer.any():
+        return torch.where(integer[:, None], omega % (2 * np.pi), omega)
+    return omega
+
+
+def mixed_weights(algorithms, device=None):
+    '''
+    modulation [batch, 6, 6] and carrier [batch, 6] weights of DX7 algorithms (ALG, 0-31)
+    '''
+    modulation, carrier = algorithm_table()
+    algorithms = torch.as_tensor(algorithms).long().cpu()
+    return modulation[algorithms].to(device), carrier[algorithms].to(device)
+
+
+@torch.no_grad()
+def fm_mixed_block(omega, ol, fr, modulation, carrier, max_ol):
+    '''
+    fm_mixed on one block of samples: omega [batch, len] from mixed_phase, ol [batch, len, 6]; gives [batch, len]
+    '''
+    batch, length = omega.shape
+    fr = torch.as_tensor(fr, device=omega.device).to(omega.dtype).expand(batch, 6)
+    outs = torch.empty(batch, 6, length, dtype=omega.dtype, device=omega.device)
+    for op in range(5, -1, -1):
+        phase = fr[:, op, None] * omega
+        if op < 5:
+            mod = torch.bmm(modulation[:, None, op + 1:, op], outs[:, op + 1:]).squeeze(1)
+            phase.add_(mod.mul_(2 * np.pi))
+        torch.mul(ol[..., op], phase.sin_(), out=outs[:, op])
+    return torch.bmm(carrier[:, None], outs).squeeze(1).div_(max_ol)
+
+
+def fm_mixed(pitch, ol, fr, algorithms, sampling_rate, max_ol, block=None):
+    '''
+    Renders voices that each have their own DX7 algorithm in one call (no autograd).
+    pitch [batch, len, 1], ol [batch, len, 6], fr [batch, 6] or [6], algorithms [batch] (ALG, 0-31).
+    Every DX7 algorithm uses all 6 operators and only lets an operator modulate a lower one,
+    so the operators are evaluated from OP6 down, each one batched over all voices, and
+    the algorithm only changes the modulation and carrier weights (one bmm per operator).
+    The samples are rendered in blocks of `block` samples (about MIXED_BLOCK_SIZE values per
+    buffer by default), so the operator buffers of a large batch stay in cache.
+    '''
+    omega = mixed_phase(pitch, fr, sampling_rate)
+    block = block or max(1024, MIXED_BLOCK_SIZE // len(omega))
+    modulation, carrier = mixed_weights(algorithms, omega.device)
+    modulation, carrier = modulation.to(omega.dtype), carrier.to(omega.dtype)
+    signal = torch.empty_like(omega)
+    for start in range(0, omega.shape[1], block):
+        end = start + block
+        signal[:, start:end] = fm_mixed_block(omega[:, start:end], ol[:, start:end], fr, modulation, carrier, max_ol)
+    return signal.unsqueeze(-1)
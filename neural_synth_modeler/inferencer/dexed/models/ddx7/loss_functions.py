@@ -1,9 +1,25 @@
-import ddx7.core as core
+import neural_synth_modeler.inferencer.dexed.models.ddx7.core as core
 import torch
 import torch.nn as nn
 from functools import partial
 
 
+def batched_multiscale_fft(a1, a2, scales, overlap):
+    '''
+    multiscale spectra of the target a1 and the output a2. as in the vital MultiscaleSpectralLoss, both only go
+    through each STFT as one batch without autograd on GPU: on CPU batching only costs a copy, and with autograd
+    it would backprop through the target STFTs too.
+    '''
+    if a2.device.type == "cpu" or (torch.is_grad_enabled() and a2.requires_grad):
+        with torch.no_grad():
+            ori_stft = core.multiscale_fft(a1, scales, overlap)
+        return ori_stft, core.multiscale_fft(a2, scales, overlap)
+
+    n = a1.shape[0]
+    stfts = core.multiscale_fft(torch.cat([a1, a2]), scales, overlap)
+    return [S[:n] for S in stfts], [S[n:] for S in stfts]
+
+
 '''
 Asimetric L1 distance
 '''
@@ -29,16 +45,7 @@ def asim_msfft_loss(a1,
         a1 = a1.squeeze(-1)
     if(len(a2.size()) == 3):
         a2 = a2.squeeze(-1)
-    ori_stft = core.multiscale_fft(
-        a1,
-        scales,
-        overlap,
-    )
-    rec_stft = core.multiscale_fft(
-        a2,
-        scales,
-        overlap,
-    )
+    ori_stft, rec_stft = batched_multiscale_fft(a1, a2, scales, overlap)
 
     loss = 0
     for s_x, s_y in zip(ori_stft, rec_stft):
@@ -64,16 +71,7 @@ def ddsp_msfft_loss(a1,
         a1 = a1.squeeze(-1)
     if(len(a2.size()) == 3):
         a2 = a2.squeeze(-1)
-    ori_stft = core.multiscale_fft(
-        a1,
-        scales,
-        overlap,
-    )
-    rec_stft = core.multiscale_fft(
-        a2,
-        scales,
-        overlap,
-    )
+    ori_stft, rec_stft = batched_multiscale_fft(a1, a2, scales, overlap)
 
     loss = 0
     for s_x, s_y in zip(ori_stft, rec_stft):
@@ -6,7 +6,7 @@ import librosa
 from neural_synth_modeler.inferencer.dexed.models.ddx7.core import _DB_RANGE,_REF_DB
 import math
 import numpy as np
-from time import time
+from neural_synth_modeler.utils.tracing import trace
 
 _RMS_FRAME = 2048
 _CREPE_WIN_LEN = 1024
@@ -28,19 +28,17 @@ def calc_f0(audio, rate, hop_size,fmin,fmax,model,
 
     audio = torch.from_numpy(audio).unsqueeze(0).float().to(device)
 
-    t1 = time()
-    print("predicting...")
-    crepe_tuple = torchcrepe.predict(audio,
-                        rate,
-                        hop_size,
-                        fmin,
-                        fmax,
-                        model,
-                        return_periodicity=True,
-                        batch_size=batch_size,
-                        device=device,
-                        pad=center)
-    print("done...", time() - t1)
+    with trace("pitch"):
+        crepe_tuple = torchcrepe.predict(audio,
+                            rate,
+                            hop_size,
+                            fmin,
+                            fmax,
+                            model,
+                            return_periodicity=True,
+                            batch_size=batch_size,
+                            device=device,
+                            pad=center)
 
     f0 = crepe_tuple[0]
     confidence = crepe_tuple[1]
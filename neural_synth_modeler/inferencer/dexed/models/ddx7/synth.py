@@ -2,6 +2,7 @@ import torch
 import torch.nn as nn
 import math
 from neural_synth_modeler.inferencer.dexed.models.ddx7.core import *
+from neural_synth_modeler.inferencer.dexed.models.ddx7.fm_graph import fm_algorithm, fm_synth
 import soundfile as sf
 import librosa
 
@@ -29,16 +30,11 @@ class FMSynth(nn.Module):
         self.max_ol = max_ol
         self.is_reverb = is_reverb
 
-        available_synths = {
-            'fmbrass': fm_brass_synth,
-            'fmflute': fm_flute_synth,
-            'fmstrings': fm_string_synth,
-            'fmablbrass': fm_ablbrass_synth,
-            '2stack2': fm_2stack2,
-            '1stack2':fm_1stack2,
-            '1stack4': fm_1stack4}
-
-        self.synth_module = available_synths[synth_module]
+        # synth_module: one of the fm_graph.SYNTH_TOPOLOGIES names, or a DX7 algorithm (ALG, 0-31)
+        if isinstance(synth_module, int):
+            self.synth_module = fm_algorithm(synth_module)
+        else:
+            self.synth_module = fm_synth(synth_module)
 
     def forward(self,controls):
 
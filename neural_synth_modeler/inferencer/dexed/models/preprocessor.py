@@ -2,6 +2,10 @@ import torch
 import operator
 import functools
 import h5py
+import json
+import multiprocessing
+import os
+import time
 from pathlib import Path
 from tqdm import tqdm
 import numpy as np
@@ -143,6 +147,64 @@ class ProcessData():
     def close_h5(self, h5f):
         h5f.close()
 
+    def process_file(self, audio_file):
+        '''
+        Splits one file into blocks and extracts their features.
+        Returns the (audio, f0, loudness, rms) blocks and the seconds spent in each stage.
+        '''
+        timings = dict.fromkeys(['load', 'split', 'f0', 'loudness', 'rms'], 0.0)
+        blocks = []
+        if(self.debug): print("Processing: {}".format(audio_file))
+
+        # load and split files
+        start = time.perf_counter()
+        data, sr = librosa.load(audio_file.as_posix(), sr=self.sr)
+        data = librosa.util.normalize(data) # Peak-normalize audio
+        timings['load'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        sounds_indices = []
+        if(self.contiguous):
+            sounds_indices.append([0,len(data)])
+        else:
+            sounds_indices = librosa.effects.split(data, top_db=self.silence_thresh_dB)
+            #print("[DEBUG] Sound indices {}".format(sounds_indices))
+            sounds_indices = self.process_indices(sounds_indices)
+        timings['split'] += time.perf_counter() - start
+
+        for indices in sounds_indices:
+            audio = data[indices[0]:indices[1]]
+            if(self.debug): print("\tIndexes: {} {} - len: {}".format(indices[0],indices[1],indices[1]-indices[0]))
+
+            # Feature retrieval segment
+            start = time.perf_counter()
+            try: # Only process audio with enough CREPE confidence
+                f0 = self.extract_f0(audio)
+            except ValueError:
+                continue
+            finally:
+                timings['f0'] += time.perf_counter() - start
+
+            # Further downsamples the audio back to the other specified sample rates and returns a dictionary.
+            start = time.perf_counter()
+            loudness = self.calc_loudness(audio)
+            timings['loudness'] += time.perf_counter() - start
+            start = time.perf_counter()
+            rms = self.calc_rms(audio)
+            timings['rms'] += time.perf_counter() - start
+            if(self.contiguous):
+                if(self.contiguous_clip_noise):
+                    if(self.debug): print("[DEBUG] clipping noise")
+                    clip_pos = (f0 > 1900.0)
+                    loudness[clip_pos] = -_DB_RANGE
+                audio = self.pad_to_expected_size(audio,f0.shape[0]*self.hop_size,0)
+
+            else:
+                audio = self.pad_to_expected_size(audio,self.audio_size,0)
+            blocks.append((audio, f0, loudness, rms))
+
+        return blocks, timings
+
     '''
     Main audio processing function
     '''
@@ -156,45 +218,8 @@ class ProcessData():
         counter = 0
 
         for audio_file in tqdm(audio_files):
-            if(self.debug): print("Processing: {}".format(audio_file))
-
-            # load and split files
-            data, sr = librosa.load(audio_file.as_posix(), sr=self.sr)
-            data = librosa.util.normalize(data) # Peak-normalize audio
-            sounds_indices = []
-            if(self.contiguous):
-                sounds_indices.append([0,len(data)])
-            else:
-                sounds_indices = librosa.effects.split(data, top_db=self.silence_thresh_dB)
-                #print("[DEBUG] Sound indices {}".format(sounds_indices))
-                sounds_indices = self.process_indices(sounds_indices)
-            if len(sounds_indices) == 0:
-                continue
-
-
-            for indices in sounds_indices:
-                audio = data[indices[0]:indices[1]]
-                if(self.debug): print("\tIndexes: {} {} - len: {}".format(indices[0],indices[1],indices[1]-indices[0]))
-
-                # Feature retrieval segment
-
-                try: # Only process audio with enough CREPE confidence
-                    f0 = self.extract_f0(audio)
-                except ValueError:
-                    continue
-
-                # Further downsamples the audio back to the other specified sample rates and returns a dictionary.
-                loudness = self.calc_loudness(audio)
-                rms = self.calc_rms(audio)
-                if(self.contiguous):
-                    if(self.contiguous_clip_noise):
-                        if(self.debug): print("[DEBUG] clipping noise")
-                        clip_pos = (f0 > 1900.0)
-                        loudness[clip_pos] = -_DB_RANGE
-                    audio = self.pad_to_expected_size(audio,f0.shape[0]*self.hop_size,0)
-
-                else:
-                    audio = self.pad_to_expected_size(audio,self.audio_size,0)
+            blocks, _ = self.process_file(audio_file)
+            for audio, f0, loudness, rms in blocks:
                 if(self.debug): print(f'\t Store block {counter}: f0 : {f0.shape} - loudness : {loudness.shape} - rms {rms.shape} - audio : {audio.shape}')
                 counter = self.save_data(audio, f0, loudness, rms, h5f, counter)
 
@@ -202,11 +227,154 @@ class ProcessData():
         self.close_h5(h5f)
 
 
-    def run_on_dirs(self, input_dir: Path, output_dir: Path):
-        #print("Starting with crepe confidence: {}".format(self.crepe_params.confidence_threshold))
-        folders = [x for x in input_dir.glob('./*') if x.is_dir()]
-        for folder in tqdm(folders):
-            self.run_on_files(folder.name, input_dir, output_dir)
+    def run_on_dirs(self, input_dir: Path, output_dir: Path, num_workers=1, shard_size=256):
+        '''
+        Processes every folder of `input_dir` into `output_dir/<folder>/{sr}_<shard>.h5` shards in the
+        `{counter}_{key}` layout, each shard readable on its own by h5Dataset.
+        `num_workers` processes extract features, this process is the only writer. A shard is written to a
+        temporary file and renamed once full, then its source files are recorded in `output_dir/manifest.json`,
+        so an interrupted run resumes with the files that are not in a finished shard.
+        Returns the per-stage throughput, also stored in the manifest.
+        '''
+        output_dir.mkdir(parents=True, exist_ok=True)
+        manifest = DatasetManifest(output_dir / 'manifest.json')
+        folders = sorted(x for x in input_dir.glob('./*') if x.is_dir())
+        pending = [f for folder in folders for f in sorted(folder.glob('*.wav'))
+                   if not manifest.is_done(f.relative_to(input_dir).as_posix())]
+        print(f"{len(pending)} files to process, {len(manifest.files)} already done")
+
+        writers = {}
+        stats = dict.fromkeys(['load', 'split', 'f0', 'loudness', 'rms', 'write'], 0.0)
+        n_files, n_blocks, start = 0, 0, time.perf_counter()
+
+        if num_workers > 1:
+            pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(self,))
+            results = pool.imap_unordered(_process_file, pending)
+        else:
+            pool = None
+            results = ((f, *self.process_file(f)) for f in pending)
+
+        try:
+            for audio_file, blocks, timings in tqdm(results, total=len(pending)):
+                for stage, secs in timings.items():
+                    stats[stage] += secs
+                folder = audio_file.parent.name
+                if folder not in writers:
+                    writers[folder] = ShardWriter(self, output_dir / folder, manifest)
+                write_start = time.perf_counter()
+                writers[folder].add(audio_file.relative_to(input_dir).as_posix(), blocks, shard_size)
+                stats['write'] += time.perf_counter() - write_start
+                n_files += 1
+                n_blocks += len(blocks)
+            for writer in writers.values():
+                writer.finish()
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        elapsed = time.perf_counter() - start
+        report = {
+            'files': n_files,
+            'blocks': n_blocks,
+            'wall_secs': elapsed,
+            'files_per_sec': n_files / elapsed if elapsed > 0 else 0.0,
+            # summed over the workers, so with num_workers > 1 a stage can exceed the wall time
+            'stage_secs': stats,
+            'stage_blocks_per_sec': {k: n_blocks / v if v > 0 else None for k, v in stats.items()},
+        }
+        manifest.save(stats=report)
+        for stage, secs in stats.items():
+            print(f"{stage:>10}: {secs:8.2f} s")
+        print(f"{n_files} files, {n_blocks} blocks in {elapsed:.1f} s")
+        return report
+
+
+_worker_processor = None
+
+
+def _init_worker(processor):
+    global _worker_processor
+    # one thread per worker, the processes already use every core
+    torch.set_num_threads(1)
+    _worker_processor = processor
+
+
+def _process_file(audio_file):
+    return (audio_file, *_worker_processor.process_file(audio_file))
+
+
+class DatasetManifest():
+    """Files done and finished shards of a `run_on_dirs` output, saved atomically."""
+    def __init__(self, path):
+        self.path = path
+        self.files = {}       # relative audio path -> shard name
+        self.shards = {}      # shard name -> number of blocks
+        self.stats = None
+        if path.exists():
+            with open(path) as f:
+                saved = json.load(f)
+            self.files, self.shards = saved['files'], saved['shards']
+
+    def is_done(self, audio_name):
+        return audio_name in self.files
+
+    def add_shard(self, shard_name, n_blocks, audio_names):
+        self.shards[shard_name] = n_blocks
+        for audio_name in audio_names:
+            self.files[audio_name] = shard_name
+        self.save()
+
+    def save(self, stats=None):
+        if stats is not None:
+            self.stats = stats
+        tmp = self.path.with_suffix('.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'files': self.files, 'shards': self.shards, 'stats': self.stats}, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+class ShardWriter():
+    """Appends blocks to `{sr}_<n>.h5` shards of one folder, a file's blocks never straddle two shards."""
+    def __init__(self, processor, data_dir, manifest):
+        self.processor = processor
+        self.data_dir = data_dir
+        self.manifest = manifest
+        data_dir.mkdir(parents=True, exist_ok=True)
+        # shards left as .tmp by an interrupted run are incomplete, their files are processed again
+        for tmp in data_dir.glob('*.h5.tmp'):
+            tmp.unlink()
+        # as are shards renamed right before the manifest could be saved
+        for shard in data_dir.glob(f'{processor.sr}_*.h5'):
+            if shard.relative_to(manifest.path.parent).as_posix() not in manifest.shards:
+                shard.unlink()
+        self.shard_idx = 1 + max([int(shard.stem.split('_')[-1]) for shard in data_dir.glob(f'{processor.sr}_*.h5')],
+                                 default=-1)
+        self.h5f = None
+
+    def open(self):
+        self.shard_path = self.data_dir / f'{self.processor.sr}_{self.shard_idx:04d}.h5'
+        self.h5f = h5py.File(self.shard_path.with_suffix('.h5.tmp'), 'w')
+        self.counter = 0
+        self.audio_names = []
+
+    def add(self, audio_name, blocks, shard_size):
+        if self.h5f is None:
+            self.open()
+        for audio, f0, loudness, rms in blocks:
+            self.counter = self.processor.save_data(audio, f0, loudness, rms, self.h5f, self.counter)
+        self.audio_names.append(audio_name)
+        if self.counter >= shard_size:
+            self.finish()
+
+    def finish(self):
+        if self.h5f is None:
+            return
+        self.h5f.close()
+        os.replace(self.shard_path.with_suffix('.h5.tmp'), self.shard_path)
+        self.manifest.add_shard(self.shard_path.relative_to(self.manifest.path.parent).as_posix(),
+                                self.counter, self.audio_names)
+        self.shard_idx += 1
+        self.h5f = None
 
 
 class F0LoudnessRMSPreprocessor():
@@ -226,4 +394,29 @@ class F0LoudnessRMSPreprocessor():
 
     def scale_f0_hz(self,f0_hz):
         """Scales [0, Nyquist] Hz to [0, 1.0] MIDI-scaled."""
-        return hz_to_midi(f0_hz) / _F0_RANGE
\ No newline at end of file
+        return hz_to_midi(f0_hz) / _F0_RANGE
+
+
+if __name__ == "__main__":
+    import argparse
+    import yaml
+    parser = argparse.ArgumentParser(description="Build (or resume building) sharded DDX7 training data")
+    parser.add_argument("input_dir", type=Path, help="one folder of .wav files per instrument")
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--config", default=os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                                         "conf/data_config.yaml"))
+    parser.add_argument("--num-workers", type=int, default=None, help="default: urmp.num_workers of the config")
+    parser.add_argument("--shard-size", type=int, default=256, help="blocks per shard")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        data_config = yaml.safe_load(f)
+    params = data_config["data_processor"]
+    processor = ProcessData(
+        silence_thresh_dB=params["silence_thresh_dB"], sr=params["sr"], device=params["device"],
+        seq_len=params["seq_len"], crepe_params=params["crepe_params"], loudness_params=params["loudness_params"],
+        rms_params=params["rms_params"], hop_size=params["hop_size"], max_len=params["max_len"],
+        center=params["center"], debug=params["debug"]
+    )
+    num_workers = args.num_workers if args.num_workers is not None else data_config["urmp"]["num_workers"]
+    processor.run_on_dirs(args.input_dir, args.output_dir, num_workers=num_workers, shard_size=args.shard_size)
@@ -1,6 +1,74 @@
 """
 Connects model output to synth preset parameter IR.
 """
+import itertools
+import os
+from neural_synth_modeler.utils.tracing import annotate, trace
+
+EVAL_LEVELS = ["off", "loss", "full"]
+
+# loaded models shared by every inferencer instance: {(inferencer class, checkpoint, device): model}
+_model_cache = {}
+
+
+def _tensors(value):
+    """
+    tensors in a state_dict value, including the int8 weights packed into the ScriptObjects of quantized layers
+    """
+    import torch
+    if isinstance(value, torch.Tensor):
+        yield value
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _tensors(item)
+    elif isinstance(value, torch._C.ScriptObject):
+        yield from _tensors(value.__getstate__())
+
+
+def model_bytes(model, model_pt_fname):
+    """
+    memory of a loaded model: its parameters, buffers and state_dict tensors (packed quantized weights are not
+    parameters) for torch modules, the model file size for other runtimes (e.g. an onnxruntime session)
+    """
+    if not hasattr(model, "state_dict"):
+        return os.path.getsize(model_pt_fname)
+    tensors = {}
+    for value in itertools.chain(model.parameters(), model.buffers(), model.state_dict(keep_vars=True).values()):
+        for t in _tensors(value):
+            tensors[(t.data_ptr(), t.dtype, t.shape)] = t.numel() * t.element_size()
+    return sum(tensors.values())
+
+
+def cached_model_bytes(inferencer_cls):
+    """
+    memory of the models `inferencer_cls` holds in the model cache, see `model_bytes`
+    """
+    total = 0
+    for (name, model_pt_fname, _), model in _model_cache.items():
+        if name == inferencer_cls.__name__:
+            total += model_bytes(model, model_pt_fname)
+    return total
+
+
+def get_eval_level(enable_eval, supported=EVAL_LEVELS):
+    """
+    `enable_eval` as one of EVAL_LEVELS: "off", "loss" (spectral loss on a reduced set of scales, no output
+    waveform kept) or "full" (loss on all scales + reconstructed waveform in eval_dict["output"]).
+    booleans map to "off" / "full". `supported`: the levels the caller can serve, others raise ValueError.
+    """
+    if enable_eval is None or enable_eval is False:
+        level = "off"
+    elif enable_eval is True:
+        level = "full"
+    elif enable_eval not in EVAL_LEVELS:
+        raise ValueError("Unknown eval level {}, available: {}".format(enable_eval, EVAL_LEVELS))
+    else:
+        level = enable_eval
+    if level not in supported:
+        raise ValueError("Eval level {} is not supported here, available: {}".format(level, supported))
+    return level
+
+
 class InferenceInput:
     def __init__(self):
         return NotImplementedError
@@ -15,15 +83,32 @@ class InferenceOutput:
 
 
 class Inferencer:
+    # eval levels `inference` can serve
+    eval_levels = EVAL_LEVELS
+
     def __init__(self, device="cuda"):
         self.device = device
 
     def convert(self, model_pt_fname, audio_fname):
-        model = self.load_model(model_pt_fname, self.device)
+        model = self.get_model(model_pt_fname, self.device)
         inference_output = self.inference(model, audio_fname, self.device)
-        synth_params_dict = self.convert_to_preset(inference_output)
+        with trace("convert_to_preset"):
+            synth_params_dict = self.convert_to_preset(inference_output)
         return synth_params_dict, inference_output.eval_dict
     
+    def get_model(self, model_pt_fname, device="cuda"):
+        """
+        `load_model` through a process-wide cache, so each checkpoint is loaded once per worker.
+        """
+        key = (type(self).__name__, model_pt_fname, device)
+        model = _model_cache.get(key)
+        annotate("model_cache", "miss" if model is None else "hit")
+        if model is None:
+            with trace("model_load"):
+                model = self.load_model(model_pt_fname, device)
+            _model_cache[key] = model
+        return model
+
     def load_model(self, model_pt_fname, device="cuda"):
         return NotImplementedError
         
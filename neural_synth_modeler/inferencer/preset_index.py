@@ -0,0 +1,281 @@
+"""
+Nearest-preset retrieval over a rendered preset library, used by the inferencers to pick the template preset
+(instead of init.vital / Dexed_01.syx voice 1) that their predicted parameters are written into.
+
+Every preset is embedded from its rendered audio: log-magnitude multiscale STFTs pooled into log-spaced bands,
+summarized by their mean and standard deviation over time. Embeddings are L2-normalized and compared by
+cosine similarity. Libraries below IVF_MIN_PRESETS presets are searched by brute force; larger ones
+through an inverted file (k-means lists, the `n_probe` closest lists are scanned).
+Template paths are stored relative to the index file, so an index moved together with its template files keeps
+working. When a template file is missing at serving time, the inferencers fall back to their default template.
+
+Build (offline) and query:
+    python -m neural_synth_modeler.inferencer.preset_index vital <render_dir> <index.npz>
+    python -m neural_synth_modeler.inferencer.preset_index dexed <index.npz> bank1.syx bank2.syx ...
+    python -m neural_synth_modeler.inferencer.preset_index query <index.npz> audio.wav -k 5
+"""
+import argparse
+import functools
+import glob
+import logging
+import os
+import re
+import time
+import numpy as np
+import torch
+from neural_synth_modeler.inferencer.vital.models.core import multiscale_fft
+from neural_synth_modeler.utils.audio import load_audio
+
+SAMPLING_RATE = 16000
+SIGNAL_LENGTH = 4 * SAMPLING_RATE
+SCALES = [2048, 512, 128]
+OVERLAP = 0.75
+N_BANDS = 32
+FMIN, FMAX = 40.0, 8000.0
+IVF_MIN_PRESETS = 50000
+N_PROBE = 16
+
+
+@functools.lru_cache(maxsize=8)
+def band_matrix(scale, sampling_rate=SAMPLING_RATE, n_bands=N_BANDS):
+    """
+    [scale // 2 + 1, n_bands] averaging of STFT bins into log-spaced bands
+    """
+    freqs = np.arange(scale // 2 + 1) * sampling_rate / scale
+    edges = np.geomspace(FMIN, FMAX, n_bands + 1)
+    band = np.searchsorted(edges, freqs, side="right") - 1
+    matrix = np.zeros((len(freqs), n_bands), dtype=np.float32)
+    valid = (band >= 0) & (band < n_bands)
+    matrix[valid, band[valid]] = 1
+    return torch.from_numpy(matrix / np.maximum(matrix.sum(0), 1))
+
+
+@torch.no_grad()
+def audio_embedding(audio, sampling_rate=SAMPLING_RATE):
+    """
+    [n, SIGNAL_LENGTH] audio (or [SIGNAL_LENGTH]) -> [n, 2 * len(SCALES) * N_BANDS] normalized embeddings
+    """
+    audio = torch.as_tensor(audio, dtype=torch.float32)
+    audio = audio.reshape(-1, audio.shape[-1]) if audio.dim() > 1 else audio[None]
+    # RMS-normalized, so the gain of a render does not matter
+    audio = audio / audio.pow(2).mean(-1, keepdim=True).sqrt().clamp(min=1e-7)
+    features = []
+    for scale, S in zip(SCALES, multiscale_fft(audio, SCALES, OVERLAP)):
+        bands = torch.log1p(band_matrix(scale, sampling_rate).T @ S / 1e-4)      # [n, n_bands, frames], 0 in silence
+        features += [bands.mean(-1), bands.std(-1)]
+    features = torch.cat(features, -1)
+    return torch.nn.functional.normalize(features, dim=-1).numpy()
+
+
+def fix_length(audio, length=SIGNAL_LENGTH):
+    audio = np.asarray(audio, dtype=np.float32).reshape(-1)[:length]
+    return np.pad(audio, (0, length - len(audio)))
+
+
+def kmeans(x, n_lists, n_iter=20, seed=0):
+    """
+    spherical k-means centroids [n_lists, dim] and list of every row
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_lists, replace=False)]
+    for _ in range(n_iter):
+        assign = np.argmax(x @ centroids.T, 1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        sums[empty] = x[rng.choice(len(x), empty.sum())]
+        centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+    return centroids.astype(np.float32), np.argmax(x @ centroids.T, 1)
+
+
+def top_k(scores, k):
+    k = min(k, scores.shape[-1])
+    idx = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, idx, -1), axis=-1)
+    return np.take_along_axis(idx, order, -1)
+
+
+class PresetIndex:
+    """
+    embeddings [n, dim] of n presets, with their id, template path (relative to the index file, or absolute)
+    and voice (DX7 bank slot, -1 for Vital).
+    with centroids, rows are sorted by IVF list and list i is rows offsets[i]:offsets[i + 1].
+    """
+    def __init__(self, embeddings, ids, paths, voices, centroids=None, offsets=None):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.ids = np.asarray(ids, dtype=str)
+        self.paths = np.asarray(paths, dtype=str)
+        self.voices = np.asarray(voices, dtype=np.int64)
+        self.centroids = centroids
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, embeddings, ids, paths, voices=None, n_lists=None, seed=0):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        voices = np.full(len(embeddings), -1) if voices is None else np.asarray(voices)
+        if n_lists is None:
+            n_lists = int(np.sqrt(len(embeddings))) if len(embeddings) >= IVF_MIN_PRESETS else 0
+        if not n_lists:
+            return cls(embeddings, ids, paths, voices)
+        centroids, assign = kmeans(embeddings, n_lists, seed=seed)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+        return cls(embeddings[order], np.asarray(ids)[order], np.asarray(paths)[order], voices[order],
+                   centroids, offsets)
+
+    def save(self, path):
+        tmp = path + ".tmp.npz"
+        arrays = dict(embeddings=self.embeddings, ids=self.ids, paths=self.paths, voices=self.voices)
+        if self.centroids is not None:
+            arrays.update(centroids=self.centroids, offsets=self.offsets)
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f["embeddings"], f["ids"], f["paths"], f["voices"],
+                       f["centroids"] if "centroids" in f else None, f["offsets"] if "offsets" in f else None)
+
+    def search(self, queries, k=5, n_probe=N_PROBE):
+        """
+        queries [n, dim] (or [dim]) -> per query, the k nearest presets as (id, path, voice, cosine similarity)
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.embeddings.shape[1])
+        results = []
+        for q in queries:
+            if self.centroids is None:
+                rows = None
+                scores = self.embeddings @ q
+            else:
+                lists = top_k(self.centroids @ q, n_probe)
+                rows = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+                scores = self.embeddings[rows] @ q
+            best = top_k(scores, k)
+            rows = best if rows is None else rows[best]
+            results.append([(self.ids[r], self.paths[r], int(self.voices[r]), float(s))
+                            for r, s in zip(rows, scores[best])])
+        return results
+
+
+@functools.lru_cache(maxsize=4)
+def _load_index(path, mtime):
+    return PresetIndex.load(path)
+
+
+def load_index(path):
+    """
+    PresetIndex at `path`, loaded once per file version, or None when there is no index
+    """
+    if path is None or not os.path.exists(path):
+        return None
+    return _load_index(path, os.path.getmtime(path))
+
+
+def nearest_template(index_path, audio, n_probe=N_PROBE):
+    """
+    (id, path, voice, similarity) of the preset closest to `audio` (16 kHz), or None without an index or when
+    the template file of that preset is missing
+    """
+    index = load_index(index_path)
+    if index is None or len(index) == 0:
+        return None
+    preset_id, path, voice, similarity = index.search(audio_embedding(fix_length(audio)), k=1, n_probe=n_probe)[0][0]
+    path = os.path.join(os.path.dirname(index_path), path)
+    if not os.path.exists(path):
+        logging.warning("Template %s of preset %s not found, using the default template", path, preset_id)
+        return None
+    return preset_id, path, voice, similarity
+
+
+def index_relative(path, index_path):
+    return os.path.relpath(os.path.abspath(path), os.path.dirname(os.path.abspath(index_path)))
+
+
+def embed_files(files, batch_size=64):
+    embeddings = []
+    for start in range(0, len(files), batch_size):
+        audio = np.stack([fix_length(load_audio(f, SAMPLING_RATE)[0]) for f in files[start:start + batch_size]])
+        embeddings.append(audio_embedding(audio))
+    return np.concatenate(embeddings) if embeddings else np.zeros((0, 2 * len(SCALES) * N_BANDS), np.float32)
+
+
+def build_vital_index(render_dir, index_path, catalog_path=None):
+    """
+    index of the Vital presets rendered in render_dir, one "{idx}-..." directory of .wav renders per preset.
+    templates are the preset files recorded in the preset catalog.
+    """
+    from neural_synth_modeler.train.vital.vital_preprocessor import CATALOG_PATH, PresetCatalog
+    catalog = PresetCatalog(catalog_path or CATALOG_PATH)
+    ids, paths, files = [], [], []
+    for name in sorted(os.listdir(render_dir)):
+        m = re.match(r"(\d+)(-|$)", name)
+        wavs = sorted(glob.glob(os.path.join(render_dir, name, "*.wav")))
+        entry = catalog.get(int(m.group(1))) if m else None
+        if entry is None or not wavs:
+            continue
+        ids.append(entry["actual_name"])
+        paths.append(index_relative(entry["copied_path"] or entry["full_path"], index_path))
+        files.append(wavs[0])
+    index = PresetIndex.build(embed_files(files), ids, paths)
+    index.save(index_path)
+    return index
+
+
+def build_dexed_index(syx_paths, index_path):
+    """
+    index of every voice of the given DX7 banks, rendered with BankRenderer (one call per bank)
+    """
+    from neural_synth_modeler.converter.dexed.dexed_converter import DexedConverter
+    from neural_synth_modeler.inferencer.dexed.bank_renderer import BankRenderer, decode_voices
+    renderer = BankRenderer(sample_rate=SAMPLING_RATE)
+    embeddings, ids, paths, voices = [], [], [], []
+    for syx_path in syx_paths:
+        bank = DexedConverter().serializeToDict(syx_path)
+        if bank is None:
+            continue
+        decoded = decode_voices(bank)
+        embeddings.append(audio_embedding(renderer.render(decoded, duration_secs=SIGNAL_LENGTH / SAMPLING_RATE)))
+        ids += ["{}:{}".format(os.path.basename(syx_path), name) for name in decoded["names"]]
+        paths += [index_relative(syx_path, index_path)] * len(bank)
+        voices += list(range(len(bank)))
+    index = PresetIndex.build(np.concatenate(embeddings), ids, paths, voices)
+    index.save(index_path)
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    vital = commands.add_parser("vital")
+    vital.add_argument("render_dir")
+    vital.add_argument("index_path")
+    vital.add_argument("--catalog", default=None)
+    dexed = commands.add_parser("dexed")
+    dexed.add_argument("index_path")
+    dexed.add_argument("syx_paths", nargs="+")
+    query = commands.add_parser("query")
+    query.add_argument("index_path")
+    query.add_argument("audio")
+    query.add_argument("-k", type=int, default=5)
+    query.add_argument("--n-probe", type=int, default=N_PROBE)
+    args = parser.parse_args()
+
+    if args.command == "vital":
+        index = build_vital_index(args.render_dir, args.index_path, args.catalog)
+        print(f"Indexed {len(index)} Vital presets in {args.index_path}")
+    elif args.command == "dexed":
+        index = build_dexed_index(args.syx_paths, args.index_path)
+        print(f"Indexed {len(index)} DX7 voices in {args.index_path}")
+    else:
+        index = PresetIndex.load(args.index_path)
+        embedding = audio_embedding(fix_length(load_audio(args.audio, SAMPLING_RATE)[0]))
+        t0 = time.perf_counter()
+        results = index.search(embedding, k=args.k, n_probe=args.n_probe)[0]
+        print(f"Searched {len(index)} presets in {(time.perf_counter() - t0) * 1000:.2f} ms")
+        for preset_id, path, voice, score in results:
+            path = os.path.join(os.path.dirname(args.index_path), path)
+            print(f"{score:.3f}  {preset_id}  {path}" + (f" (voice {voice})" if voice >= 0 else ""))
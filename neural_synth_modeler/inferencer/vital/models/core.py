@@ -6,6 +6,8 @@ import torch
 import torch.nn as nn
 import torch.fft as fft
 import numpy as np
+import functools
+import warnings
 import librosa as li
 import math
 import yaml 
@@ -39,6 +41,14 @@ def mean_std_loudness(dataset):
     return mean, std
 
 
+@functools.lru_cache(maxsize=64)
+def hann_window(size, device, dtype):
+    """
+    hann window cached per (size, device, dtype), shared by every STFT below
+    """
+    return torch.hann_window(size, device=device, dtype=dtype)
+
+
 def multiscale_fft(signal, scales, overlap):
     stfts = []
     for s in scales:
@@ -47,7 +57,7 @@ def multiscale_fft(signal, scales, overlap):
             s,
             int(s * (1 - overlap)),
             s,
-            torch.hann_window(s).to(signal),
+            hann_window(s, signal.device, signal.dtype),
             True,
             normalized=True,
             return_complex=True,
@@ -56,6 +66,48 @@ def multiscale_fft(signal, scales, overlap):
     return stfts
 
 
+class MultiscaleSpectralLoss(nn.Module):
+    """
+    mean L1 distance between multiscale STFT magnitudes (+ log magnitudes if log_weight > 0).
+    windows come from the `hann_window` cache. on GPU without autograd, target and output go through each STFT
+    together as one batch; otherwise the target spectra are computed separately, without a graph.
+    `scales` in forward selects a subset of the scales, e.g. for a cheaper eval.
+    """
+    def __init__(self, scales, overlap, log_weight=0.0):
+        super().__init__()
+        self.scales = list(scales)
+        self.overlap = overlap
+        self.log_weight = log_weight
+
+    def spectra(self, signal, scales=None):
+        """
+        STFT magnitudes per scale. `scales` selects a subset, default all.
+        """
+        return multiscale_fft(signal, self.scales if scales is None else scales, self.overlap)
+
+    def loss_from_spectra(self, target_spectra, output_spectra):
+        loss = 0
+        for s_x, s_y in zip(target_spectra, output_spectra):
+            loss = loss + (s_x - s_y).abs().mean()
+            if self.log_weight > 0:
+                loss = loss + self.log_weight * (safe_log(s_x) - safe_log(s_y)).abs().mean()
+        return loss
+
+    def forward(self, target, output, scales=None):
+        target = target.reshape(-1, target.shape[-1])
+        output = output.reshape(-1, output.shape[-1])
+        if output.device.type == "cpu" or (torch.is_grad_enabled() and output.requires_grad):
+            # batching saves kernel launches on GPU but only costs a copy on CPU, and with autograd it would
+            # backprop through the target STFTs too. the target side never keeps a graph.
+            with torch.no_grad():
+                target_spectra = self.spectra(target, scales)
+            return self.loss_from_spectra(target_spectra, self.spectra(output, scales))
+
+        n = target.shape[0]
+        spectra = self.spectra(torch.cat([target, output]), scales)
+        return self.loss_from_spectra([S[:n] for S in spectra], [S[n:] for S in spectra])
+
+
 def resample(x, factor: int):
     batch, frame, channel = x.shape
     x = x.permute(0, 2, 1).reshape(batch * channel, 1, frame)
@@ -85,6 +137,39 @@ def upsample(signal, factor, preferred_size=None, mode="nearest"):
     return signal.permute(0, 2, 1)
 
 
+@functools.lru_cache(maxsize=32)
+def frame_interpolation_matrix(in_frames, out_frames):
+    """
+    (out_frames, in_frames) matrix of a linear resize, with half-pixel centers and no antialiasing
+    (the same sampling as a bilinear image resize). each row holds the 2 source weights of an output frame.
+    a numpy array, so under torch.jit.trace a cache miss records the same ops as a hit.
+    """
+    scale = np.float32(in_frames / out_frames)
+    src = np.maximum((np.arange(out_frames, dtype=np.float32) + 0.5) * scale - 0.5, 0)
+    idx0 = np.minimum(np.floor(src).astype(np.int64), in_frames - 1)
+    idx1 = np.minimum(idx0 + 1, in_frames - 1)
+    weight = src - idx0
+
+    rows = np.arange(out_frames)
+    matrix = np.zeros((out_frames, in_frames), dtype=np.float32)
+    np.add.at(matrix, (rows, idx0), 1 - weight)
+    np.add.at(matrix, (rows, idx1), weight)
+    return matrix
+
+
+def interpolate_frames(x, out_frames):
+    """
+    linear resampling of x (bs, frames, features) along the frame axis to `out_frames` frames,
+    as one matmul with an interpolation matrix cached per (in, out) frame count.
+    """
+    # under torch.jit.trace the sizes are tensors, which would key the cache by identity. the traced graph is
+    # specialized to the frame counts anyway, so the size conversion and the constant matrix are not warned about
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        matrix = torch.from_numpy(frame_interpolation_matrix(int(x.shape[1]), int(out_frames)))
+    return torch.matmul(matrix.to(x), x)
+
+
 def remove_above_nyquist(amplitudes, pitch, sampling_rate):
     n_harm = amplitudes.shape[-1]
     pitches = pitch * torch.arange(1, n_harm + 1).to(pitch)
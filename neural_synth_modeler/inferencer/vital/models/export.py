@@ -0,0 +1,91 @@
+"""
+TorchScript / ONNX export of the WTSv2 inference graph.
+
+Only the parts needed for preset inference are exported: wavetable attention and ADSR heads. The MFCC
+encoder / GRU path only feeds the noise filter, which no preset parameter uses, so it is left out.
+Wavetable extraction (`extract_wavetables`) has Python control flow and runs as a pre-step
+on the input audio; onsets and synthesis are only needed for evaluation and are left out.
+
+Usage (from repo root):
+    python -m neural_synth_modeler.inferencer.vital.models.export --format onnx
+"""
+import argparse
+import inspect
+import os
+import tempfile
+import torch
+import torch.nn as nn
+from .model import extract_wavetables
+from .preprocessor import preprocess
+from neural_synth_modeler.utils.audio import write_synthetic_audio
+
+INPUT_NAMES = ["wavetables", "loudness"]
+OUTPUT_NAMES = ["attention_output", "attack_secs", "decay_secs", "sustain_level"]
+
+
+class WTSv2Controls(nn.Module):
+    """
+    traceable WTSv2 control graph: (wavetables, loudness) -> wavetable attention and ADSR
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, wavetables, loudness):
+        attention_output = self.model.wavetable_attention(wavetables)
+        attack_secs, decay_secs, sustain_level = self.model.adsr_heads(loudness)
+        return attention_output, attack_secs, decay_secs, sustain_level
+
+
+def example_inputs(duration_secs=4, sampling_rate=16000, block_size=160, pitch_backend="yin"):
+    """
+    exporter inputs from a synthetic clip, in `WTSv2Controls.forward` argument order
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_fname = write_synthetic_audio(os.path.join(tmp_dir, "example.wav"), duration_secs)
+        y, pitch, loudness, _, _, _ = preprocess(audio_fname, sampling_rate, block_size,
+                                                    signal_length=sampling_rate * duration_secs,
+                                                    pitch_backend=pitch_backend)
+    return extract_wavetables(y, pitch), loudness
+
+
+def export_torchscript(model, fname, inputs):
+    controls = WTSv2Controls(model).eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(controls, inputs)
+    traced.save(fname)
+    return fname
+
+
+def export_onnx(model, fname, inputs):
+    controls = WTSv2Controls(model).eval()
+    # torch 2.x defaults to the dynamo exporter (needs onnxscript), use the TorchScript-based one like torch 1.x
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            controls, inputs, fname,
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            opset_version=14,
+            **kwargs
+        )
+    return fname
+
+
+if __name__ == "__main__":
+    from neural_synth_modeler.inferencer.vital.vital_inferencer import VitalInferencer
+
+    checkpoints_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../checkpoints")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--format", choices=["torchscript", "onnx"], default="onnx")
+    parser.add_argument("--checkpoint", default=os.path.join(checkpoints_dir, "model.pt"))
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    model = VitalInferencer(device="cpu").load_model(args.checkpoint, "cpu")
+    inputs = example_inputs()
+    if args.format == "torchscript":
+        output = export_torchscript(model, args.output or os.path.join(checkpoints_dir, "model.ts.pt"), inputs)
+    else:
+        output = export_onnx(model, args.output or os.path.join(checkpoints_dir, "model.onnx"), inputs)
+    print("exported {}".format(output))
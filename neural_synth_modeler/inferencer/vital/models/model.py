@@ -4,12 +4,11 @@ Diff-WTS model. Main adapted from https://github.com/acids-ircam/ddsp_pytorch.
 from .wavetable_synth import WavetableSynthV2
 import torch
 import torch.nn as nn
-from .core import mlp, gru, scale_function, remove_above_nyquist, upsample
+from .core import mlp, gru, scale_function, remove_above_nyquist, upsample, interpolate_frames
 from .core import amp_to_impulse_response, fft_convolve
 from .adsr_envelope import *
 import numpy as np
-from torchvision.transforms import Resize
-from time import time
+from neural_synth_modeler.utils.tracing import trace
 
 class PrintLayer(nn.Module):
     def __init__(self, name):
@@ -118,6 +117,24 @@ def infer_wavetables(y, pitch):
     return wavelet_upsample
 
 
+def extract_wavetables(y, pitch):
+    """
+    one wavetable per batch item, cut from the input audio at its first stable pitch.
+
+    y: (bs, signal_length)
+    pitch: (bs, n_frames, 1)
+    returns (bs, 1, 512)
+    """
+    wavetables = []
+    for idx in range(y.shape[0]):
+        wt = infer_wavetables(y[idx].squeeze(), pitch[idx].squeeze())
+        wavetables.append(wt)
+    wavetables = torch.stack(wavetables, dim=0).unsqueeze(1)
+    if torch.isinf(wavetables).any() or torch.isnan(wavetables).any():
+        print('wavetables has inf or nan', torch.isinf(wavetables).any(), torch.isnan(wavetables).any())
+    return wavetables
+
+
 class WTSv2(nn.Module):
     def __init__(self, hidden_size, n_harmonic, n_bands, sampling_rate,
                  block_size, mode="wavetable", duration_secs=3, num_wavetables=3,
@@ -207,17 +224,18 @@ class WTSv2(nn.Module):
         self.duration_secs = duration_secs
         self.device = device
 
-    def forward(self, y, mfcc, pitch, loudness, times, onset_frames):
-        batch_size = y.shape[0]
-
+    def encode(self, mfcc, pitch, loudness):
+        """
+        frame-level hidden features from mfcc, pitch and loudness
+        """
         # encode mfcc first
         # use layer norm instead of trainable norm, not much difference found
         mfcc = self.layer_norm(torch.transpose(mfcc, 1, 2))
         mfcc = self.gru_mfcc(mfcc)[0]
         mfcc = self.mlp_mfcc(mfcc)
 
-        # use image resize to align dimensions, ddsp also does this...
-        mfcc = Resize(size=(self.duration_secs * 100, 16))(mfcc)
+        # align mfcc frames to the 100 fps control rate, ddsp also does this...
+        mfcc = interpolate_frames(mfcc, self.duration_secs * 100)
 
         hidden = torch.cat([
             self.in_mlps[0](pitch),
@@ -225,7 +243,34 @@ class WTSv2(nn.Module):
             self.in_mlps[2](mfcc)
         ], -1)
         hidden = torch.cat([self.gru(hidden)[0], hidden], -1)
-        hidden = self.out_mlp(hidden)
+        return self.out_mlp(hidden)
+
+    def wavetable_attention(self, wavetables):
+        attention_output = self.attention_wt1(wavetables).squeeze(-1)
+        return nn.Softmax(dim=-1)(attention_output)
+
+    def adsr_heads(self, loudness):
+        """
+        attack secs, decay secs and sustain level predicted from the loudness curve
+        """
+        output_attack, hn_attack = self.attack_gru(loudness)
+        hn_attack = torch.cat([hn_attack[0], hn_attack[1]], dim=-1)
+        output_decay, hn_decay = self.decay_gru(loudness)
+        hn_decay = torch.cat([hn_decay[0], hn_decay[1]], dim=-1)
+        output_sustain, hn_sustain = self.sustain_gru(loudness)
+        hn_sustain = torch.cat([hn_sustain[0], hn_sustain[1]], dim=-1)
+
+        # print(hn_decay[:10])
+        attack_level = self.attack_sec_head(hn_attack).squeeze()            # 0-1
+        decay_level = self.decay_sec_head(hn_decay).squeeze()               # 0-1
+        sustain_level = self.sustain_level_head(hn_sustain).squeeze()
+
+        attack_secs = attack_level * self.max_attack_secs
+        decay_secs = decay_level * self.max_decay_secs
+        return attack_secs, decay_secs, sustain_level
+
+    def forward(self, y, mfcc, pitch, loudness, times, onset_frames):
+        hidden = self.encode(mfcc, pitch, loudness)
 
         # harmonic part
         total_amp = self.loudness_mlp(loudness)
@@ -238,13 +283,8 @@ class WTSv2(nn.Module):
         # diff-wave-synth synthesizer
         if self.preload_wt:
             # TODO: very slow implementation...
-            wavetables = []
-            for idx in range(batch_size):
-                wt = infer_wavetables(y[idx].squeeze(), pitch_prev[idx].squeeze())
-                wavetables.append(wt)
-            wavetables = torch.stack(wavetables, dim=0).unsqueeze(1)
-            if torch.isinf(wavetables).any() or torch.isnan(wavetables).any():
-                print('wavetables has inf or nan', torch.isinf(wavetables).any(), torch.isnan(wavetables).any())
+            with trace("wavetable_extraction"):
+                wavetables = extract_wavetables(y, pitch_prev)
         else:
             wavetables = self.wt1_conv1d(y.unsqueeze(1))
 
@@ -258,8 +298,7 @@ class WTSv2(nn.Module):
             wavetables_old = None
             smoothing_coeff = None
 
-        attention_output = self.attention_wt1(wavetables).squeeze(-1)
-        attention_output = nn.Softmax(dim=-1)(attention_output)
+        attention_output = self.wavetable_attention(wavetables)
 
         harmonic, attention_output = self.wts(pitch, total_amp, wavetables, attention_output)
 
@@ -279,27 +318,15 @@ class WTSv2(nn.Module):
         signal = harmonic + noise
 
         # adsr shaping
-        output_attack, hn_attack = self.attack_gru(loudness)
-        hn_attack = torch.cat([hn_attack[0], hn_attack[1]], dim=-1)
-        output_decay, hn_decay = self.decay_gru(loudness)
-        hn_decay = torch.cat([hn_decay[0], hn_decay[1]], dim=-1)
-        output_sustain, hn_sustain = self.sustain_gru(loudness)
-        hn_sustain = torch.cat([hn_sustain[0], hn_sustain[1]], dim=-1)
-
-        # print(hn_decay[:10])
-        attack_level = self.attack_sec_head(hn_attack).squeeze()            # 0-1
-        decay_level = self.decay_sec_head(hn_decay).squeeze()               # 0-1
-        sustain_level = self.sustain_level_head(hn_sustain).squeeze()
-
-        attack_secs = attack_level * self.max_attack_secs
-        decay_secs = decay_level * self.max_decay_secs
+        attack_secs, decay_secs, sustain_level = self.adsr_heads(loudness)
 
         amp_onsets = np.append(times[onset_frames], np.array([times[-1]]))  # TODO: now 1 onset is enough, because all training samples pitch are the same
 
-        adsr = get_amp_shaper(self.shaper, amp_onsets, 
-                                attack_secs=attack_secs,
-                                decay_secs=decay_secs,
-                                sustain_level=sustain_level)
+        with trace("adsr"):
+            adsr = get_amp_shaper(self.shaper, amp_onsets, 
+                                    attack_secs=attack_secs,
+                                    decay_secs=decay_secs,
+                                    sustain_level=sustain_level)
         if adsr.shape[1] < pitch_prev.shape[1]:
             # adsr = torch.nn.functional.pad(adsr, (0, pitch_prev.shape[1] - adsr.shape[1]), "constant", adsr[-1].item())
             adsr = torch.cat([adsr, adsr[:, -1].unsqueeze(-1)], dim=-1)
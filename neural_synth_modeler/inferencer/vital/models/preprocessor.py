@@ -6,6 +6,8 @@ import os
 import torch
 from neural_synth_modeler.utils.pitch_extractor import extract_pitch
 from neural_synth_modeler.inferencer.vital.models.core import extract_loudness
+from neural_synth_modeler.utils.audio import load_audio
+from neural_synth_modeler.utils.tracing import trace
 import librosa
 import yaml 
 from nnAudio import Spectrogram
@@ -24,6 +26,9 @@ n_mfcc = config["train"]["n_mfcc"]
 
 spec = Spectrogram.MFCC(sr=sr, n_mfcc=n_mfcc)
 
+# loudness normalisation of the training data
+mean_loudness, std_loudness = -39.74668743704927, 54.19612404969509
+
 
 def sanitize_onsets(times, onset_frames, onset_strengths):
     """
@@ -123,8 +128,8 @@ def monotonize_pitch(times, onset_frames, pitch):
     return res_pitch
     
 
-def preprocess(f, sampling_rate, block_size, signal_length=-1, oneshot=True):
-    x, sr = librosa.load(f, sr=sampling_rate)
+def preprocess(f, sampling_rate, block_size, signal_length=-1, oneshot=True, pitch_backend=None):
+    x, sr = load_audio(f, sampling_rate)
     if signal_length == -1:     # full length
         signal_length = len(x)
     else:
@@ -137,18 +142,20 @@ def preprocess(f, sampling_rate, block_size, signal_length=-1, oneshot=True):
         if oneshot:
             x = x[..., :signal_length]
 
-    D = np.abs(librosa.stft(x))
-    times = librosa.times_like(D, sr=sr)
-    onset_strengths = librosa.onset.onset_strength(y=x, sr=sr, aggregate=np.median)
-    onset_frames = librosa.onset.onset_detect(y=x, sr=sr)
+    with trace("onsets"):
+        D = np.abs(librosa.stft(x))
+        times = librosa.times_like(D, sr=sr)
+        onset_strengths = librosa.onset.onset_strength(y=x, sr=sr, aggregate=np.median)
+        onset_frames = librosa.onset.onset_detect(y=x, sr=sr)
 
-    onset_frames = sanitize_onsets(times, onset_frames, onset_strengths)
+        onset_frames = sanitize_onsets(times, onset_frames, onset_strengths)
 
-    # TODO: HACK for now, onset detector missed. not all samples need this!!
-    onset_frames = np.concatenate([np.array([0]), onset_frames])
+        # TODO: HACK for now, onset detector missed. not all samples need this!!
+        onset_frames = np.concatenate([np.array([0]), onset_frames])
 
-    pitch = extract_pitch(x, sampling_rate, block_size)
-    loudness = extract_loudness(x, sampling_rate, block_size)
+    pitch = extract_pitch(x, sampling_rate, block_size, backend=pitch_backend)
+    with trace("loudness"):
+        loudness = extract_loudness(x, sampling_rate, block_size)
 
     pitch_monotonize = monotonize_pitch(times, onset_frames, pitch)
     pitch = pitch_monotonize
@@ -165,10 +172,10 @@ def preprocess(f, sampling_rate, block_size, signal_length=-1, oneshot=True):
     pitch = torch.cat([pitch, pitch], dim=0)
     loudness = torch.cat([loudness, loudness], dim=0)
 
-    mean_loudness, std_loudness = -39.74668743704927, 54.19612404969509
     pitch, loudness = pitch.unsqueeze(-1).float(), loudness.unsqueeze(-1).float()
     loudness = (loudness - mean_loudness) / std_loudness
 
-    mfcc = spec(x)
+    with trace("mfcc"):
+        mfcc = spec(x)
 
     return x, pitch, loudness, times, onset_frames, mfcc
@@ -2,11 +2,13 @@
 Vital inferencer.
 """
 import os
-from neural_synth_modeler.inferencer.inferencer import Inferencer, InferenceInput, InferenceOutput
-from neural_synth_modeler.inferencer.vital.models.model import WTSv2
+from neural_synth_modeler.inferencer.inferencer import Inferencer, InferenceInput, InferenceOutput, get_eval_level
+from neural_synth_modeler.inferencer.vital.models.model import WTSv2, extract_wavetables
 from neural_synth_modeler.inferencer.vital.models.preprocessor import *
-from neural_synth_modeler.inferencer.vital.models.core import multiscale_fft
+from neural_synth_modeler.inferencer.vital.models.core import MultiscaleSpectralLoss
+from neural_synth_modeler.inferencer.preset_index import nearest_template
 from neural_synth_modeler.converter.vital.vital_constants import N_WAVETABLES, CUSTOM_KEYS
+from neural_synth_modeler.utils.tracing import annotate, trace
 import yaml 
 import torch
 import numpy as np
@@ -35,7 +37,9 @@ n_mfcc = config["train"]["n_mfcc"]
 train_lr = config["train"]["start_lr"]
 visualize = config["visualize"]
 device = config["device"]
+loss_eval_scales = config["eval"]["loss_scales"]
 signal_length = sr * 4
+spectral_loss = MultiscaleSpectralLoss(scales, overlap)
 
 
 class VitalInferenceOutput(InferenceOutput):
@@ -59,16 +63,21 @@ class VitalInferenceInput(InferenceInput):
 
 
 class VitalInferencer(Inferencer):
-    def convert(self, audio_fname, model_pt_fname=None, enable_eval=False):
+    checkpoint = "checkpoints/model.pt"
+    # built by `preset_index.py vital`; without it every preset starts from init.vital
+    preset_index = "checkpoints/preset_index.npz"
+
+    def convert(self, audio_fname, model_pt_fname=None, enable_eval=False, pitch_backend=None):
         # TODO: switch to torchhub
         if model_pt_fname is None:
             model_pt_fname = os.path.join(
                 os.path.dirname(os.path.realpath(__file__)),
-                "checkpoints/model.pt"
+                self.checkpoint
             )
         
         y, pitch, loudness, times, onset_frames, mfcc = preprocess(audio_fname, sampling_rate=16000, block_size=160, 
-                                                                   signal_length=signal_length)
+                                                                   signal_length=signal_length,
+                                                                   pitch_backend=pitch_backend)
         inference_input = VitalInferenceInput()
         inference_input.y = y
         inference_input.pitch = pitch
@@ -77,16 +86,27 @@ class VitalInferencer(Inferencer):
         inference_input.onset_frames = onset_frames
         inference_input.mfcc = mfcc
 
-        model = self.load_model(model_pt_fname, self.device)
+        with trace("preset_template"):
+            template = nearest_template(
+                os.path.join(os.path.dirname(os.path.realpath(__file__)), self.preset_index), y.cpu().numpy())
+
+        model = self.get_model(model_pt_fname, self.device)
         inference_output = self.inference(model, inference_input, self.device, enable_eval=enable_eval)
-        synth_params_dict = self.convert_to_preset(inference_output)
+        with trace("convert_to_preset"):
+            synth_params_dict = self.convert_to_preset(inference_output, template=template)
         return synth_params_dict, inference_output.eval_dict
 
-    def load_model(self, model_pt_fname, device="cuda"):
-        model = WTSv2(hidden_size=hidden_size, n_harmonic=n_harmonic, n_bands=n_bands, sampling_rate=sr,
+    def build_model(self, device="cuda", duration_secs=4):
+        """
+        WTSv2 in its inference configuration, without weights loaded.
+        """
+        return WTSv2(hidden_size=hidden_size, n_harmonic=n_harmonic, n_bands=n_bands, sampling_rate=sr,
                 block_size=block_size,  mode="wavetable", 
-                duration_secs=4, num_wavetables=1, wavetable_smoothing=False, preload_wt=True, enable_amplitude=False,
+                duration_secs=duration_secs, num_wavetables=1, wavetable_smoothing=False, preload_wt=True, enable_amplitude=False,
                 is_round_secs=False, device=device)
+
+    def load_model(self, model_pt_fname, device="cuda"):
+        model = self.build_model(device)
         if device == "cuda":
             model.load_state_dict(torch.load(model_pt_fname))
             model.cuda()
@@ -96,14 +116,29 @@ class VitalInferencer(Inferencer):
         return model
     
     def inference(self, model, inference_input, device="cuda", enable_eval=False):
+        """
+        enable_eval: True / False or an eval level, see `get_eval_level`
+        """
+        eval_level = get_eval_level(enable_eval)
         if device == "cuda":
             inference_input.y = inference_input.y.cuda()
             inference_input.mfcc = inference_input.mfcc.cuda()
             inference_input.pitch = inference_input.pitch.cuda()
             inference_input.loudness = inference_input.loudness.cuda()
 
+        annotate("batch_size", inference_input.y.shape[0])
+        if eval_level == "off":
+            # the preset only needs wavetables, attention and ADSR, so synthesis is skipped
+            with torch.no_grad():
+                with trace("wavetable_extraction"):
+                    wavetables = extract_wavetables(inference_input.y, inference_input.pitch)
+                with trace("model_forward"):
+                    attention_output = model.wavetable_attention(wavetables)
+                    adsr = model.adsr_heads(inference_input.loudness)
+            return self.build_output(wavetables, attention_output, adsr)
+
         # forward pass
-        with torch.no_grad():
+        with torch.no_grad(), trace("model_forward"):
             _, adsr, output, attention_output, wavetables, _, _ = model(
                 inference_input.y, 
                 inference_input.mfcc, 
@@ -113,6 +148,14 @@ class VitalInferencer(Inferencer):
                 inference_input.onset_frames
             )
 
+        inference_output = self.build_output(wavetables, attention_output, adsr)
+
+        with trace("eval"):
+            self.eval(inference_input.y, output, inference_output, eval_level)
+
+        return inference_output
+
+    def build_output(self, wavetables, attention_output, adsr):
         # write wavetables to numpy file
         wt_output = []
 
@@ -136,19 +179,18 @@ class VitalInferencer(Inferencer):
         inference_output.attack = adsr[0][0].cpu().detach().numpy().squeeze().item()
         inference_output.decay = adsr[1][0].cpu().detach().numpy().squeeze().item()
         inference_output.sustain = adsr[2][0].cpu().detach().numpy().squeeze().item()
-
-        if enable_eval:
-            self.eval(inference_input.y, output, inference_output)
-
         return inference_output
     
-    def convert_to_preset(self, inference_output):
-        with open(
-            os.path.join(
-                os.path.dirname(os.path.realpath(__file__)),
-                "init.vital"
-            ), 'r'
-        ) as f:
+    def convert_to_preset(self, inference_output, template=None):
+        """
+        template: (id, path, voice, similarity) from `nearest_template`, the preset to start from instead of init.vital
+        """
+        if template is not None:
+            annotate("preset_template", template[0])
+            template_path = template[1]
+        else:
+            template_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), "init.vital")
+        with open(template_path, 'r') as f:
             x = json.load(f)
 
         x[CUSTOM_KEYS] = {}
@@ -169,25 +211,85 @@ class VitalInferencer(Inferencer):
 
         return x
     
-    def eval(self, y, output, inference_output):
-        ori_stft = multiscale_fft(
-                    y[0].squeeze(),
-                    scales,
-                    overlap,
-                )
-        rec_stft = multiscale_fft(
-            output[0].squeeze(),
-            scales,
-            overlap,
-        )
-
-        loss = 0
-        for s_x, s_y in zip(ori_stft, rec_stft): 
-            lin_loss = ((s_x - s_y).abs()).mean()
-            loss += lin_loss
-        
+    def eval(self, y, output, inference_output, eval_level="full"):
+        if eval_level == "loss":
+            loss = spectral_loss(y[0].squeeze(), output[0].squeeze(), scales=loss_eval_scales)
+        else:
+            loss = spectral_loss(y[0].squeeze(), output[0].squeeze())
         inference_output.eval_dict["loss"] = loss.item()
-        inference_output.eval_dict["output"] = output[0].cpu().detach().numpy().squeeze()
+        if eval_level == "full":
+            inference_output.eval_dict["output"] = output[0].cpu().detach().numpy().squeeze()
+
+
+def quantize_model(model):
+    """
+    dynamic int8 quantization of the Linear and GRU layers (weights int8, activations quantized on the fly).
+    CPU only.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear, torch.nn.GRU}, dtype=torch.qint8)
+
+
+class VitalQuantizedInferencer(VitalInferencer):
+    """
+    WTSv2 with dynamic int8 Linear / GRU layers, for CPU serving.
+    The quality cost is measured by `benchmark/quantization_report.py`.
+    """
+    def __init__(self, device="cpu"):
+        VitalInferencer.__init__(self, device="cpu")
+
+    def load_model(self, model_pt_fname, device="cpu"):
+        return quantize_model(VitalInferencer.load_model(self, model_pt_fname, "cpu"))
+
+
+class VitalTorchScriptInferencer(VitalInferencer):
+    """
+    Runs the exported WTSv2 control graph (see `models/export.py`) with TorchScript.
+    Synthesis is not part of the graph, so there is no eval loss and only the "off" eval level is served.
+    """
+    checkpoint = "checkpoints/model.ts.pt"
+    eval_levels = ["off"]
+
+    def load_model(self, model_pt_fname, device="cuda"):
+        model = torch.jit.load(model_pt_fname, map_location=torch.device(device))
+        model.eval()
+        return model
+
+    def run_controls(self, model, wavetables, inference_input):
+        with torch.no_grad():
+            return model(wavetables, inference_input.loudness)
+
+    def inference(self, model, inference_input, device="cuda", enable_eval=False):
+        get_eval_level(enable_eval, self.eval_levels)
+        if device == "cuda":
+            inference_input.loudness = inference_input.loudness.cuda()
+
+        annotate("batch_size", inference_input.y.shape[0])
+        with trace("wavetable_extraction"):
+            wavetables = extract_wavetables(inference_input.y, inference_input.pitch.cpu())
+            if device == "cuda":
+                wavetables = wavetables.cuda()
+        with trace("model_forward"):
+            attention_output, attack_secs, decay_secs, sustain_level = self.run_controls(
+                model, wavetables, inference_input)
+        return self.build_output(wavetables, attention_output, (attack_secs, decay_secs, sustain_level))
+
+
+class VitalOnnxInferencer(VitalTorchScriptInferencer):
+    """
+    Runs the exported WTSv2 control graph with ONNX Runtime (CPU only).
+    """
+    checkpoint = "checkpoints/model.onnx"
+
+    def load_model(self, model_pt_fname, device="cpu"):
+        import onnxruntime
+        return onnxruntime.InferenceSession(model_pt_fname, providers=["CPUExecutionProvider"])
+
+    def run_controls(self, model, wavetables, inference_input):
+        feeds = {
+            "wavetables": wavetables.numpy(),
+            "loudness": inference_input.loudness.numpy(),
+        }
+        return [torch.from_numpy(output) for output in model.run(None, feeds)]
 
 
 if __name__ == "__main__":
@@ -198,5 +300,3 @@ if __name__ == "__main__":
     vital_converter = VitalConverter()
     vital_converter.dict = params
     vital_converter.parseToPluginFile("vital_output.vital")
-
-    
\ No newline at end of file
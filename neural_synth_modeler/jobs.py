@@ -0,0 +1,242 @@
+"""
+Local job queue for long or batch conversions.
+
+Jobs are stored in a SQLite database next to their input / output files, so no external broker is needed and
+queued work survives a restart. A fixed pool of worker threads runs the jobs, so throughput is set by the pool
+size instead of HTTP timeouts.
+
+    queue = JobQueue("/tmp/nsm_jobs", workers=2)
+    job_id = queue.submit([("clip.wav", audio_bytes)], "vital")
+    queue.status(job_id)        # {"status": "queued" | "running" | "done" | "failed", "items": [...], ...}
+    queue.result(job_id)        # output preset path, or a zip of all outputs for a batch
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from contextlib import contextmanager
+
+from neural_synth_modeler.inferencer.inferencer import get_eval_level
+from neural_synth_modeler.main import infer_params, obj_dict
+from neural_synth_modeler.metrics import observe_timings, track_request
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    synth TEXT NOT NULL,
+    options TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    output_path TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+"""
+
+
+class JobNotFound(KeyError):
+    pass
+
+
+class JobQueue:
+    def __init__(self, jobs_dir, workers=2, poll_interval=0.5):
+        """
+        jobs_dir: holds jobs.sqlite and one directory of inputs / outputs per job
+        workers: number of jobs converted in parallel
+        """
+        self.jobs_dir = jobs_dir
+        self.workers = workers
+        self.poll_interval = poll_interval
+        os.makedirs(jobs_dir, exist_ok=True)
+        self.db_path = os.path.join(jobs_dir, "jobs.sqlite")
+        self._stop = threading.Event()
+        self._threads = []
+
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            # jobs interrupted by a restart are picked up again
+            db.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE status = 'running'")
+
+    @contextmanager
+    def _connect(self):
+        # autocommit connection per call, so worker threads never share one; multi-statement writes use BEGIN IMMEDIATE
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            yield db
+        finally:
+            db.close()
+
+    def submit(self, files, synth_name, enable_eval=False, pitch_backend=None):
+        """
+        files: list of (file name, bytes or path of an audio file). returns the job id right away.
+        """
+        if synth_name not in obj_dict:
+            raise ValueError("Synth name {} not available for parameter inference".format(synth_name))
+        if len(files) == 0:
+            raise ValueError("A job needs at least one audio file")
+        get_eval_level(enable_eval, obj_dict[synth_name]["inferencer"].eval_levels)
+
+        job_id = uuid.uuid4().hex
+        input_dir = os.path.join(self.jobs_dir, job_id, "inputs")
+        os.makedirs(input_dir)
+        items = []
+        for idx, (name, data) in enumerate(files):
+            name = os.path.basename(name) or "audio"
+            input_path = os.path.join(input_dir, "{}_{}".format(idx, name))
+            if isinstance(data, (bytes, bytearray)):
+                with open(input_path, "wb") as f:
+                    f.write(data)
+            else:
+                shutil.copyfile(data, input_path)
+            items.append((job_id, idx, name, input_path, "queued"))
+
+        options = json.dumps({"enable_eval": enable_eval, "pitch_backend": pitch_backend})
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT INTO job_items (job_id, idx, name, input_path, status) VALUES (?, ?, ?, ?, ?)", items)
+            db.execute("INSERT INTO jobs (id, synth, options, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                       (job_id, synth_name, options, time.time()))
+            db.execute("COMMIT")
+        return job_id
+
+    def status(self, job_id):
+        with self._connect() as db:
+            job = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                raise JobNotFound(job_id)
+            items = db.execute(
+                "SELECT idx, name, status, error FROM job_items WHERE job_id = ? ORDER BY idx", (job_id,)).fetchall()
+            position = None
+            if job["status"] == "queued":
+                position = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < ?",
+                                      (job["created"],)).fetchone()[0]
+        return {
+            "job_id": job_id,
+            "synth": job["synth"],
+            "status": job["status"],
+            "queue_position": position,
+            "created": job["created"],
+            "started": job["started"],
+            "finished": job["finished"],
+            "error": job["error"],
+            "items": [dict(item) for item in items],
+        }
+
+    def result(self, job_id):
+        """
+        path of the output preset, or of a zip with every successful output when the job had several files
+        """
+        status = self.status(job_id)
+        if status["status"] != "done":
+            raise ValueError("Job {} is {}".format(job_id, status["status"]))
+        with self._connect() as db:
+            rows = db.execute("SELECT name, output_path FROM job_items WHERE job_id = ? AND status = 'done' "
+                              "ORDER BY idx", (job_id,)).fetchall()
+        if len(status["items"]) == 1:
+            return rows[0]["output_path"]
+
+        zip_path = os.path.join(self.jobs_dir, job_id, "outputs.zip")
+        if not os.path.exists(zip_path):
+            ext = obj_dict[status["synth"]]["file_ext"]
+            with zipfile.ZipFile(zip_path + ".tmp", "w") as zf:
+                for row in rows:
+                    zf.write(row["output_path"], "{}.{}".format(os.path.splitext(row["name"])[0], ext))
+            os.replace(zip_path + ".tmp", zip_path)
+        return zip_path
+
+    def purge(self, older_than_secs):
+        """
+        deletes finished jobs (and their files) older than `older_than_secs`
+        """
+        cutoff = time.time() - older_than_secs
+        with self._connect() as db:
+            job_ids = [row[0] for row in db.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?", (cutoff,))]
+            for job_id in job_ids:
+                db.execute("DELETE FROM job_items WHERE job_id = ?", (job_id,))
+                db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+                shutil.rmtree(os.path.join(self.jobs_dir, job_id), ignore_errors=True)
+        return len(job_ids)
+
+    def claim(self):
+        """
+        atomically marks the oldest queued job as running, returns it or None
+        """
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            job = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1").fetchone()
+            if job is not None:
+                db.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), job["id"]))
+            db.execute("COMMIT")
+        return job
+
+    def run_job(self, job):
+        synth_name = job["synth"]
+        options = json.loads(job["options"])
+        output_dir = os.path.join(self.jobs_dir, job["id"], "outputs")
+        os.makedirs(output_dir, exist_ok=True)
+        with self._connect() as db:
+            items = db.execute("SELECT * FROM job_items WHERE job_id = ? AND status != 'done' ORDER BY idx",
+                               (job["id"],)).fetchall()
+
+        for item in items:
+            output_path = os.path.join(output_dir, "{}.{}".format(item["idx"], obj_dict[synth_name]["file_ext"]))
+            try:
+                with track_request(synth_name):
+                    _, eval_dict = infer_params(item["input_path"], synth_name, output_fname=output_path, **options)
+                observe_timings(synth_name, eval_dict["timings"])
+                update = ("done", output_path, None)
+            except Exception as e:
+                logger.exception("Job %s item %d failed", job["id"], item["idx"])
+                update = ("failed", None, repr(e))
+            with self._connect() as db:
+                db.execute("UPDATE job_items SET status = ?, output_path = ?, error = ? WHERE job_id = ? AND idx = ?",
+                           update + (job["id"], item["idx"]))
+
+        with self._connect() as db:
+            n_done = db.execute("SELECT COUNT(*) FROM job_items WHERE job_id = ? AND status = 'done'",
+                                (job["id"],)).fetchone()[0]
+            status, error = ("done", None) if n_done > 0 else ("failed", "no file could be converted")
+            db.execute("UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ?",
+                       (status, time.time(), error, job["id"]))
+
+    def work(self):
+        while not self._stop.is_set():
+            job = self.claim()
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.run_job(job)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work, name="job-worker-{}".format(i), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
@@ -1,28 +1,141 @@
 """
 Function APIs to be called externally.
 """
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+from .converter.dexed.dexed_converter import DexedConverter
 from .converter.vital.vital_converter import VitalConverter
-from .inferencer.vital.vital_inferencer import VitalInferencer
+from .inferencer.dexed.dexed_inferencer import DexedInferencer
+from .inferencer.inferencer import cached_model_bytes
+from .inferencer.vital.vital_inferencer import (
+    VitalInferencer, VitalOnnxInferencer, VitalQuantizedInferencer, VitalTorchScriptInferencer
+)
+from .utils.audio import write_synthetic_audio
+from .utils.tracing import Tracer, trace
 
 
+# max_concurrency: requests of a synth running at once per worker, the others wait in `queue_wait`
+# pitch_backend: the synth's default pitch backend, instead of `pitch.backend` in vital/config.yaml
 obj_dict = {
     "vital": {
         "converter": VitalConverter,
         "inferencer": VitalInferencer,
+        "file_ext": "vital",
+        "max_concurrency": 2
+    },
+    # FM resynthesis at a 64-sample hop, much more expensive than vital. crepe_full at that hop needs several GB,
+    # more than the service's memory limit, so dexed defaults to the autocorrelation tracker
+    "dexed": {
+        "converter": DexedConverter,
+        "inferencer": DexedInferencer,
+        "file_ext": "syx",
+        "max_concurrency": 1,
+        "pitch_backend": "autocorr"
+    },
+    # dynamic int8 Linear / GRU, see benchmark/quantization_report.py
+    "vital_int8": {
+        "converter": VitalConverter,
+        "inferencer": VitalQuantizedInferencer,
+        "file_ext": "vital"
+    },
+    # exported WTSv2 graph (see inferencer/vital/models/export.py), no eval loss
+    "vital_torchscript": {
+        "converter": VitalConverter,
+        "inferencer": VitalTorchScriptInferencer,
+        "file_ext": "vital"
+    },
+    "vital_onnx": {
+        "converter": VitalConverter,
+        "inferencer": VitalOnnxInferencer,
         "file_ext": "vital"
     }
 }
 
-def infer_params(input_audio_name, synth_name, enable_eval=False):
+# synths exposed by the service, e.g. NSM_SYNTHS=vital,dexed,vital_int8
+SERVED_SYNTHS = os.environ.get("NSM_SYNTHS", "vital,dexed").split(",")
+
+_synth_slots = {
+    synth_name: threading.BoundedSemaphore(entry.get("max_concurrency", 1)) for synth_name, entry in obj_dict.items()
+}
+
+
+@contextmanager
+def synth_slot(synth_name):
+    """
+    holds one of the `max_concurrency` slots of a synth, so a slow synth cannot take every worker thread
+    """
+    with trace("queue_wait"):
+        _synth_slots[synth_name].acquire()
+    try:
+        yield
+    finally:
+        _synth_slots[synth_name].release()
+
+
+def temp_output_fname(synth_name):
+    """
+    a new empty file for one request's preset, so concurrent requests never share an output path
+    """
+    fd, output_fname = tempfile.mkstemp(suffix=".{}".format(obj_dict[synth_name]["file_ext"]))
+    os.close(fd)
+    return output_fname
+
+
+def infer_params(input_audio_name, synth_name, enable_eval=False, pitch_backend=None, profile=False, profile_dir=None,
+                 output_fname=None):
+    """
+    input_audio_name: audio file path, or an open audio file object (e.g. an upload body)
+    output_fname: where to write the preset, default "<synth>_output.<ext>" in the working directory
+    pitch_backend: default the synth's `pitch_backend` in obj_dict, else `pitch.backend` in vital/config.yaml
+    enable_eval: True / False or an eval level ("off", "loss", "full"), see `inferencer.get_eval_level`.
+    Stage timings of the request are returned in `eval_dict["timings"]` and logged as a structured record.
+    With `profile=True` a torch.profiler capture is taken as well, summarized in `eval_dict["profile"]`
+    and exported as a chrome trace to `profile_dir` if given.
+    """
     if synth_name not in obj_dict:
         raise ValueError("Synth name {} not available for parameter inference".format(synth_name))
-    
-    inferencer = obj_dict[synth_name]["inferencer"](device="cpu")
-    params, eval_dict = inferencer.convert(input_audio_name, enable_eval=enable_eval)
+    if pitch_backend is None:
+        pitch_backend = obj_dict[synth_name].get("pitch_backend")
+
+    with Tracer(name=synth_name, profile=profile, profile_dir=profile_dir) as tracer, synth_slot(synth_name):
+        inferencer = obj_dict[synth_name]["inferencer"](device="cpu")
+        params, eval_dict = inferencer.convert(input_audio_name, enable_eval=enable_eval, pitch_backend=pitch_backend)
+
+        converter = obj_dict[synth_name]["converter"]()
+        converter.dict = params
+        if output_fname is None:
+            output_fname = "{}_output.{}".format(synth_name, obj_dict[synth_name]["file_ext"])
+        converter.parseToPluginFile(output_fname)
 
-    converter = obj_dict[synth_name]["converter"]()
-    converter.dict = params
-    output_fname = "{}_output.{}".format(synth_name, obj_dict[synth_name]["file_ext"])
-    converter.parseToPluginFile(output_fname)
+    eval_dict["timings"] = tracer.as_dict()
+    if profile:
+        eval_dict["profile"] = tracer.profile_table()
+    tracer.log(synth=synth_name, audio=input_audio_name if isinstance(input_audio_name, str) else "<upload>")
 
-    return output_fname, eval_dict
\ No newline at end of file
+    return output_fname, eval_dict
+
+
+def warm_up(synth_name, duration_secs=4, enable_eval=None):
+    """
+    Runs one inference on a synthetic clip, so the model is cached and one-time initialization (imports,
+    pitch model session, allocations) is done before real traffic arrives.
+    enable_eval defaults to the service's "loss", or "off" for synths that cannot compute a loss.
+    Returns the warm-up duration, the pitch backend used and the memory held by the loaded model.
+    """
+    if enable_eval is None:
+        enable_eval = "loss" if "loss" in obj_dict[synth_name]["inferencer"].eval_levels else "off"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audio_fname = write_synthetic_audio(os.path.join(tmp_dir, "warmup.wav"), duration_secs)
+        start = perf_counter()
+        output_fname = os.path.join(tmp_dir, "warmup_output.{}".format(obj_dict[synth_name]["file_ext"]))
+        _, eval_dict = infer_params(audio_fname, synth_name, enable_eval=enable_eval, output_fname=output_fname)
+        duration = perf_counter() - start
+
+    return {
+        "duration_secs": duration,
+        "pitch_backend": eval_dict["timings"]["attributes"].get("pitch_backend"),
+        "model_memory_mb": cached_model_bytes(obj_dict[synth_name]["inferencer"]) / (1024 * 1024),
+    }
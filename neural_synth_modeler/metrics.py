@@ -0,0 +1,73 @@
+"""
+Prometheus metrics of the serving layer, scraped from the BentoML `/metrics` endpoint.
+
+Stage latencies are fed from the same `Tracer` timings that are returned in `eval_dict["timings"]`,
+so the histograms and the `Server-Timing` header always agree.
+"""
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+REQUESTS = Counter(
+    "nsm_requests_total", "Prediction requests, by synth and outcome", ["synth", "status"]
+)
+ERRORS = Counter(
+    "nsm_request_errors_total", "Failed prediction requests, by synth and exception type", ["synth", "error"]
+)
+REQUEST_DURATION = Histogram(
+    "nsm_request_duration_seconds", "End-to-end prediction latency", ["synth"], buckets=LATENCY_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    "nsm_stage_duration_seconds", "Latency of each traced pipeline stage (decode, pitch, model_load, ...)",
+    ["synth", "stage"], buckets=LATENCY_BUCKETS
+)
+IN_PROGRESS = Gauge(
+    "nsm_requests_in_progress", "Prediction requests currently being processed (queue depth)", ["synth"],
+    multiprocess_mode="livesum"
+)
+BATCH_SIZE = Histogram(
+    "nsm_batch_size", "Batch size of the model forward pass", ["synth"], buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+MODEL_CACHE = Counter(
+    "nsm_model_cache_total", "Model cache lookups, by result (hit / miss)", ["synth", "result"]
+)
+AUDIO_DURATION = Histogram(
+    "nsm_input_audio_duration_seconds", "Duration of the uploaded audio", ["synth"],
+    buckets=(0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0, 60.0, 120.0)
+)
+
+
+def observe_timings(synth, timings):
+    """
+    records a finished request from its `Tracer.as_dict()` timings
+    """
+    REQUEST_DURATION.labels(synth).observe(timings["total"])
+    for stage, secs in timings["stages"].items():
+        STAGE_DURATION.labels(synth, stage).observe(secs)
+
+    attributes = timings.get("attributes", {})
+    if "batch_size" in attributes:
+        BATCH_SIZE.labels(synth).observe(attributes["batch_size"])
+    if "model_cache" in attributes:
+        MODEL_CACHE.labels(synth, attributes["model_cache"]).inc()
+    if "audio_duration_secs" in attributes:
+        AUDIO_DURATION.labels(synth).observe(attributes["audio_duration_secs"])
+
+
+@contextmanager
+def track_request(synth):
+    """
+    in-progress gauge and ok / error counters around one prediction request
+    """
+    IN_PROGRESS.labels(synth).inc()
+    try:
+        yield
+    except Exception as e:
+        REQUESTS.labels(synth, "error").inc()
+        ERRORS.labels(synth, type(e).__name__).inc()
+        raise
+    else:
+        REQUESTS.labels(synth, "ok").inc()
+    finally:
+        IN_PROGRESS.labels(synth).dec()
@@ -1,20 +1,81 @@
 from pathlib import Path
-from typing import Annotated, Union
+from typing import Annotated, List, Optional, Union
+from bentoml.exceptions import BadInput, NotFound
 from bentoml.validators import ContentType
 import bentoml
-from neural_synth_modeler.main import infer_params
+from neural_synth_modeler.jobs import JobNotFound, JobQueue
+from neural_synth_modeler.main import SERVED_SYNTHS, infer_params, temp_output_fname, warm_up
+from neural_synth_modeler.metrics import observe_timings, track_request
+from neural_synth_modeler.upload import upload_app
+from neural_synth_modeler.utils.tracing import format_server_timing
 import logging
+import resource
+import threading
 import requests
 import tempfile
 import os
 import base64
 import json
 
+def check_synth(synth_name):
+    if synth_name not in SERVED_SYNTHS:
+        raise BadInput(f"Synth {synth_name} is not served, available: {SERVED_SYNTHS}")
+    return synth_name
+
+
+@bentoml.asgi_app(upload_app, path="/audio")
 @bentoml.service(
     resources={"cpu": 2, "memory": "4Gi"},
     traffic={"timeout": 60},
 )
 class NeuralSynthModelerService:
+    def __init__(self):
+        self.warmup = {}            # synth name -> {"duration_secs", "model_memory_mb"}
+        self.warmup_error = None
+        self.warmed_up = threading.Event()
+        self.jobs = JobQueue(
+            os.environ.get("NSM_JOBS_DIR", os.path.join(tempfile.gettempdir(), "nsm_jobs")),
+            workers=int(os.environ.get("NSM_JOB_WORKERS", 2)),
+        )
+
+    @bentoml.on_startup
+    def start_warm_up(self):
+        # warm up in the background so the worker keeps answering liveness probes meanwhile
+        threading.Thread(target=self.warm_up_synths, daemon=True).start()
+
+    @bentoml.on_startup
+    def start_job_workers(self):
+        self.jobs.start()
+
+    @bentoml.on_shutdown
+    def stop_job_workers(self):
+        # a job interrupted here is re-queued on the next start
+        self.jobs.stop(timeout=5)
+
+    def warm_up_synths(self):
+        try:
+            for synth_name in SERVED_SYNTHS:
+                self.warmup[synth_name] = warm_up(synth_name)
+                logging.info(f"Warmed up {synth_name}: {self.warmup[synth_name]}")
+            self.warmed_up.set()
+        except Exception as e:
+            self.warmup_error = repr(e)
+            logging.exception("Warm-up failed, service stays not ready")
+
+    def __is_ready__(self) -> bool:
+        """Backs BentoML's /readyz probe: ready once every served synth has been warmed up"""
+        return self.warmed_up.is_set()
+
+    @bentoml.api
+    def readiness(self) -> dict:
+        """Warm-up status, per-synth warm-up duration and model memory"""
+        return {
+            "ready": self.warmed_up.is_set(),
+            "warmup": self.warmup,
+            "error": self.warmup_error,
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+
     @bentoml.api
     def healthz(self) -> str:
         """Health check endpoint for the BentoML service"""
@@ -29,40 +90,94 @@ class NeuralSynthModelerService:
     def predict(
         self,
         audio: str,
+        ctx: bentoml.Context,
+        synth: str = "vital",
+        pitch_backend: Optional[str] = None,
+        eval_level: str = "loss",
+        profile: bool = False,
     ) -> Annotated[bytes, ContentType("application/octet-stream")]:
-        try:
-            # Decode base64 audio data
-            audio_data = base64.b64decode(audio)
+        """Preset file bytes for the audio: a .vital preset, or a .syx bank when synth is dexed"""
+        synth_name = check_synth(synth)
+        with track_request(synth_name):
+            try:
+                # Decode base64 audio data
+                audio_data = base64.b64decode(audio)
             
-            # Create a temporary file to save the audio data
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_file_path = temp_file.name
+                # Create a temporary file to save the audio data
+                with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
+                    temp_file.write(audio_data)
+                    temp_file_path = temp_file.name
             
-            logging.info(f"Saved audio data to temporary file: {temp_file_path}")
+                logging.info(f"Saved audio data to temporary file: {temp_file_path}")
             
-            # Process the audio file
-            output_params_file, eval_dict = infer_params(
-                input_audio_name=temp_file_path,
-                synth_name="vital",
-                enable_eval=True
-            )
+                # Process the audio file, into an output file of this request only
+                output_params_file, eval_dict = infer_params(
+                    input_audio_name=temp_file_path,
+                    synth_name=synth_name,
+                    enable_eval=eval_level,
+                    pitch_backend=pitch_backend,
+                    profile=profile,
+                    output_fname=temp_output_fname(synth_name)
+                )
             
-            # Read the output file
-            with open(output_params_file, 'rb') as f:
-                output_data = f.read()
+                observe_timings(synth_name, eval_dict["timings"])
+                ctx.response.headers.append("Server-Timing", format_server_timing(eval_dict["timings"]["stages"]))
+                if profile:
+                    logging.info(f"Profile for request:\n{eval_dict['profile']}")
             
-            # Clean up temporary files
-            try:
-                os.unlink(temp_file_path)
-                if os.path.exists(output_params_file):
-                    os.unlink(output_params_file)
-            except Exception as cleanup_error:
-                logging.warning(f"Failed to cleanup temporary files: {cleanup_error}")
+                # Read the output file
+                with open(output_params_file, 'rb') as f:
+                    output_data = f.read()
             
-            logging.info(f"Successfully processed audio -> {output_params_file}")
-            return output_data
+                # Clean up temporary files
+                try:
+                    os.unlink(temp_file_path)
+                    if os.path.exists(output_params_file):
+                        os.unlink(output_params_file)
+                except Exception as cleanup_error:
+                    logging.warning(f"Failed to cleanup temporary files: {cleanup_error}")
             
-        except Exception as e:
-            logging.exception("Error during model inference")
-            raise
+                logging.info(f"Successfully processed audio -> {output_params_file}")
+                return output_data
+
+            except ValueError as e:
+                # unknown eval level / pitch backend, audio longer than the synth converts
+                raise BadInput(str(e))
+            except Exception as e:
+                logging.exception("Error during model inference")
+                raise
+
+    @bentoml.api
+    def submit_job(
+        self,
+        audio: List[Path],
+        synth: str = "vital",
+        pitch_backend: Optional[str] = None,
+        eval_level: str = "off",
+    ) -> dict:
+        """Queues one or more audio files for conversion, returns the job id right away"""
+        check_synth(synth)
+        try:
+            job_id = self.jobs.submit([(p.name, p) for p in audio], synth, enable_eval=eval_level,
+                                      pitch_backend=pitch_backend)
+        except ValueError as e:
+            raise BadInput(str(e))
+        return self.jobs.status(job_id)
+
+    @bentoml.api
+    def job_status(self, job_id: str) -> dict:
+        """Status of a job and of each of its files"""
+        try:
+            return self.jobs.status(job_id)
+        except JobNotFound:
+            raise NotFound(f"Unknown job {job_id}")
+
+    @bentoml.api
+    def job_result(self, job_id: str) -> Path:
+        """The preset of a finished job, or a zip of all presets for a batch"""
+        try:
+            return Path(self.jobs.result(job_id))
+        except JobNotFound:
+            raise NotFound(f"Unknown job {job_id}")
+        except ValueError as e:
+            raise BadInput(str(e))
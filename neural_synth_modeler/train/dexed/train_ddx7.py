@@ -0,0 +1,90 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import h5py
+import torch
+from neural_synth_modeler.inferencer.dexed.models.ddx7.data_utils.h5_dataset import (
+    h5Dataset, h5RowDataset, h5ShardDataset
+)
+from neural_synth_modeler.train.dexed.trainer import DDX7Trainer, build_model, load_recipe, make_loader
+from neural_synth_modeler.utils.checkpoint import CheckpointManager
+from neural_synth_modeler.utils.distributed import cleanup, init, launch, shard_sampler
+
+logging.basicConfig(level=logging.INFO)
+
+INPUT_KEYS = ['audio', 'f0', 'loudness', 'rms']
+
+
+def shard_paths(path):
+    """
+    h5 shards of a dataset directory, or of the directory of its manifest.json / index.json:
+    the finished shards of ProcessData.run_on_dirs (manifest.json), the shards of DexedGenerator (index.json),
+    else every .h5 file below the directory
+    """
+    data_dir = os.path.dirname(path) if os.path.isfile(path) else path
+    if os.path.exists(os.path.join(data_dir, 'manifest.json')):
+        with open(os.path.join(data_dir, 'manifest.json')) as f:
+            names = sorted(json.load(f)['shards'])
+    elif os.path.exists(os.path.join(data_dir, 'index.json')):
+        with open(os.path.join(data_dir, 'index.json')) as f:
+            names = [shard['name'] for shard in json.load(f)['shards']]
+    else:
+        names = sorted(os.path.relpath(p, data_dir) for p in glob.glob(os.path.join(data_dir, '**', '*.h5'),
+                                                                      recursive=True))
+    if not names or not all(name.endswith('.h5') for name in names):
+        raise ValueError(f'{path} has no h5 shards to train on')
+    return [os.path.join(data_dir, name) for name in names]
+
+
+def load_dataset(path, sr):
+    """
+    path: one h5 file ({counter}_{key} or row layout), or a directory of shards / its manifest.json or index.json
+    """
+    if os.path.isdir(path) or path.endswith('.json'):
+        return h5ShardDataset(sr, shard_paths(path), INPUT_KEYS)
+    with h5py.File(path, 'r') as h5f:
+        rows = h5f.attrs.get('layout') == 'rows'
+    return h5RowDataset(sr, path, INPUT_KEYS) if rows else h5Dataset(sr, path, INPUT_KEYS)
+
+
+def main(rank, world_size, args):
+    init(rank, world_size)
+    model_config = load_recipe("model", args.model)
+    hyperparams = load_recipe("hyperparams", args.hyperparams)
+    sr = model_config["synth"]["sample_rate"]
+
+    train_dataset = load_dataset(args.train, sr)
+    train_sampler = shard_sampler(train_dataset, shuffle=True) if world_size > 1 else None
+    train_loader = make_loader(train_dataset, hyperparams["batch_size"], shuffle=True, sampler=train_sampler,
+                               num_workers=args.num_workers)
+    test_loader = None
+    if args.test is not None:
+        test_dataset = load_dataset(args.test, sr)
+        test_sampler = shard_sampler(test_dataset, shuffle=False) if world_size > 1 else None
+        test_loader = make_loader(test_dataset, hyperparams["batch_size"], sampler=test_sampler,
+                                  num_workers=args.num_workers)
+
+    torch.manual_seed(args.seed)
+    trainer = DDX7Trainer(build_model(model_config), train_loader, test_loader, hyperparams=hyperparams)
+    checkpoints = CheckpointManager(args.checkpoint_dir, keep_last=args.keep_last)
+    trainer.fit(args.epochs, checkpoints=checkpoints)
+    checkpoints.close()
+    cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train DDX7 on h5 data built by the dexed preprocessor")
+    parser.add_argument("train", help="h5 file ({counter}_{key} or row layout), or a directory of h5 shards")
+    parser.add_argument("--test", default=None, help="same as train")
+    parser.add_argument("--model", default="tcnres_f0ld_fmstr_noreverb", help="recipe in conf/recipes/model")
+    parser.add_argument("--hyperparams", default="ddx7", help="recipe in conf/recipes/hyperparams")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--checkpoint-dir", default=os.path.join("runs", "ddx7"))
+    parser.add_argument("--keep-last", type=int, default=3)
+    parser.add_argument("--num-workers", type=int, default=0)
+    parser.add_argument("--nproc", type=int, default=1, help="data-parallel processes (gloo, CPU)")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+    launch(main, args.nproc, args)
@@ -0,0 +1,101 @@
+"""
+Training loop for DDX7 on `h5Dataset` / `h5RowDataset` items, configured by the DDX7 recipes:
+the model from `conf/recipes/model/*.yaml` and the optimisation from `conf/recipes/hyperparams/ddx7.yaml`
+(Adam, `lr` decayed by `lr_decay_rate` every `lr_decay_steps` steps, gradients clipped to `grad_clip_norm`,
+`rec_loss` multiscale spectral loss).
+
+It reuses the WTSv2 `Trainer` loop, so precision, gradient accumulation, checkpoints and data-parallel
+training (utils.distributed) work the same way.
+"""
+import os
+
+import torch
+import yaml
+from torch.utils.data import DataLoader
+
+from neural_synth_modeler.inferencer.dexed.models.ddx7.loss_functions import rec_loss
+from neural_synth_modeler.inferencer.dexed.models.ddx7.models import DDSP_Decoder, TCNFMDecoder
+from neural_synth_modeler.inferencer.dexed.models.ddx7.synth import FMSynth
+from neural_synth_modeler.inferencer.dexed.models.preprocessor import F0LoudnessRMSPreprocessor
+from neural_synth_modeler.train.vital.trainer import Trainer
+
+RECIPES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                           "../../inferencer/dexed/models/conf/recipes")
+
+
+def load_recipe(kind, name):
+    """
+    kind: "model" or "hyperparams"
+    """
+    with open(os.path.join(RECIPES_DIR, kind, name + ".yaml")) as f:
+        return yaml.safe_load(f)
+
+
+def build_model(model_config, device="cpu"):
+    decoder = TCNFMDecoder(n_blocks=model_config["decoder"]["n_blocks"],
+                           hidden_channels=model_config["decoder"]["hidden_channels"],
+                           out_channels=model_config["decoder"]["out_channels"],
+                           kernel_size=model_config["decoder"]["kernel_size"],
+                           dilation_base=model_config["decoder"]["dilation_base"],
+                           apply_padding=model_config["decoder"]["apply_padding"],
+                           deploy_residual=model_config["decoder"]["deploy_residual"],
+                           input_keys=model_config["decoder"]["input_keys"])
+    synth = FMSynth(sample_rate=model_config["synth"]["sample_rate"],
+                    block_size=model_config["synth"]["block_size"],
+                    fr=model_config["synth"]["fr"],
+                    max_ol=model_config["synth"]["max_ol"],
+                    synth_module=model_config["synth"]["synth_module"],
+                    is_reverb=model_config["synth"].get("is_reverb", True))
+    if not synth.is_reverb:
+        # the reverb module exists but is not used: its parameters would never get a gradient (DDP rejects those)
+        synth.reverb.requires_grad_(False)
+    return DDSP_Decoder(decoder, synth).to(device)
+
+
+def make_loader(dataset, batch_size, shuffle=False, sampler=None, num_workers=0):
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle and sampler is None,
+        sampler=sampler,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+        drop_last=True,
+    )
+
+
+class DDX7Trainer(Trainer):
+    def __init__(self, model, train_loader, test_loader=None, hyperparams=None, device="cpu", train_config=None):
+        """
+        hyperparams: a `conf/recipes/hyperparams` recipe. train_config: the WTSv2 Trainer options
+        (precision, grad_accum_steps, log_every, ...)
+        """
+        self.hyperparams = hyperparams or load_recipe("hyperparams", "ddx7")
+        # yaml reads 3e-4 as a string
+        self.lr = float(self.hyperparams["lr"])
+        train_config = dict(train_config or {}, start_lr=self.lr)
+        self.scaler_features = F0LoudnessRMSPreprocessor()
+        super().__init__(model, train_loader, test_loader, train_config=train_config, device=device)
+
+    def make_schedule(self, train_config):
+        # staircase decay by optimizer step, as ExponentialLR stepped every lr_decay_steps
+        return lambda epoch: self.lr * \
+            self.hyperparams["lr_decay_rate"] ** (self.step // self.hyperparams["lr_decay_steps"])
+
+    def make_loss_fn(self, train_config):
+        return rec_loss(self.hyperparams["loss_fn"]["scales"], self.hyperparams["loss_fn"]["overlap"])
+
+    def compute_loss(self, batch):
+        x = {k: v.to(self.device, non_blocking=True).float() for k, v in batch.items()}
+        self.scaler_features.run(x)
+        with self.autocast():
+            synth_out = self.forward_model(x)
+        return self.loss_fn(x["audio"], synth_out["synth_audio"].float()), len(x["audio"])
+
+    def optimizer_step(self):
+        if self.scaler is not None:
+            self.scaler.unscale_(self.optimizer)
+        torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.hyperparams["grad_clip_norm"])
+        super().optimizer_step()
+        for g in self.optimizer.param_groups:
+            g["lr"] = self.schedule(self.epoch)
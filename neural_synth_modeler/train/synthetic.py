@@ -0,0 +1,350 @@
+"""
+Headless synthetic training data, rendered with the project's own synths instead of Reaper:
+
+    python -m neural_synth_modeler.train.synthetic vital data/synthetic/vital --clips 20000 --workers 8
+    python -m neural_synth_modeler.train.synthetic dexed data/synthetic/dexed --clips 20000 --workers 8
+
+vital: random wavetables, attention and ADSR (attack secs, decay secs, sustain level) at a random pitch, rendered
+with `WavetableSynthV2` and shaped by `ADSREnvelopeShaper`. Each shard is a directory in the
+`VitalFeatureShardDataset` layout (audio, mfcc, pitch, loudness, times, onset_frames), plus the ground-truth
+parameters: wavetables, attention, attack_secs, decay_secs, sustain_level and gain.
+
+dexed: per-operator ADSR output levels at a random pitch, rendered with the DDX7 `FMSynth` of a model recipe.
+Each shard is an `h5RowDataset` file (audio, f0, loudness, rms) with the ground-truth output levels in `ol`.
+
+Shards are rendered in parallel, written under a temporary name and renamed when complete, and `index.json`
+lists them once all are done. A rerun skips the shards that exist, and refuses to run into a directory whose index
+was generated for another synth, seed or shard size. Shard i only depends on (seed, i) and the shard size, so the
+output is the same for any number of workers.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+
+import h5py
+import librosa
+import numpy as np
+import torch
+import yaml
+
+from neural_synth_modeler.inferencer.vital.models.adsr_envelope import ADSREnvelopeShaper
+
+VITAL_CONFIG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "../inferencer/vital/config.yaml")
+DEXED_DATA_CONFIG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                      "../inferencer/dexed/models/conf/data_config.yaml")
+
+WAVETABLE_LEN = 512
+N_HARMONICS = 32
+VITAL_LABELS = ["wavetables", "attention", "attack_secs", "decay_secs", "sustain_level", "gain"]
+
+
+def midi_to_hz(midi):
+    return 440.0 * 2 ** ((midi - 69) / 12)
+
+
+def sample_wavetables(rng, n, n_wavetables, length=WAVETABLE_LEN):
+    """
+    single-cycle waves from random harmonic spectra (random tilt, sparsity and phases), peak-normalised to 1
+    """
+    k = np.arange(1, N_HARMONICS + 1)
+    tilt = rng.uniform(0.5, 2.0, (n, n_wavetables, 1))
+    amplitudes = rng.uniform(0, 1, (n, n_wavetables, N_HARMONICS)) * k ** -tilt
+    amplitudes *= rng.uniform(0, 1, amplitudes.shape) < rng.uniform(0.2, 1.0, (n, n_wavetables, 1))
+    amplitudes[..., 0] = np.maximum(amplitudes[..., 0], 0.1)
+    phases = rng.uniform(0, 2 * np.pi, amplitudes.shape)
+    t = 2 * np.pi * np.arange(length) / length
+    # sum over harmonics of a_k sin(k t + phi_k)
+    waves = np.einsum("bwk,kt->bwt", amplitudes * np.cos(phases), np.sin(np.outer(k, t))) + \
+        np.einsum("bwk,kt->bwt", amplitudes * np.sin(phases), np.cos(np.outer(k, t)))
+    return (waves / np.abs(waves).max(axis=-1, keepdims=True)).astype(np.float32)
+
+
+def sample_vital_params(rng, n, config):
+    logits = rng.standard_normal((n, config["train"]["n_wavetables"])) * rng.uniform(0.5, 4.0, (n, 1))
+    attention = np.exp(logits) / np.exp(logits).sum(axis=-1, keepdims=True)
+    return {
+        "wavetables": sample_wavetables(rng, n, config["train"]["n_wavetables"]),
+        "attention": attention.astype(np.float32),
+        "attack_secs": rng.uniform(0.0, 1.0, n).astype(np.float32),
+        "decay_secs": rng.uniform(0.05, 2.0, n).astype(np.float32),
+        "sustain_level": rng.uniform(0.1, 1.0, n).astype(np.float32),
+        "gain": rng.uniform(0.3, 1.0, n).astype(np.float32),
+        "f0_hz": midi_to_hz(rng.integers(36, 85, n)).astype(np.float32),
+    }
+
+
+@torch.no_grad()
+def render_vital(params, config):
+    """
+    [n, duration * sr] float32 audio: one note from t=0, as WTSv2 synthesises it (onset on frame 0)
+    """
+    from neural_synth_modeler.inferencer.vital.models.core import upsample
+    from neural_synth_modeler.inferencer.vital.models.wavetable_synth import WavetableSynthV2
+
+    sr, block_size = config["common"]["sampling_rate"], config["common"]["block_size"]
+    duration_secs = config["common"]["duration_secs"]
+    n, n_frames = len(params["f0_hz"]), duration_secs * sr // block_size
+    if n < 2:
+        # WavetableSynthV2 squeezes the batch dimension of single items
+        return render_vital({k: np.concatenate([v, v]) for k, v in params.items()}, config)[:1]
+
+    pitch = torch.from_numpy(params["f0_hz"])[:, None, None].expand(n, n_frames, 1)
+    amplitude = torch.from_numpy(params["gain"])[:, None, None].expand(n, n_frames * block_size, 1)
+    wts = WavetableSynthV2(sr=sr, duration_secs=duration_secs, block_size=block_size)
+    signal, _ = wts(upsample(pitch, block_size), amplitude, torch.from_numpy(params["wavetables"]),
+                    torch.from_numpy(params["attention"]))
+
+    adsr = ADSREnvelopeShaper()(torch.from_numpy(params["attack_secs"]), torch.from_numpy(params["decay_secs"]),
+                                torch.from_numpy(params["sustain_level"]), total_secs=duration_secs)
+    adsr = upsample(adsr.reshape(n, -1, 1), block_size).squeeze(-1)
+    return (signal.squeeze(-1) * adsr).numpy().astype(np.float32)
+
+
+def vital_features(audio, params, config):
+    """
+    the WTSv2 training features of rendered clips, with the ground-truth pitch
+    """
+    from neural_synth_modeler.inferencer.vital.models.core import extract_loudness
+    from neural_synth_modeler.inferencer.vital.models.preprocessor import mean_loudness, spec, std_loudness
+
+    sr, block_size = config["common"]["sampling_rate"], config["common"]["block_size"]
+    n, n_frames = audio.shape[0], audio.shape[1] // block_size
+    loudness = extract_loudness(torch.from_numpy(audio), sr, block_size).reshape(n, -1)[:, :n_frames]
+    with torch.no_grad():
+        mfcc = spec(torch.from_numpy(audio)).numpy()
+    # frames of the default librosa STFT used by preprocess for onsets
+    times = librosa.frames_to_time(np.arange(1 + audio.shape[1] // 512), sr=sr)
+    return {
+        "y": audio,
+        "mfcc": mfcc.astype(np.float32),
+        "pitch": np.repeat(params["f0_hz"][:, None, None], n_frames, axis=1).astype(np.float32),
+        "loudness": ((loudness - mean_loudness) / std_loudness)[..., None].astype(np.float32),
+        "times": np.repeat(times[None], n, axis=0).astype(np.float32),
+        "onset_frames": np.zeros((n, 1), dtype=np.int64),
+        "n_onsets": np.ones(n, dtype=np.int64),
+    }
+
+
+def sample_dexed_params(rng, n, n_frames, max_ol):
+    """
+    output levels [n, n_frames, 6] in [0, max_ol]: one ADSR envelope per operator, scaled by a random level
+    """
+    shape = (n, 1, 6)
+    envelope = ADSREnvelopeShaper().gen_envelope(
+        attack=torch.from_numpy(rng.uniform(0.0, 0.3, shape)).float(),
+        decay=torch.from_numpy(rng.uniform(0.02, 0.8, shape)).float(),
+        sus_level=torch.from_numpy(rng.uniform(0.05, 1.0, shape)).float(),
+        release=torch.zeros(shape),
+        n_frames=n_frames)
+    level = rng.uniform(0.0, 1.0, shape).astype(np.float32)
+    return {
+        "ol": (max_ol * level * envelope.numpy()).astype(np.float32),
+        "f0_hz": midi_to_hz(rng.integers(36, 85, n)).astype(np.float32),
+    }
+
+
+@torch.no_grad()
+def render_dexed(params, synth):
+    """
+    [n, n_frames * block_size] float32 audio of a DDX7 FMSynth for ground-truth output levels
+    """
+    n, n_frames, _ = params["ol"].shape
+    # FMSynth scales its controls with max_ol * sigmoid(ol): feed it the logit of the target levels
+    ratio = np.clip(params["ol"] / synth.max_ol, 1e-6, 1 - 1e-6)
+    controls = {
+        "ol": torch.from_numpy(np.log(ratio / (1 - ratio))).float(),
+        "f0_hz": torch.from_numpy(params["f0_hz"])[:, None, None].expand(n, n_frames, 1).contiguous(),
+    }
+    return synth(controls)["synth_audio"].reshape(n, -1).numpy().astype(np.float32)
+
+
+def dexed_processor(duration_secs):
+    from neural_synth_modeler.inferencer.dexed.models.preprocessor import ProcessData
+    with open(DEXED_DATA_CONFIG_PATH) as f:
+        data_config = yaml.safe_load(f)["data_processor"]
+    return ProcessData(
+        silence_thresh_dB=data_config["silence_thresh_dB"],
+        sr=data_config["sr"],
+        device="cpu",
+        seq_len=data_config["seq_len"],
+        crepe_params=data_config["crepe_params"],
+        loudness_params=data_config["loudness_params"],
+        rms_params=data_config["rms_params"],
+        hop_size=data_config["hop_size"],
+        max_len=duration_secs,
+        center=data_config["center"],
+    )
+
+
+class VitalGenerator:
+    def __init__(self, render_batch=32):
+        with open(VITAL_CONFIG_PATH) as f:
+            self.config = yaml.safe_load(f)
+        self.render_batch = render_batch
+
+    def make_shard(self, rng, n):
+        arrays = {}
+        for start in range(0, n, self.render_batch):
+            params = sample_vital_params(rng, min(self.render_batch, n - start), self.config)
+            audio = render_vital(params, self.config)
+            batch = vital_features(audio, params, self.config)
+            batch.update({k: params[k] for k in VITAL_LABELS})
+            for k, v in batch.items():
+                arrays.setdefault(k, []).append(v)
+        return {k: np.concatenate(v) for k, v in arrays.items()}
+
+    def write_shard(self, arrays, path):
+        os.makedirs(path)
+        for k, v in arrays.items():
+            np.save(os.path.join(path, k + ".npy"), v)
+
+    def shapes(self, path):
+        return {f[:-4]: list(np.load(os.path.join(path, f), mmap_mode="r").shape[1:]) for f in os.listdir(path)}
+
+    def index(self, shards, shapes):
+        from neural_synth_modeler.train.vital.datasets import FEATURES
+        return {"shapes": {k: shapes[k] for k in FEATURES}, "labels": VITAL_LABELS, "shards": shards}
+
+
+class DexedGenerator:
+    def __init__(self, model_recipe="tcnres_f0ld_fmstr_noreverb", duration_secs=4, render_batch=32):
+        from neural_synth_modeler.inferencer.dexed.models.ddx7.synth import FMSynth
+        from neural_synth_modeler.train.dexed.trainer import load_recipe
+        synth_config = load_recipe("model", model_recipe)["synth"]
+        self.synth = FMSynth(sample_rate=synth_config["sample_rate"], block_size=synth_config["block_size"],
+                             fr=synth_config["fr"], max_ol=synth_config["max_ol"],
+                             synth_module=synth_config["synth_module"], is_reverb=False)
+        self.synth_module = synth_config["synth_module"]
+        self.processor = dexed_processor(duration_secs)
+        self.render_batch = render_batch
+
+    def make_shard(self, rng, n):
+        arrays = {}
+        for start in range(0, n, self.render_batch):
+            params = sample_dexed_params(rng, min(self.render_batch, n - start), self.processor.feat_size,
+                                         self.synth.max_ol)
+            audio = render_dexed(params, self.synth)
+            batch = {
+                "audio": audio,
+                "f0": np.repeat(params["f0_hz"][:, None], self.processor.feat_size, axis=1),
+                "loudness": np.stack([self.processor.calc_loudness(a) for a in audio]).astype(np.float32),
+                "rms": np.stack([self.processor.calc_rms(a) for a in audio]).astype(np.float32),
+                "ol": params["ol"],
+            }
+            for k, v in batch.items():
+                arrays.setdefault(k, []).append(v)
+        return {k: np.concatenate(v) for k, v in arrays.items()}
+
+    def write_shard(self, arrays, path):
+        with h5py.File(path, "w") as h5f:
+            h5f.attrs["layout"] = "rows"
+            h5f.attrs["synth_module"] = self.synth_module
+            for k, v in arrays.items():
+                h5f.create_dataset(k, data=v)
+
+    def shapes(self, path):
+        with h5py.File(path, "r") as h5f:
+            return {k: list(h5f[k].shape[1:]) for k in h5f.keys()}
+
+    def index(self, shards, shapes):
+        return {"shapes": shapes, "labels": ["ol"], "synth_module": self.synth_module, "shards": shards}
+
+
+GENERATORS = {"vital": VitalGenerator, "dexed": DexedGenerator}
+SHARD_NAMES = {"vital": "shard_{:04d}", "dexed": "shard_{:04d}.h5"}
+
+_generator = None
+
+
+def _init_worker(synth):
+    global _generator
+    torch.set_num_threads(1)
+    _generator = GENERATORS[synth]()
+
+
+def _make_shard(job):
+    idx, n, seed, output_dir, name = job
+    start = time.perf_counter()
+    arrays = _generator.make_shard(np.random.default_rng([seed, idx]), n)
+    tmp = os.path.join(output_dir, name + ".tmp")
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    elif os.path.exists(tmp):
+        os.remove(tmp)
+    _generator.write_shard(arrays, tmp)
+    os.replace(tmp, os.path.join(output_dir, name))
+    return idx, time.perf_counter() - start
+
+
+def check_index(output_dir, settings):
+    """
+    raises ValueError when output_dir already holds a dataset generated with other settings
+    """
+    index_path = os.path.join(output_dir, "index.json")
+    if not os.path.exists(index_path):
+        return
+    with open(index_path) as f:
+        index = json.load(f)
+    # indexes written before `synth` was recorded: dexed shards are .h5 files
+    index.setdefault("synth", "dexed" if index["shards"][0]["name"].endswith(".h5") else "vital")
+    mismatch = {k: (index.get(k), v) for k, v in settings.items() if index.get(k) != v}
+    if mismatch:
+        raise ValueError("{} holds a dataset generated with other settings ({}), use a new directory".format(
+            output_dir, ", ".join("{}: {} != {}".format(k, old, new) for k, (old, new) in mismatch.items())))
+
+
+def generate(synth, output_dir, n_clips, shard_size=256, num_workers=1, seed=0):
+    """
+    renders n_clips clips into shards of shard_size, returns the index with the throughput of the run
+    """
+    check_index(output_dir, {"synth": synth, "seed": seed, "shard_size": shard_size})
+    os.makedirs(output_dir, exist_ok=True)
+    n_shards = (n_clips + shard_size - 1) // shard_size
+    shards = [{"name": SHARD_NAMES[synth].format(i), "rows": min(shard_size, n_clips - i * shard_size)}
+              for i in range(n_shards)]
+    jobs = [(i, shard["rows"], seed, output_dir, shard["name"]) for i, shard in enumerate(shards)
+            if not os.path.exists(os.path.join(output_dir, shard["name"]))]
+
+    start = time.perf_counter()
+    if num_workers > 1:
+        # the parent only schedules: each worker renders and writes whole shards
+        with multiprocessing.get_context("spawn").Pool(num_workers, initializer=_init_worker,
+                                                       initargs=(synth,)) as pool:
+            for _ in pool.imap_unordered(_make_shard, jobs):
+                pass
+    else:
+        _init_worker(synth)
+        for job in jobs:
+            _make_shard(job)
+    elapsed = time.perf_counter() - start
+
+    generator = _generator or GENERATORS[synth]()
+    index = generator.index(shards, generator.shapes(os.path.join(output_dir, shards[0]["name"])))
+    index.update(synth=synth, size=n_clips, seed=seed, shard_size=shard_size)
+    # written last, so a directory with an index is complete
+    with open(os.path.join(output_dir, "index.json"), "w") as f:
+        json.dump(index, f, indent=2)
+
+    rendered = sum(job[1] for job in jobs)
+    return dict(index, stats={"rendered_clips": rendered, "secs": elapsed,
+                              "clips_per_min": 60 * rendered / elapsed if rendered else None})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a labeled synthetic training set without Reaper")
+    parser.add_argument("synth", choices=list(GENERATORS))
+    parser.add_argument("output_dir")
+    parser.add_argument("--clips", type=int, default=10000)
+    parser.add_argument("--shard-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    index = generate(args.synth, args.output_dir, args.clips, shard_size=args.shard_size,
+                     num_workers=args.workers, seed=args.seed)
+    stats = index["stats"]
+    print("Rendered {} clips in {:.1f}s ({} clips/min) to {}".format(
+        stats["rendered_clips"], stats["secs"],
+        "-" if stats["clips_per_min"] is None else "{:.0f}".format(stats["clips_per_min"]), args.output_dir))
@@ -0,0 +1,174 @@
+"""
+Training datasets for WTSv2.
+
+`VitalAudioParamDataset` decodes a WAV and unpickles its feature dict on every access. `pack_features` converts
+such a dataset once into fixed-shape `.npy` shards, one file per feature and shard, listed in `index.json`:
+
+    pack_features("path/to/audio", "path/to/params", "path/to/shards")
+    dataset = VitalFeatureShardDataset("path/to/shards")
+
+`VitalFeatureShardDataset` memory-maps the shards lazily in each DataLoader worker and returns the same items
+as zero-copy views. `ShardShuffleSampler` shuffles shards and rows within a shard, so each worker reads
+mostly from one shard at a time.
+"""
+import json
+import os
+import librosa
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Sampler
+from tqdm import tqdm
+from neural_synth_modeler.inferencer.vital.models.preprocessor import sr
+
+FEATURES = ["y", "mfcc", "pitch", "loudness", "times", "onset_frames"]
+DTYPES = {"y": np.float32, "mfcc": np.float32, "pitch": np.float32, "loudness": np.float32, "times": np.float32,
+          "onset_frames": np.int64}
+
+
+class VitalAudioParamDataset(Dataset):
+    def __init__(self, audio_dir, param_dir):
+        self.audio_files = sorted([os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.endswith(".wav")])
+        self.param_files = sorted([os.path.join(param_dir, f) for f in os.listdir(param_dir) if f.endswith(".npy")])
+        assert len(self.audio_files) == len(self.param_files), "Mismatch in audio/param files"
+
+    def __len__(self):
+        return len(self.audio_files)
+
+    def load(self, idx):
+        """
+        the raw arrays of a sample, by feature name
+        """
+        y, _ = librosa.load(self.audio_files[idx], sr=sr)
+        params = np.load(self.param_files[idx], allow_pickle=True).item()
+        features = {"y": y}
+        features.update({k: params[k] for k in FEATURES[1:]})
+        return features
+
+    def __getitem__(self, idx):
+        features = self.load(idx)
+        y = torch.tensor(features["y"]).float()
+        mfcc = torch.tensor(features["mfcc"]).float()
+        pitch = torch.tensor(features["pitch"]).float()
+        loudness = torch.tensor(features["loudness"]).float()
+        times = torch.tensor(features["times"]).float()
+        onset_frames = torch.tensor(features["onset_frames"]).long()
+        return y, mfcc, pitch, loudness, times, onset_frames
+
+
+def pack_features(audio_dir, param_dir, output_dir, shard_size=1024):
+    """
+    packs a VitalAudioParamDataset into shards of `shard_size` samples. onset_frames vary in length, they are
+    padded with -1 to the longest one and their count is stored in `n_onsets`.
+    """
+    dataset = VitalAudioParamDataset(audio_dir, param_dir)
+    max_onsets = max(len(np.load(f, allow_pickle=True).item()["onset_frames"]) for f in dataset.param_files)
+    first = dataset.load(0)
+    shapes = {k: list(np.shape(first[k])) for k in FEATURES}
+    shapes["onset_frames"] = [max_onsets]
+
+    os.makedirs(output_dir, exist_ok=True)
+    shards = []
+    for start in tqdm(range(0, len(dataset), shard_size)):
+        n_rows = min(shard_size, len(dataset) - start)
+        name = "shard_{:04d}".format(len(shards))
+        os.makedirs(os.path.join(output_dir, name), exist_ok=True)
+        arrays = {
+            k: np.lib.format.open_memmap(os.path.join(output_dir, name, k + ".npy"), mode="w+",
+                                         dtype=DTYPES[k], shape=(n_rows, *shapes[k]))
+            for k in FEATURES
+        }
+        arrays["n_onsets"] = np.lib.format.open_memmap(os.path.join(output_dir, name, "n_onsets.npy"), mode="w+",
+                                                       dtype=np.int64, shape=(n_rows,))
+        for row in range(n_rows):
+            features = dataset.load(start + row)
+            for k in FEATURES[:-1]:
+                if list(np.shape(features[k])) != shapes[k]:
+                    raise ValueError("{} of sample {} has shape {}, expected {}".format(
+                        k, start + row, np.shape(features[k]), shapes[k]))
+                arrays[k][row] = features[k]
+            onsets = np.asarray(features["onset_frames"])
+            arrays["onset_frames"][row] = -1
+            arrays["onset_frames"][row, :len(onsets)] = onsets
+            arrays["n_onsets"][row] = len(onsets)
+        for array in arrays.values():
+            array.flush()
+        shards.append({"name": name, "rows": n_rows})
+
+    # written last, so a directory with an index is always complete
+    with open(os.path.join(output_dir, "index.json"), "w") as f:
+        json.dump({"shapes": shapes, "shards": shards, "size": len(dataset)}, f, indent=2)
+    return len(dataset)
+
+
+class VitalFeatureShardDataset(Dataset):
+    def __init__(self, shards_dir):
+        self.shards_dir = shards_dir
+        with open(os.path.join(shards_dir, "index.json")) as f:
+            self.index = json.load(f)
+        rows = [shard["rows"] for shard in self.index["shards"]]
+        self.shard_starts = np.concatenate([[0], np.cumsum(rows)])
+        self._pid = None
+        self._shards = None
+
+    def __len__(self):
+        return int(self.shard_starts[-1])
+
+    def __getstate__(self):
+        # memmaps are opened again in each worker process
+        state = self.__dict__.copy()
+        state.update(_pid=None, _shards=None)
+        return state
+
+    def open(self):
+        self._shards = [
+            {k: np.load(os.path.join(self.shards_dir, shard["name"], k + ".npy"), mmap_mode="c")
+             for k in FEATURES + ["n_onsets"]}
+            for shard in self.index["shards"]
+        ]
+        self._pid = os.getpid()
+
+    def locate(self, idx):
+        """
+        (shard, row) of a sample
+        """
+        if idx < 0 or idx >= len(self):
+            raise IndexError(idx)
+        shard = int(np.searchsorted(self.shard_starts, idx, side="right")) - 1
+        return shard, idx - int(self.shard_starts[shard])
+
+    def __getitem__(self, idx):
+        if self._pid != os.getpid():
+            self.open()
+        shard, row = self.locate(idx)
+        arrays = self._shards[shard]
+        y, mfcc, pitch, loudness, times, onset_frames = (torch.from_numpy(arrays[k][row]) for k in FEATURES)
+        return y, mfcc, pitch, loudness, times, onset_frames[:arrays["n_onsets"][row]]
+
+
+class ShardShuffleSampler(Sampler):
+    """
+    random order that visits the shards one after another, in a random shard order with shuffled rows.
+    with num_replicas > 1, rank r takes every num_replicas-th index of that order, so all ranks read the
+    same shard at the same time and get the same number of samples.
+    """
+    def __init__(self, dataset, seed=0, num_replicas=1, rank=0):
+        self.shard_starts = dataset.shard_starts
+        self.seed = seed
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.epoch = 0
+
+    def __len__(self):
+        return int(self.shard_starts[-1]) // self.num_replicas
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        order = []
+        for shard in rng.permutation(len(self.shard_starts) - 1):
+            start, end = int(self.shard_starts[shard]), int(self.shard_starts[shard + 1])
+            order.extend((start + rng.permutation(end - start)).tolist())
+        yield from order[self.rank:len(self) * self.num_replicas:self.num_replicas]
@@ -1,14 +1,15 @@
+import argparse
 import os
 import yaml
 import torch
-from torch.utils.data import DataLoader, Dataset, random_split
-from neural_synth_modeler.inferencer.vital.models.model import WTSv2
-from neural_synth_modeler.inferencer.vital.models.preprocessor import spec, sr, n_mfcc
-from neural_synth_modeler.inferencer.vital.models.core import multiscale_fft
-import numpy as np
-import librosa
-from tqdm import tqdm
-import datetime
+import logging
+from torch.utils.data import random_split
+from neural_synth_modeler.train.vital.datasets import VitalAudioParamDataset, VitalFeatureShardDataset
+from neural_synth_modeler.train.vital.trainer import Trainer, build_model, make_loader
+from neural_synth_modeler.utils.checkpoint import CheckpointManager
+from neural_synth_modeler.utils.distributed import cleanup, init, is_main_process, launch, shard_sampler
+
+logging.basicConfig(level=logging.INFO)
 
 # 1. Load config
 # Get project root (2 levels up from this script)
@@ -17,105 +18,54 @@ config_path = os.path.join(project_root, "neural_synth_modeler/inferencer/vital/
 with open(config_path, "r") as f:
     config = yaml.safe_load(f)
 
-device = torch.device(config["device"] if torch.cuda.is_available() else "cpu")
-
-# 2. Define your dataset
-class VitalAudioParamDataset(Dataset):
-    def __init__(self, audio_dir, param_dir):
-        self.audio_files = sorted([os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.endswith(".wav")])
-        self.param_files = sorted([os.path.join(param_dir, f) for f in os.listdir(param_dir) if f.endswith(".npy")])
-        assert len(self.audio_files) == len(self.param_files), "Mismatch in audio/param files"
-
-    def __len__(self):
-        return len(self.audio_files)
-
-    def __getitem__(self, idx):
-        y, _ = librosa.load(self.audio_files[idx], sr=sr)
-        params = np.load(self.param_files[idx], allow_pickle=True).item()
-        pitch = torch.tensor(params["pitch"]).float()
-        loudness = torch.tensor(params["loudness"]).float()
-        times = torch.tensor(params["times"]).float()
-        onset_frames = torch.tensor(params["onset_frames"]).long()
-        mfcc = torch.tensor(params["mfcc"]).float()
-        y = torch.tensor(y).float()
-        return y, mfcc, pitch, loudness, times, onset_frames
-
-# 3. Instantiate dataset and train/test split
-# Update these paths to be absolute or relative to project root if needed
-full_dataset = VitalAudioParamDataset("path/to/audio", "path/to/params")
-train_size = int(0.8 * len(full_dataset))
-test_size = len(full_dataset) - train_size
-train_dataset, test_dataset = random_split(full_dataset, [train_size, test_size])
 
-train_loader = DataLoader(train_dataset, batch_size=config["train"]["batch_size"], shuffle=True)
-test_loader = DataLoader(test_dataset, batch_size=config["test"]["batch_size"], shuffle=False)
+def main(rank, world_size):
+    init(rank, world_size)
+    device = torch.device(config["device"] if torch.cuda.is_available() and world_size == 1 else "cpu")
 
-# 4. Instantiate model
-model = WTSv2(
-    hidden_size=config["train"]["hidden_size"],
-    n_harmonic=config["train"]["n_harmonic"],
-    n_bands=config["train"]["n_bands"],
-    sampling_rate=config["common"]["sampling_rate"],
-    block_size=config["common"]["block_size"],
-    mode="wavetable",
-    duration_secs=config["common"]["duration_secs"],
-    num_wavetables=config["train"]["n_wavetables"],
-    wavetable_smoothing=False,
-    preload_wt=False,
-    enable_amplitude=True,
-    is_round_secs=False,
-    device=str(device)
-).to(device)
+    # 2. Instantiate dataset and train/test split
+    # Update these paths to be absolute or relative to project root if needed
+    # once packed with datasets.pack_features, use VitalFeatureShardDataset("path/to/shards") instead: no decoding per step
+    full_dataset = VitalAudioParamDataset("path/to/audio", "path/to/params")
+    train_size = int(0.8 * len(full_dataset))
+    test_size = len(full_dataset) - train_size
+    # same split on every rank
+    train_dataset, test_dataset = random_split(full_dataset, [train_size, test_size],
+                                               generator=torch.Generator().manual_seed(0))
 
-# 5. Load checkpoint if exists
-checkpoint_path = os.path.join(project_root, "neural_synth_modeler/inferencer/vital/checkpoints/model.pt")
-if os.path.exists(checkpoint_path):
-    model.load_state_dict(torch.load(checkpoint_path, map_location=device))
-    print(f"Loaded checkpoint weights from {checkpoint_path}!")
+    # with several processes, each rank trains on its own shard of the data
+    train_sampler = shard_sampler(train_dataset, shuffle=True) if world_size > 1 else None
+    test_sampler = shard_sampler(test_dataset, shuffle=False) if world_size > 1 else None
+    train_loader = make_loader(train_dataset, config["train"]["batch_size"], shuffle=True, sampler=train_sampler,
+                               num_workers=config["train"]["num_workers"], pin_memory=config["train"]["pin_memory"],
+                               device=device)
+    test_loader = make_loader(test_dataset, config["test"]["batch_size"], sampler=test_sampler,
+                              num_workers=config["train"]["num_workers"], pin_memory=config["train"]["pin_memory"],
+                              device=device)
 
-optimizer = torch.optim.Adam(model.parameters(), lr=config["train"]["start_lr"])
-loss_fn = torch.nn.MSELoss()  # Or use your custom loss, e.g., multiscale_fft
+    # 3. Instantiate model
+    model = build_model(config, device)
 
-epochs = config["train"]["epochs"]
-for epoch in range(epochs):
-    model.train()
-    train_loss = 0.0
-    train_batches = 0
-    with tqdm(train_loader, desc=f"Epoch {epoch+1}/{epochs} [Train]", leave=False) as tbar:
-        for batch in tbar:
-            y, mfcc, pitch, loudness, times, onset_frames = [b.to(device) for b in batch]
-            optimizer.zero_grad()
-            signal, adsr, final_signal, attention_output, wavetables, wavetables_old, smoothing_coeff = model(
-                y, mfcc, pitch, loudness, times, onset_frames
-            )
-            loss = loss_fn(final_signal, y)
-            loss.backward()
-            optimizer.step()
-            train_loss += loss.item()
-            train_batches += 1
-            tbar.set_postfix(loss=loss.item())
-    avg_train_loss = train_loss / train_batches
+    # 4. Resume from the latest training checkpoint, or start from the released weights if there is none
+    checkpoints = CheckpointManager(os.path.join(project_root, config["train"]["checkpoint_dir"]),
+                                    keep_last=config["train"]["keep_last"])
+    checkpoint_path = os.path.join(project_root, "neural_synth_modeler/inferencer/vital/checkpoints/model.pt")
+    if checkpoints.meta["latest"] is None and os.path.exists(checkpoint_path):
+        model.load_state_dict(torch.load(checkpoint_path, map_location=device))
+        if is_main_process():
+            print(f"Loaded checkpoint weights from {checkpoint_path}!")
 
-    # Evaluate on test set
-    model.eval()
-    test_loss = 0.0
-    test_batches = 0
-    with torch.no_grad():
-        with tqdm(test_loader, desc=f"Epoch {epoch+1}/{epochs} [Test]", leave=False) as tbar:
-            for batch in tbar:
-                y, mfcc, pitch, loudness, times, onset_frames = [b.to(device) for b in batch]
-                signal, adsr, final_signal, attention_output, wavetables, wavetables_old, smoothing_coeff = model(
-                    y, mfcc, pitch, loudness, times, onset_frames
-                )
-                loss = loss_fn(final_signal, y)
-                test_loss += loss.item()
-                test_batches += 1
-                tbar.set_postfix(loss=loss.item())
-    avg_test_loss = test_loss / test_batches
+    # 5. Train: precision, torch.compile, gradient accumulation and the LR schedule are set in config["train"]
+    # the best weights by test loss end up in <checkpoint_dir>/best_model.pt
+    trainer = Trainer(model, train_loader, test_loader, train_config=config["train"], device=device)
+    trainer.fit(config["train"]["epochs"], checkpoints=checkpoints, checkpoint_every=config["train"]["checkpoint_every"])
+    checkpoints.close()
+    cleanup()
 
-    print(f"Epoch {epoch+1}/{epochs} | Train Loss: {avg_train_loss:.4f} | Test Loss: {avg_test_loss:.4f}")
 
-    # Save checkpoint with timestamp
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-    save_path = os.path.join(project_root, f"neural_synth_modeler/inferencer/vital/checkpoints/model_epoch{epoch+1}_{timestamp}.pt")
-    torch.save(model.state_dict(), save_path) 
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train WTSv2")
+    parser.add_argument("--nproc", type=int, default=config["train"]["nproc"],
+                        help="data-parallel processes (gloo, CPU), default: train.nproc of the config")
+    args = parser.parse_args()
+    launch(main, args.nproc)
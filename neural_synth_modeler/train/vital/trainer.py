@@ -0,0 +1,283 @@
+"""
+Training loop for WTSv2, configured by the `train` section of vital/config.yaml:
+
+    precision: fp32 | bf16 (autocast, CPU or CUDA) | fp16 (CUDA autocast + GradScaler)
+    compile: wrap the model in torch.compile (torch >= 2.0)
+    grad_accum_steps: optimizer step every n batches, effective batch size = batch_size * grad_accum_steps
+    num_workers / pin_memory: DataLoader workers, pinned host memory when training on CUDA
+
+The learning rate follows `core.get_scheduler`, from start_lr to stop_lr over decay_over steps, set every epoch.
+Steps/s and samples/s are logged every `log_every` optimizer steps and returned for each epoch.
+
+With a `utils.checkpoint.CheckpointManager`, `fit` saves the full training state (weights, optimizer, scaler,
+epoch / step counters and RNG states) every `checkpoint_every` epochs and resumes from the latest checkpoint.
+
+Inside a process group (utils.distributed) the model is wrapped in DistributedDataParallel, gradients are
+all-reduced on the last micro-batch of each optimizer step, losses are averaged over ranks and only rank 0
+logs and writes checkpoints. Samples/s are then counted over all ranks.
+"""
+import logging
+import time
+import warnings
+from contextlib import nullcontext
+
+import torch
+from torch.utils.data import DataLoader
+
+from neural_synth_modeler.inferencer.vital.models.core import MultiscaleSpectralLoss, get_scheduler
+from neural_synth_modeler.inferencer.vital.models.model import WTSv2
+from neural_synth_modeler.utils.checkpoint import rng_state, set_rng_state
+from neural_synth_modeler.utils.distributed import (all_reduce_mean, barrier, get_world_size, is_main_process,
+                                                    wrap_model)
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = {"fp32": None, "bf16": torch.bfloat16, "fp16": torch.float16}
+
+
+def build_model(config, device):
+    return WTSv2(
+        hidden_size=config["train"]["hidden_size"],
+        n_harmonic=config["train"]["n_harmonic"],
+        n_bands=config["train"]["n_bands"],
+        sampling_rate=config["common"]["sampling_rate"],
+        block_size=config["common"]["block_size"],
+        mode="wavetable",
+        duration_secs=config["common"]["duration_secs"],
+        num_wavetables=config["train"]["n_wavetables"],
+        wavetable_smoothing=False,
+        preload_wt=False,
+        enable_amplitude=True,
+        is_round_secs=False,
+        device=str(device)
+    ).to(device)
+
+
+def collate_batch(samples):
+    """
+    stacks y, mfcc, pitch and loudness. WTSv2.forward takes one time grid and one onset list per batch
+    (see the TODO on amp_onsets), so they are taken from the first sample. When the samples differ in either,
+    the others get the ADSR envelope of the first sample, which is reported with a warning.
+    """
+    y, mfcc, pitch, loudness, times, onset_frames = zip(*samples)
+    for name, values in [("times", times), ("onset_frames", onset_frames)]:
+        if not all(torch.equal(torch.as_tensor(v), torch.as_tensor(values[0])) for v in values[1:]):
+            warnings.warn("Samples of a batch have different {}, WTSv2 shapes the whole batch with the ADSR "
+                          "onsets of the first sample".format(name))
+    return torch.stack(y), torch.stack(mfcc), torch.stack(pitch), torch.stack(loudness), times[0], onset_frames[0]
+
+
+def make_loader(dataset, batch_size, shuffle=False, sampler=None, num_workers=0, pin_memory=True, device="cpu"):
+    """
+    WTSv2.forward squeezes the batch dimension of the pitch, so batches need at least two samples and a
+    last incomplete batch is dropped.
+    """
+    if batch_size < 2:
+        raise ValueError("WTSv2 batches need at least 2 samples, got batch_size={}".format(batch_size))
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle and sampler is None,
+        sampler=sampler,
+        num_workers=num_workers,
+        # pinning only pays off for host -> GPU copies
+        pin_memory=pin_memory and torch.device(device).type == "cuda",
+        persistent_workers=num_workers > 0,
+        drop_last=True,
+        collate_fn=collate_batch,
+    )
+
+
+class Trainer:
+    def __init__(self, model, train_loader, test_loader=None, train_config=None, device="cpu"):
+        train_config = train_config or {}
+        self.device = torch.device(device)
+        self.model = model
+        self.train_loader = train_loader
+        self.test_loader = test_loader
+        self.grad_accum_steps = train_config.get("grad_accum_steps", 1)
+        self.log_every = train_config.get("log_every", 20)
+
+        precision = train_config.get("precision", "fp32")
+        if precision not in PRECISIONS:
+            raise ValueError("Unknown precision {}, available: {}".format(precision, list(PRECISIONS)))
+        if precision == "fp16" and self.device.type != "cuda":
+            raise ValueError("fp16 autocast needs CUDA, use bf16 on CPU")
+        self.precision = precision
+        self.scaler = torch.cuda.amp.GradScaler() if precision == "fp16" else None
+
+        # DistributedDataParallel inside a process group, the model itself otherwise
+        self.ddp_model = wrap_model(model, find_unused_parameters=train_config.get("find_unused_parameters", False))
+        self.forward_model = self.ddp_model
+        if train_config.get("compile", False):
+            if not hasattr(torch, "compile"):
+                raise RuntimeError("torch.compile needs torch >= 2.0, found {}".format(torch.__version__))
+            self.forward_model = torch.compile(self.ddp_model)
+
+        self.optimizer = torch.optim.Adam(model.parameters(), lr=train_config.get("start_lr", 1e-3))
+        self.schedule = self.make_schedule(train_config)
+        self.loss_fn = self.make_loss_fn(train_config)
+        self.epoch = 0
+        self.step = 0
+
+    def make_schedule(self, train_config):
+        """
+        epoch -> learning rate
+        """
+        return get_scheduler(
+            len(self.train_loader) // self.grad_accum_steps,
+            train_config.get("start_lr", 1e-3),
+            train_config.get("stop_lr", 1e-4),
+            train_config.get("decay_over", 400000),
+        )
+
+    def make_loss_fn(self, train_config):
+        return MultiscaleSpectralLoss(train_config.get("scales", [4096, 2048, 1024, 512, 256, 128]),
+                                      train_config.get("overlap", .75))
+
+    def autocast(self):
+        if PRECISIONS[self.precision] is None:
+            return nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=PRECISIONS[self.precision])
+
+    def grad_sync(self, sync):
+        """
+        skips the gradient all-reduce of micro-batches that are not the last one of an optimizer step
+        """
+        if sync or self.ddp_model is self.model:
+            return nullcontext()
+        return self.ddp_model.no_sync()
+
+    def compute_loss(self, batch):
+        y, mfcc, pitch, loudness, times, onset_frames = [b.to(self.device, non_blocking=True) for b in batch]
+        with self.autocast():
+            signal, adsr, final_signal, attention_output, wavetables, wavetables_old, smoothing_coeff = \
+                self.forward_model(y, mfcc, pitch, loudness, times, onset_frames)
+        # spectral loss in fp32, log magnitudes are not bf16 / fp16 friendly
+        return self.loss_fn(y, final_signal.float()), len(y)
+
+    def optimizer_step(self):
+        if self.scaler is not None:
+            self.scaler.step(self.optimizer)
+            self.scaler.update()
+        else:
+            self.optimizer.step()
+        self.optimizer.zero_grad(set_to_none=True)
+        self.step += 1
+
+    def train_epoch(self):
+        self.model.train()
+        if hasattr(self.train_loader.sampler, "set_epoch"):
+            # the shuffle order of an epoch does not depend on how many epochs ran before a resume
+            self.train_loader.sampler.set_epoch(self.epoch)
+        for g in self.optimizer.param_groups:
+            g["lr"] = self.schedule(self.epoch)
+
+        total_loss, n_batches, n_samples, pending = 0.0, 0, 0, 0
+        start = window_start = time.perf_counter()
+        window_steps, window_samples = 0, 0
+        n_loader_batches = len(self.train_loader)
+        self.optimizer.zero_grad(set_to_none=True)
+        for batch in self.train_loader:
+            with self.grad_sync(pending + 1 == self.grad_accum_steps or n_batches + 1 == n_loader_batches):
+                loss, batch_size = self.compute_loss(batch)
+                scaled = loss / self.grad_accum_steps
+                if self.scaler is not None:
+                    scaled = self.scaler.scale(scaled)
+                scaled.backward()
+            pending += 1
+            total_loss += loss.item()
+            n_batches += 1
+            n_samples += batch_size
+            window_samples += batch_size
+
+            if pending == self.grad_accum_steps:
+                self.optimizer_step()
+                pending = 0
+                window_steps += 1
+                if window_steps == self.log_every:
+                    elapsed = time.perf_counter() - window_start
+                    if is_main_process():
+                        logger.info("epoch %d step %d | loss %.4f | %.2f steps/s | %.1f samples/s", self.epoch,
+                                    self.step, loss.item(), window_steps / elapsed,
+                                    window_samples * get_world_size() / elapsed)
+                    window_start, window_steps, window_samples = time.perf_counter(), 0, 0
+        if pending > 0:
+            # left-over batches of the epoch still update the weights
+            self.optimizer_step()
+
+        elapsed = time.perf_counter() - start
+        self.epoch += 1
+        return {
+            "epoch": self.epoch,
+            "train_loss": all_reduce_mean(total_loss / max(n_batches, 1)),
+            "lr": self.optimizer.param_groups[0]["lr"],
+            "steps_per_sec": n_batches / self.grad_accum_steps / elapsed,
+            "samples_per_sec": n_samples * get_world_size() / elapsed,
+        }
+
+    @torch.no_grad()
+    def evaluate(self):
+        if self.test_loader is None:
+            return None
+        self.model.eval()
+        total_loss, n_batches = 0.0, 0
+        for batch in self.test_loader:
+            loss, _ = self.compute_loss(batch)
+            total_loss += loss.item()
+            n_batches += 1
+        return all_reduce_mean(total_loss / max(n_batches, 1))
+
+    def state_dict(self):
+        return {
+            "model": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "scaler": self.scaler.state_dict() if self.scaler is not None else None,
+            "epoch": self.epoch,
+            "step": self.step,
+            "rng": rng_state(),
+        }
+
+    def load_state_dict(self, state):
+        self.model.load_state_dict(state["model"])
+        self.optimizer.load_state_dict(state["optimizer"])
+        if self.scaler is not None and state["scaler"] is not None:
+            self.scaler.load_state_dict(state["scaler"])
+        self.epoch = state["epoch"]
+        self.step = state["step"]
+        set_rng_state(state["rng"])
+
+    def resume(self, checkpoints):
+        """
+        loads the latest checkpoint of a CheckpointManager, returns False if there is none
+        """
+        state = checkpoints.load_latest(map_location=self.device)
+        if state is None:
+            return False
+        self.load_state_dict(state)
+        logger.info("Resumed from %s at epoch %d, step %d", checkpoints.meta["latest"], self.epoch, self.step)
+        return True
+
+    def fit(self, epochs, checkpoints=None, checkpoint_every=1):
+        """
+        trains until `epochs` epochs are done in total, so a resumed run picks up where it stopped.
+        checkpoints are written in the background while the next epoch trains. every rank resumes from the
+        same checkpoint, only rank 0 writes them.
+        """
+        if checkpoints is not None:
+            self.resume(checkpoints)
+        history = []
+        while self.epoch < epochs:
+            stats = self.train_epoch()
+            stats["test_loss"] = self.evaluate()
+            if is_main_process():
+                logger.info("Epoch %d | train loss %.4f | test loss %s | %.2f steps/s | %.1f samples/s",
+                            stats["epoch"], stats["train_loss"], stats["test_loss"], stats["steps_per_sec"],
+                            stats["samples_per_sec"])
+                if checkpoints is not None and (self.epoch % checkpoint_every == 0 or self.epoch == epochs):
+                    checkpoints.save(self.state_dict(), self.epoch, stats["test_loss"])
+            history.append(stats)
+        if checkpoints is not None and is_main_process():
+            checkpoints.wait()
+        barrier()
+        return history
@@ -1,9 +1,58 @@
+"""
+Vital preset bookkeeping for rendering training data.
+
+Presets are tracked in a SQLite catalog (`PresetCatalog`), one row per preset keyed by the hash of its content:
+index, names, path, preset style, oscillator count, copy destination and rendered status.
+A rescan only hashes and parses the files whose size or mtime changed, in parallel. A moved or renamed preset
+keeps its index. Rendered / unrendered queries are indexed lookups instead of directory scans.
+
+The JSON preset map read by the Reaper render script is exported from the catalog.
+"""
+import hashlib
+import multiprocessing
 import os
+import re
 import shutil
 import json
-import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 PRESET_MAP_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../data/preset_map.json')
+CATALOG_PATH = os.path.join(os.path.dirname(PRESET_MAP_PATH), 'preset_catalog.sqlite')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS presets (
+    idx INTEGER PRIMARY KEY,
+    content_hash TEXT UNIQUE,
+    actual_name TEXT NOT NULL,
+    cleaned_name TEXT NOT NULL,
+    full_path TEXT NOT NULL,
+    preset_style TEXT NOT NULL DEFAULT '',
+    osc_count INTEGER,
+    size INTEGER,
+    mtime REAL,
+    missing INTEGER NOT NULL DEFAULT 0,
+    copied_path TEXT,
+    rendered INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS presets_path ON presets (full_path);
+CREATE INDEX IF NOT EXISTS presets_cleaned_name ON presets (cleaned_name);
+CREATE INDEX IF NOT EXISTS presets_actual_name ON presets (actual_name);
+CREATE INDEX IF NOT EXISTS presets_rendered ON presets (rendered, osc_count, preset_style);
+"""
+
+# below this many changed files, parsing in the calling process is faster than starting a pool
+MIN_PARALLEL_FILES = 64
+
+
+def oscillator_count(data):
+    # Check for Vital's oscillator keys, if value = 1.0
+    osc_keys = ['osc_1_on', 'osc_2_on', 'osc_3_on']
+    settings = data.get("settings", {})
+    count = sum(1 for k in osc_keys if k in settings and settings[k] == 1.0)
+    return count if count > 0 else 1
+
 
 # Helper to count oscillators in a Vital preset file
 # Assumes .vital is a JSON (if not, will skip file)
@@ -11,62 +60,11 @@ def count_oscillators(vital_path):
     try:
         with open(vital_path, 'r') as f:
             data = json.load(f)
-        # Check for Vital's oscillator keys, if value = 1.0
-        osc_keys = ['osc_1_on', 'osc_2_on', 'osc_3_on']
-        count = 0
-        settings = data.get("settings", {})
-        for k in osc_keys:
-            if k in settings and settings[k] == 1.0:
-                count += 1
-                #print(f"Found oscillator: {k}, count: {count}")
-        return count if count > 0 else 1
+        return oscillator_count(data)
     except Exception as e:
         print(f"Could not parse {vital_path}: {e}")
         return None
 
-def import_vital_presets_flat(src_dir, dest_dir, map_path=PRESET_MAP_PATH):
-    """
-    Recursively copy all .vital files from src_dir to neural-synth-modeler/data/vital_presets/has_x_osc.
-    While copying, use the idx-cleaned_name from the preset map for filenames.
-    """
-    # Load the preset map
-    if os.path.exists(map_path):
-        with open(map_path, 'r') as f:
-            preset_map = json.load(f)
-    else:
-        print(f"Preset map not found at {map_path}. Run build_and_save_preset_map first.")
-        return
-
-    count = 0
-    for idx, entry in preset_map.items():
-        src_file = entry['full_path']
-        cleaned_name = entry['cleaned_name']
-        # Count oscillators
-        osc_count = count_oscillators(src_file)
-        if osc_count is None:
-            print(f"Skipping {src_file} (could not determine oscillator count)")
-            continue
-        if osc_count == 1:
-            osc_folder = 'has_1_osc'
-        elif osc_count == 2:
-            osc_folder = 'has_2_osc'
-        elif osc_count == 3:
-            osc_folder = 'has_3_osc'
-        else:
-            osc_folder = f'has_{osc_count}_osc'
-        dest_subdir = os.path.join(dest_dir, osc_folder)
-        os.makedirs(dest_subdir, exist_ok=True)
-        dest_file = os.path.join(dest_subdir, cleaned_name)
-        # If the string-transformed filename is already present, skip copying
-        if os.path.exists(dest_file):
-            print(f"Skipping {src_file} (already exists as {dest_file})")
-            continue
-        shutil.copy2(src_file, dest_file)
-        print(f"Copied: {src_file} -> {dest_file}")
-        count += 1
-    print(f"Total .vital files copied: {count}")
-
-
 def clean_name(filename):
     # Remove spaces, replace with '-', lowercase, and remove trailing '-' and '.'
     name = filename.replace(' ', '-').lower()
@@ -74,84 +72,298 @@ def clean_name(filename):
     name = name.rstrip('-.')
     return name
 
-def build_and_save_preset_map(src_dir, map_path=PRESET_MAP_PATH):
+
+def strip_index(filename):
     """
-    Scans the vital presets in src_dir, checks if they are present in the map, and if not, adds them to the end of the existing map and renames the preset. Existing entries are preserved as-is. Only new presets are renamed and added at the end. The map is not rebuilt every time.
+    original filename of a preset renamed to "{idx}-{filename}"
     """
-    # Load existing map if it exists
-    if os.path.exists(map_path):
+    match = re.match(r"(\d+)-(.*)", filename)
+    return match.group(2) if match else filename
+
+
+def osc_folder(osc_count):
+    return f'has_{osc_count}_osc'
+
+
+def iter_preset_files(src_dir):
+    """
+    (path, size, mtime) of every .vital file under src_dir, from the directory entries (no extra stat call)
+    """
+    stack = [src_dir]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.vital') and entry.is_file():
+                    st = entry.stat()
+                    yield entry.path, st.st_size, st.st_mtime
+
+
+def parse_preset(path):
+    """
+    content hash, oscillator count and preset style of a preset file, which is read once
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    info = {'path': path, 'content_hash': hashlib.sha256(raw).hexdigest(), 'osc_count': None, 'preset_style': ""}
+    try:
+        data = json.loads(raw)
+        if isinstance(data, dict):
+            info['osc_count'] = oscillator_count(data)
+            info['preset_style'] = data.get('preset_style', "") or ""
+    except ValueError as e:
+        print(f"Could not parse {path}: {e}")
+    return info
+
+
+class PresetCatalog:
+    def __init__(self, db_path=CATALOG_PATH, map_path=None):
+        """
+        map_path: a preset map JSON imported into a new catalog, so existing preset indices are kept
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+            empty = db.execute("SELECT COUNT(*) FROM presets").fetchone()[0] == 0
+        if empty and map_path is not None and os.path.exists(map_path):
+            self.import_map(map_path)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            yield db
+        finally:
+            db.close()
+
+    def import_map(self, map_path):
+        """
+        rows of a preset map JSON. their content hash is filled in by the next scan
+        """
         with open(map_path, 'r') as f:
             preset_map = json.load(f)
-    else:
-        preset_map = {}
-
-    # Build a reverse lookup: original filename (without idx prefix) -> idx
-    filename_to_idx = {}
-    for idx, entry in preset_map.items():
-        actual_name = entry['actual_name']
-        match = re.match(r"(\d+)-(.*)", actual_name)
-        if match:
-            orig_filename = match.group(2)
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany(
+                "INSERT OR IGNORE INTO presets (idx, actual_name, cleaned_name, full_path, preset_style) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(int(idx), e['actual_name'], e['cleaned_name'], e['full_path'], e.get('preset_style', ""))
+                 for idx, e in preset_map.items()])
+            db.execute("COMMIT")
+        return len(preset_map)
+
+    def scan(self, src_dir, workers=None, rename=True):
+        """
+        adds new presets under src_dir, and updates moved or modified ones. only files whose size or mtime
+        changed are hashed and parsed, by `workers` processes. with rename=True new preset files are renamed
+        to "{idx}-{filename}" as in the preset map. returns counts of what changed.
+        """
+        prefix = os.path.join(src_dir, '')
+        with self._connect() as db:
+            known = {r['full_path']: (r['size'], r['mtime']) for r in db.execute(
+                "SELECT full_path, size, mtime FROM presets WHERE substr(full_path, 1, length(?)) = ?",
+                (prefix, prefix))}
+
+        files = {path: (size, mtime) for path, size, mtime in iter_preset_files(src_dir)}
+        changed = sorted(path for path, stat in files.items() if known.get(path) != stat)
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(changed) >= MIN_PARALLEL_FILES:
+            with multiprocessing.get_context("spawn").Pool(workers) as pool:
+                parsed = pool.map(parse_preset, changed, chunksize=16)
         else:
-            orig_filename = actual_name
-        filename_to_idx[orig_filename] = idx
-
-    # Find the max idx used
-    max_idx = max([int(idx) for idx in preset_map.keys()] or [0])
-    updated = False
-    # Scan files
-    for root, dirs, files in os.walk(src_dir):
-        for file in files:
-            if file.endswith('.vital'):
-                # Remove idx prefix if present
-                match = re.match(r"(\d+)-(.*)", file)
-                if match:
-                    orig_filename = match.group(2)
+            parsed = [parse_preset(path) for path in changed]
+
+        stats = {'files': len(files), 'parsed': len(parsed), 'added': 0, 'moved': 0, 'updated': 0,
+                 'duplicates': 0, 'missing': 0}
+        renames, scanned_hashes = [], set()
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            for info in parsed:
+                path = info['path']
+                if info['content_hash'] in scanned_hashes:
+                    print(f"Skipping {path} (same content as another new preset)")
+                    stats['duplicates'] += 1
+                    continue
+                scanned_hashes.add(info['content_hash'])
+                size, mtime = files[path]
+                values = (info['content_hash'], info['preset_style'], info['osc_count'], size, mtime)
+                by_hash = db.execute("SELECT idx, full_path FROM presets WHERE content_hash = ?",
+                                     (info['content_hash'],)).fetchone()
+                by_path = db.execute("SELECT idx FROM presets WHERE full_path = ?", (path,)).fetchone()
+                if by_path is not None and (by_hash is None or by_hash['idx'] == by_path['idx']):
+                    # modified in place, or a preset of the imported map seen for the first time
+                    db.execute("UPDATE presets SET content_hash = ?, preset_style = ?, osc_count = ?, size = ?, "
+                               "mtime = ?, missing = 0 WHERE idx = ?", values + (by_path['idx'],))
+                    stats['updated'] += 1
+                elif by_hash is not None and not os.path.exists(by_hash['full_path']):
+                    # moved or renamed: keeps its index
+                    db.execute("UPDATE presets SET full_path = ?, size = ?, mtime = ?, missing = 0 WHERE idx = ?",
+                               (path, size, mtime, by_hash['idx']))
+                    stats['moved'] += 1
+                elif by_hash is not None:
+                    print(f"Skipping {path} (same content as {by_hash['full_path']})")
+                    stats['duplicates'] += 1
                 else:
-                    orig_filename = file
-                cleaned = clean_name(orig_filename)
-                # Only add if not already in map
-                if orig_filename not in filename_to_idx:
-                    max_idx += 1
-                    idx = str(max_idx)
-                    actual_name_with_idx = f"{idx}-{orig_filename}"
-                    cleaned_with_idx = f"{idx}-{cleaned}"
-                    old_full_path = os.path.join(root, file)
-                    new_full_path = os.path.join(root, actual_name_with_idx)
-                    # Rename the file if not already renamed
-                    if file != actual_name_with_idx:
-                        try:
-                            os.rename(old_full_path, new_full_path)
-                            print(f"Renamed {old_full_path} -> {new_full_path}")
-                        except Exception as e:
-                            print(f"Could not rename {old_full_path} to {new_full_path}: {e}")
-                    else:
-                        new_full_path = old_full_path
-                    # Try to extract preset_style from the .vital file (assumed JSON)
-                    preset_style = ""
-                    try:
-                        with open(new_full_path, 'r') as f:
-                            data = json.load(f)
-                            if isinstance(data, dict):
-                                preset_style = data.get('preset_style', "")
-                    except Exception as e:
-                        print(f"Could not read preset_style from {new_full_path}: {e}")
-                    preset_map[idx] = {
-                        'actual_name': actual_name_with_idx,
-                        'cleaned_name': cleaned_with_idx,
-                        'full_path': new_full_path,
-                        'preset_style': preset_style
-                    }
-                    updated = True
-    # Save updated map only if changed
-    if updated:
-        with open(map_path, 'w') as f:
+                    filename = strip_index(os.path.basename(path))
+                    idx = db.execute("SELECT COALESCE(MAX(idx), 0) + 1 FROM presets").fetchone()[0]
+                    new_path = os.path.join(os.path.dirname(path), f"{idx}-{filename}") if rename else path
+                    db.execute("INSERT INTO presets (idx, content_hash, actual_name, cleaned_name, full_path, "
+                               "preset_style, osc_count, size, mtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                               (idx, info['content_hash'], f"{idx}-{filename}", f"{idx}-{clean_name(filename)}",
+                                new_path) + values[1:])
+                    if new_path != path:
+                        renames.append((path, new_path))
+                    stats['added'] += 1
+            # presets under src_dir that were not found are flagged missing, and unflagged once they are back
+            db.execute("CREATE TEMP TABLE seen (path TEXT PRIMARY KEY)")
+            db.executemany("INSERT OR IGNORE INTO seen VALUES (?)",
+                           [(path,) for path in files] + [(new,) for _, new in renames])
+            db.execute("UPDATE presets SET missing = (full_path NOT IN (SELECT path FROM seen)) "
+                       "WHERE substr(full_path, 1, length(?)) = ?", (prefix, prefix))
+            stats['missing'] = db.execute(
+                "SELECT COUNT(*) FROM presets WHERE missing = 1 AND substr(full_path, 1, length(?)) = ?",
+                (prefix, prefix)).fetchone()[0]
+            db.execute("COMMIT")
+
+        for old, new in renames:
+            try:
+                os.rename(old, new)
+            except OSError as e:
+                print(f"Could not rename {old} to {new}: {e}")
+        return stats
+
+    def entries(self, include_missing=False):
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM presets {} ORDER BY idx".format(
+                "" if include_missing else "WHERE missing = 0")).fetchall()
+        return [dict(r) for r in rows]
+
+    def get(self, idx):
+        with self._connect() as db:
+            row = db.execute("SELECT * FROM presets WHERE idx = ?", (int(idx),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def export_map(self, map_path=PRESET_MAP_PATH):
+        """
+        the preset map JSON ({idx: actual_name, cleaned_name, full_path, preset_style}) used by the render script
+        """
+        preset_map = {str(e['idx']): {k: e[k] for k in ('actual_name', 'cleaned_name', 'full_path', 'preset_style')}
+                      for e in self.entries()}
+        tmp = map_path + '.tmp'
+        with open(tmp, 'w') as f:
             json.dump(preset_map, f, indent=2)
-        print(f"Preset map updated with {len(preset_map)} entries saved to {map_path}")
-    else:
-        print(f"No new presets found. Preset map unchanged.")
+        os.replace(tmp, map_path)
+        return preset_map
+
+    def copy_flat(self, dest_dir, workers=8):
+        """
+        copies every preset to dest_dir/has_<n>_osc/<cleaned name>, with the oscillator count of the catalog.
+        copies run in a thread pool, presets already copied are skipped.
+        """
+        with self._connect() as db:
+            rows = [dict(r) for r in db.execute(
+                "SELECT idx, full_path, cleaned_name, osc_count FROM presets WHERE missing = 0 AND copied_path IS NULL")]
+
+        def copy(row):
+            if row['osc_count'] is None:
+                print(f"Skipping {row['full_path']} (could not determine oscillator count)")
+                return row['idx'], None
+            dest_subdir = os.path.join(dest_dir, osc_folder(row['osc_count']))
+            os.makedirs(dest_subdir, exist_ok=True)
+            dest_file = os.path.join(dest_subdir, row['cleaned_name'])
+            if not os.path.exists(dest_file):
+                shutil.copy2(row['full_path'], dest_file)
+            return row['idx'], dest_file
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            copied = [(dest, idx) for idx, dest in pool.map(copy, rows) if dest is not None]
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.executemany("UPDATE presets SET copied_path = ? WHERE idx = ?", copied)
+            db.execute("COMMIT")
+        return len(copied)
+
+    def set_rendered(self, idx, rendered=True):
+        with self._connect() as db:
+            db.execute("UPDATE presets SET rendered = ? WHERE idx = ?", (int(rendered), int(idx)))
+
+    def is_rendered(self, idx):
+        with self._connect() as db:
+            row = db.execute("SELECT rendered FROM presets WHERE idx = ?", (int(idx),)).fetchone()
+        return bool(row is not None and row['rendered'])
+
+    def sync_rendered(self, render_dir):
+        """
+        rendered status from the preset directories of render_dir ("{idx}-...", cleaned or actual name), read once
+        """
+        names = os.listdir(render_dir) if os.path.exists(render_dir) else []
+        indices = {int(m.group(1)) for m in (re.match(r"(\d+)(-|$)", name) for name in names) if m}
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("UPDATE presets SET rendered = 0")
+            db.executemany("UPDATE presets SET rendered = 1 WHERE idx = ?", [(i,) for i in indices])
+            db.executemany("UPDATE presets SET rendered = 1 WHERE cleaned_name = ? OR actual_name = ?",
+                           [(name, name) for name in names])
+            db.execute("COMMIT")
+
+    def unrendered(self, osc_count=None, preset_style=None):
+        query, args = "SELECT idx FROM presets WHERE rendered = 0 AND missing = 0", []
+        if osc_count is not None:
+            query, args = query + " AND osc_count = ?", args + [osc_count]
+        if preset_style is not None:
+            query, args = query + " AND preset_style = ?", args + [preset_style]
+        with self._connect() as db:
+            return [r['idx'] for r in db.execute(query + " ORDER BY idx", args)]
+
+    def unrendered_summary(self):
+        """
+        unrendered preset ids by oscillator count and normalised preset style, plus totals
+        """
+        categorized = {}
+        with self._connect() as db:
+            rows = db.execute("SELECT idx, osc_count, preset_style FROM presets "
+                              "WHERE rendered = 0 AND missing = 0 ORDER BY idx").fetchall()
+            total = db.execute("SELECT COUNT(*) FROM presets WHERE missing = 0").fetchone()[0]
+        for row in rows:
+            osc_key = 'unknown_osc' if row['osc_count'] is None else osc_folder(row['osc_count'])
+            # Normalize style: lowercase, strip, use 'unknown_style' if empty
+            style = row['preset_style'].strip().lower() or 'unknown_style'
+            categorized.setdefault(osc_key, {}).setdefault(style, []).append(str(row['idx']))
+        categorized['_summary'] = {
+            'total_unrendered': len(rows),
+            'total_rendered': total - len(rows),
+            'total_presets': total,
+        }
+        return categorized
+
+
+def build_and_save_preset_map(src_dir, map_path=PRESET_MAP_PATH, catalog_path=CATALOG_PATH, workers=None):
+    """
+    Scans the vital presets in src_dir into the catalog and exports the preset map. Existing entries keep their
+    index; only new presets are renamed to "{idx}-{filename}" and added at the end.
+    """
+    catalog = PresetCatalog(catalog_path, map_path=map_path)
+    stats = catalog.scan(src_dir, workers=workers)
+    print(f"Scanned {stats['files']} presets, parsed {stats['parsed']}: {stats['added']} added, "
+          f"{stats['moved']} moved, {stats['updated']} updated, {stats['missing']} missing")
+    preset_map = catalog.export_map(map_path)
+    print(f"Preset map with {len(preset_map)} entries saved to {map_path}")
     return preset_map
 
+
+def import_vital_presets_flat(src_dir, dest_dir, map_path=PRESET_MAP_PATH, catalog_path=CATALOG_PATH, workers=8):
+    """
+    Copy all cataloged .vital files to dest_dir/has_x_osc, named by the idx-cleaned_name of the preset map.
+    """
+    catalog = PresetCatalog(catalog_path, map_path=map_path)
+    count = catalog.copy_flat(dest_dir, workers=workers)
+    print(f"Total .vital files copied: {count}")
+    return count
+
 def select_preset_from_map(map_path=PRESET_MAP_PATH):
     """
     Load the preset map and prompt the user to select a preset by number.
@@ -171,11 +383,10 @@ def select_preset_from_map(map_path=PRESET_MAP_PATH):
         print("Invalid selection.")
         return None, None, None
 
-def check_unrendered_presets(map_path=PRESET_MAP_PATH, render_dir=None, output_path=None):
+def check_unrendered_presets(map_path=PRESET_MAP_PATH, render_dir=None, output_path=None, catalog_path=CATALOG_PATH):
     """
-    Checks which presets in the preset map have not been rendered yet (i.e., do not have a corresponding directory in data/vital_preset_audio).
-    Stores the list of remaining preset ids in preset_render_remaining_map.json, categorized by oscillator count and preset style.
-    Also checks that rendered + remaining = total presets in the map.
+    Syncs the rendered status of the catalog with the preset directories in render_dir, and writes the remaining
+    preset ids, categorized by oscillator count and preset style, to preset_render_remaining_map.json.
     """
     if render_dir is None:
         script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -184,74 +395,19 @@ def check_unrendered_presets(map_path=PRESET_MAP_PATH, render_dir=None, output_p
     if output_path is None:
         output_path = os.path.join(os.path.dirname(map_path), 'preset_render_remaining_map.json')
 
-    # Load preset map
-    with open(map_path, 'r') as f:
-        preset_map = json.load(f)
-    all_ids = set(preset_map.keys())
-
-    # Get all rendered preset directories (assume each subdir in render_dir is a rendered preset)
-    if os.path.exists(render_dir):
-        rendered_dirs = set(os.listdir(render_dir))
-    else:
-        rendered_dirs = set()
-
-    # Find which ids have been rendered (by matching preset_name or idx)
-    rendered_ids = set()
-    for idx, entry in preset_map.items():
-        cleaned_name = entry.get('cleaned_name', '')
-        actual_name = entry.get('actual_name', '')
-        if cleaned_name in rendered_dirs or actual_name in rendered_dirs or idx in rendered_dirs:
-            rendered_ids.add(idx)
-        else:
-            for d in rendered_dirs:
-                if d.startswith(f"{idx}-"):
-                    rendered_ids.add(idx)
-                    break
-    remaining_ids = sorted(list(all_ids - rendered_ids), key=lambda x: int(x))
-
-    # Categorize remaining by osc count and preset style
-    categorized = {}
-    for idx in remaining_ids:
-        entry = preset_map[idx]
-        src_file = entry['full_path']
-        osc_count = count_oscillators(src_file)
-        if osc_count is None:
-            osc_key = 'unknown_osc'
-        else:
-            osc_key = f'has_{osc_count}_osc'
-        # Normalize style: lowercase, strip, use 'unknown_style' if empty
-        preset_style = entry.get('preset_style', '')
-        preset_style = preset_style.strip().lower() if preset_style.strip() else 'unknown_style'
-        if osc_key not in categorized:
-            categorized[osc_key] = {}
-        if preset_style not in categorized[osc_key]:
-            categorized[osc_key][preset_style] = []
-        categorized[osc_key][preset_style].append(idx)
-
-    # Count total unrendered
-    total_unrendered = sum(len(ids) for osc in categorized.values() for ids in osc.values())
-    total_rendered = len(all_ids) - total_unrendered
-    summary = {
-        'total_unrendered': total_unrendered,
-        'total_rendered': total_rendered,
-        'total_presets': len(all_ids)
-    }
-    # Add summary as a key in the main output JSON
-    categorized['_summary'] = summary
+    catalog = PresetCatalog(catalog_path, map_path=map_path)
+    catalog.sync_rendered(render_dir)
+    categorized = catalog.unrendered_summary()
     with open(output_path, 'w') as f:
         json.dump(categorized, f, indent=2)
     print(f"Wrote categorized unrendered preset ids and summary to {output_path}")
-
-    # Consistency check
-    total = len(all_ids)
-    done = len(rendered_ids)
-    remaining = len(remaining_ids)
-    print(f"Total presets: {total}, Rendered: {done}, Remaining: {remaining}")
-    if done + remaining != total:
-        print("WARNING: Rendered + Remaining does not equal total presets! Check for naming mismatches or orphaned directories.")
+    summary = categorized['_summary']
+    print(f"Total presets: {summary['total_presets']}, Rendered: {summary['total_rendered']}, "
+          f"Remaining: {summary['total_unrendered']}")
+    return categorized
 
 if __name__ == "__main__":
-    source_vital_dir = "/Users/sayantanm/Music/Vital"  
+    source_vital_dir = "/Users/sayantanm/Music/Vital"
     script_dir = os.path.dirname(os.path.realpath(__file__))
     project_root = os.path.abspath(os.path.join(script_dir, '../../..'))
     dest_dir = os.path.join(project_root, 'neural-synth-modeler', 'data', 'vital_presets')
@@ -263,4 +419,4 @@ if __name__ == "__main__":
     import_vital_presets_flat(source_vital_dir, dest_dir, PRESET_MAP_PATH)
 
     # Check which presets have not been rendered yet and write remaining IDs to file
-    check_unrendered_presets(PRESET_MAP_PATH)
\ No newline at end of file
+    check_unrendered_presets(PRESET_MAP_PATH)
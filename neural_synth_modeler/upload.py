@@ -0,0 +1,172 @@
+"""
+Binary / multipart audio upload for the BentoML service, mounted next to the base64 `predict` API.
+
+    curl -X POST -H "Content-Type: audio/wav" --data-binary @clip.wav "http://localhost:3000/audio/predict?eval_level=off"
+    curl -X POST -F audio=@clip.flac "http://localhost:3000/audio/predict?synth=dexed"
+
+Raw bodies are streamed into a spooled buffer (memory, spilling to disk when large) and rejected as soon
+as the body size or the duration declared in the audio header exceeds the limits, before the rest is read.
+Multipart bodies are parsed from the same capped stream, so a chunked upload without Content-Length is limited too.
+The buffer is decoded block-wise into the float32 array used by preprocessing, no intermediate file is written.
+"""
+import logging
+import os
+import tempfile
+
+import soundfile as sf
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+
+from neural_synth_modeler.main import SERVED_SYNTHS, infer_params, temp_output_fname
+from neural_synth_modeler.metrics import observe_timings, track_request
+from neural_synth_modeler.utils.audio import AudioTooLongError, check_duration
+from neural_synth_modeler.utils.tracing import format_server_timing
+
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_DURATION_SECS = 30
+HEADER_BYTES = 64 * 1024            # enough for the WAV / FLAC headers
+SPOOL_BYTES = 4 * 1024 * 1024       # larger bodies spill to a temp file
+AUDIO_CONTENT_TYPES = ["audio/wav", "audio/x-wav", "audio/wave", "audio/flac", "audio/x-flac", "audio/ogg",
+                       "application/octet-stream"]
+
+
+class UploadError(Exception):
+    def __init__(self, status_code, detail):
+        Exception.__init__(self, detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def read_body(request):
+    """
+    streams a raw audio body into a spooled file, checking size and declared duration as it arrives
+    """
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    size, head, checked = 0, b"", False
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_UPLOAD_BYTES:
+            raise UploadError(413, "Upload larger than {} bytes".format(MAX_UPLOAD_BYTES))
+        body.write(chunk)
+        if not checked:
+            head += chunk
+            if len(head) >= HEADER_BYTES:
+                check_duration(head, MAX_DURATION_SECS)
+                checked = True
+    if not checked:
+        check_duration(head, MAX_DURATION_SECS)
+    body.seek(0)
+    return body
+
+
+def capped_receive(receive, max_bytes):
+    """
+    ASGI receive that fails with 413 once more than max_bytes of body have arrived
+    """
+    size = 0
+
+    async def wrapped():
+        nonlocal size
+        message = await receive()
+        if message["type"] == "http.request":
+            size += len(message.get("body", b""))
+            if size > max_bytes:
+                raise UploadError(413, "Upload larger than {} bytes".format(max_bytes))
+        return message
+    return wrapped
+
+
+async def read_multipart(request):
+    form = await Request(request.scope, capped_receive(request.receive, MAX_UPLOAD_BYTES)).form()
+    upload = form.get("audio")
+    if not isinstance(upload, UploadFile):
+        raise UploadError(400, "Expected the audio file in the `audio` form field")
+    body = upload.file
+    body.seek(0)
+    check_duration(body.read(HEADER_BYTES), MAX_DURATION_SECS)
+    body.seek(0)
+    return body
+
+
+def check_decodable(body):
+    """
+    opens the complete upload once, for the formats whose duration is only known from the whole stream (OGG)
+    """
+    try:
+        with sf.SoundFile(body) as f:
+            duration = f.frames / f.samplerate
+    except RuntimeError as e:
+        raise UploadError(415, "Unsupported or corrupt audio: {}".format(e))
+    finally:
+        body.seek(0)
+    if duration > MAX_DURATION_SECS:
+        raise AudioTooLongError("Audio is {:.1f}s, longer than the {}s limit".format(duration, MAX_DURATION_SECS))
+
+
+def run_inference(body, synth_name, eval_level, pitch_backend):
+    output_fname, eval_dict = infer_params(body, synth_name, enable_eval=eval_level, pitch_backend=pitch_backend,
+                                           output_fname=temp_output_fname(synth_name))
+    try:
+        with open(output_fname, "rb") as f:
+            return f.read(), eval_dict
+    finally:
+        os.unlink(output_fname)
+
+
+async def predict_audio(request):
+    synth_name = request.query_params.get("synth", "vital")
+    if synth_name not in SERVED_SYNTHS:
+        return PlainTextResponse("Synth {} is not served, available: {}".format(synth_name, SERVED_SYNTHS),
+                                 status_code=400)
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        if not content_length.isdigit():
+            return PlainTextResponse("Invalid Content-Length {}".format(content_length), status_code=400)
+        if int(content_length) > MAX_UPLOAD_BYTES:
+            return PlainTextResponse("Upload larger than {} bytes".format(MAX_UPLOAD_BYTES), status_code=413)
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if content_type == "multipart/form-data":
+            body = await read_multipart(request)
+        elif content_type in AUDIO_CONTENT_TYPES:
+            body = await read_body(request)
+        else:
+            return PlainTextResponse("Unsupported content type {}".format(content_type), status_code=415)
+        check_decodable(body)
+    except AudioTooLongError as e:
+        return PlainTextResponse(str(e), status_code=413)
+    except UploadError as e:
+        return PlainTextResponse(e.detail, status_code=e.status_code)
+
+    try:
+        with track_request(synth_name):
+            output_data, eval_dict = await run_in_threadpool(
+                run_inference, body, synth_name,
+                request.query_params.get("eval_level", "loss"),
+                request.query_params.get("pitch_backend"),
+            )
+    except AudioTooLongError as e:
+        # within the upload limit, but longer than the synth converts (4s for Dexed)
+        return PlainTextResponse(str(e), status_code=413)
+    except ValueError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    except Exception:
+        logging.exception("Error during model inference")
+        return PlainTextResponse("Inference failed", status_code=500)
+    finally:
+        body.close()
+
+    observe_timings(synth_name, eval_dict["timings"])
+    return Response(
+        output_data,
+        media_type="application/octet-stream",
+        headers={"Server-Timing": format_server_timing(eval_dict["timings"]["stages"])},
+    )
+
+
+upload_app = Starlette(routes=[Route("/predict", predict_audio, methods=["POST"])])
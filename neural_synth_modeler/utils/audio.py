@@ -0,0 +1,208 @@
+"""
+Audio loading shared by all inferencers.
+
+Files are decoded with soundfile (PCM / float WAV through a memory map), without resampling when they are
+already at the model rate. Otherwise the resampler set by `audio.resampler` in vital/config.yaml is used:
+"polyphase" (scipy polyphase filter, filter designed once per rate pair) or any librosa `res_type`
+("kaiser_best" is librosa 0.9's default).
+"""
+import functools
+import io
+import os
+import struct
+from math import gcd
+import librosa
+import numpy as np
+import scipy.signal
+import soundfile as sf
+import yaml
+from neural_synth_modeler.utils.tracing import annotate, trace
+
+with open(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "../inferencer/vital/config.yaml"
+    ), 'r'
+) as stream:
+    config = yaml.safe_load(stream)
+
+default_resampler = config["audio"]["resampler"]
+
+WAV_FORMAT_PCM = 1
+WAV_FORMAT_FLOAT = 3
+WAV_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class AudioTooLongError(ValueError):
+    pass
+
+
+def probe_duration(head):
+    """
+    duration in secs declared by the header of an encoded audio file, from its first bytes only.
+    returns None if the header does not declare it (e.g. OGG, streamed WAV).
+    """
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        byte_rate, pos = None, 12
+        while pos + 8 <= len(head):
+            chunk_id, chunk_size = head[pos:pos + 4], struct.unpack("<I", head[pos + 4:pos + 8])[0]
+            if chunk_id == b"fmt " and pos + 20 <= len(head):
+                byte_rate = struct.unpack("<I", head[pos + 16:pos + 20])[0]
+            elif chunk_id == b"data":
+                if byte_rate is None or chunk_size in (0, 0xFFFFFFFF):
+                    return None
+                return chunk_size / byte_rate
+            pos += 8 + chunk_size + (chunk_size & 1)
+        return None
+
+    if head[:4] == b"fLaC":
+        try:
+            with sf.SoundFile(io.BytesIO(head)) as f:
+                return f.frames / f.samplerate if f.frames > 0 else None
+        except RuntimeError:
+            return None
+    return None
+
+
+def check_duration(head, max_duration_secs):
+    duration = probe_duration(head)
+    if duration is not None and duration > max_duration_secs:
+        raise AudioTooLongError("Audio is {:.1f}s, longer than the {}s limit".format(duration, max_duration_secs))
+
+
+def downmix(frames, out=None):
+    """
+    [n_frames, n_channels] -> mono float32, written straight into `out`. a float32 mono input is returned as a view.
+    """
+    if frames.shape[1] == 1 and frames.dtype == np.float32 and out is None:
+        return frames[:, 0]
+    if out is None:
+        out = np.empty(len(frames), dtype=np.float32)
+    scale = 1.0 / frames.shape[1]
+    if frames.dtype == np.int16:
+        scale /= 32768.0
+    np.multiply(frames[:, 0], scale, out=out, casting="unsafe")
+    for channel in range(1, frames.shape[1]):
+        out += frames[:, channel] * scale
+    return out
+
+
+def wav_layout(head):
+    """
+    (format, n_channels, sampling rate, bits per sample, data offset, data size) of a WAV header, or None
+    """
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    fmt, pos = None, 12
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = head[pos:pos + 4], struct.unpack("<I", head[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt " and pos + 24 <= len(head):
+            fmt = struct.unpack("<HHIIHH", head[pos + 8:pos + 24])
+            if fmt[0] == WAV_FORMAT_EXTENSIBLE and pos + 34 <= len(head):
+                # the actual format is the first two bytes of the sub-format GUID
+                fmt = (struct.unpack("<H", head[pos + 32:pos + 34])[0],) + fmt[1:]
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            return fmt[0], fmt[1], fmt[2], fmt[5], pos + 8, chunk_size
+        pos += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def read_wav_memmap(fname):
+    """
+    memory-maps the samples of a 16-bit PCM or 32-bit float WAV as [n_frames, n_channels], or None for other files
+    """
+    with open(fname, "rb") as f:
+        head = f.read(4096)
+        file_size = f.seek(0, os.SEEK_END)
+    layout = wav_layout(head)
+    if layout is None:
+        return None
+    fmt, n_channels, sr, bits, offset, size = layout
+    if (fmt, bits) == (WAV_FORMAT_PCM, 16):
+        dtype = np.dtype("<i2")
+    elif (fmt, bits) == (WAV_FORMAT_FLOAT, 32):
+        dtype = np.dtype("<f4")
+    else:
+        return None
+    n_frames = min(size, file_size - offset) // (dtype.itemsize * n_channels)
+    if n_frames == 0:
+        return None
+    # copy-on-write, so callers modifying the signal in place never touch the file
+    frames = np.memmap(fname, dtype=dtype, mode="c", offset=offset, shape=(n_frames, n_channels))
+    return frames, sr
+
+
+def decode_audio(f, block_frames=65536):
+    """
+    decodes an audio file (path or file object) block by block straight into a preallocated mono float32 buffer
+    """
+    with sf.SoundFile(f) as audio:
+        y = np.empty(audio.frames, dtype=np.float32)
+        pos = 0
+        for block in audio.blocks(blocksize=block_frames, dtype="float32", always_2d=True):
+            downmix(block, out=y[pos:pos + len(block)])
+            pos += len(block)
+        return y[:pos], audio.samplerate
+
+
+def decode_file(fname):
+    wav = read_wav_memmap(fname)
+    if wav is not None:
+        frames, sr = wav
+        return downmix(frames), sr
+    try:
+        return decode_audio(fname)
+    except RuntimeError:
+        # formats libsndfile cannot read (e.g. mp3 on older builds) go through audioread
+        return librosa.load(fname, sr=None)
+
+
+@functools.lru_cache(maxsize=16)
+def polyphase_filter(up, down):
+    """
+    the anti-aliasing FIR `scipy.signal.resample_poly` would design for up / down, designed once
+    """
+    max_rate = max(up, down)
+    return scipy.signal.firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+
+
+def resample(y, orig_sr, target_sr, resampler=None):
+    if resampler is None:
+        resampler = default_resampler
+    if resampler != "polyphase":
+        return librosa.resample(y, orig_sr=orig_sr, target_sr=target_sr, res_type=resampler)
+    g = gcd(orig_sr, target_sr)
+    up, down = target_sr // g, orig_sr // g
+    return scipy.signal.resample_poly(y, up, down, window=polyphase_filter(up, down)).astype(np.float32, copy=False)
+
+
+def load_audio(fname, sampling_rate, resampler=None):
+    """
+    mono float32 signal at `sampling_rate`, like `librosa.load(fname, sr=sampling_rate)`, with decode and
+    resample traced as separate stages. `fname` can also be a file object, e.g. an uploaded body.
+    """
+    with trace("decode"):
+        if hasattr(fname, "read"):
+            y, native_sr = decode_audio(fname)
+        else:
+            y, native_sr = decode_file(fname)
+    annotate("audio_duration_secs", len(y) / native_sr)
+
+    if native_sr != sampling_rate:
+        with trace("resample"):
+            y = resample(y, native_sr, sampling_rate, resampler=resampler)
+
+    return y, sampling_rate
+
+
+def write_synthetic_audio(path, duration_secs, sr=44100, f0=220.0):
+    """
+    plucked sawtooth at 44.1kHz, so decode + resample are exercised as for a typical upload
+    """
+    t = np.arange(int(sr * duration_secs)) / sr
+    saw = 2 * (t * f0 - np.floor(0.5 + t * f0))
+    y = 0.5 * saw * np.exp(-2 * t)
+    sf.write(path, y.astype(np.float32), sr)
+    return path
@@ -0,0 +1,173 @@
+"""
+Training checkpoints: full training state written atomically in a background thread.
+
+    checkpoints = CheckpointManager("runs/wtsv2", keep_last=3)
+    state = checkpoints.load_latest()          # None on a fresh run
+    ...
+    checkpoints.save(trainer.state_dict(), epoch, val_loss)   # returns once the state is copied to host memory
+    checkpoints.wait()                         # before exiting
+
+Each checkpoint is written to a temporary file, fsynced and renamed, and `latest.json` is only updated afterwards,
+so a crash never leaves a truncated file behind as the latest one. The checkpoint with the lowest validation
+loss is kept as `best.pt`, with its model weights alone in `best_model.pt` (the format inferencers load).
+"""
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+
+logger = logging.getLogger(__name__)
+
+# torch >= 2.6 loads weights only by default, which rejects the optimizer / RNG state of a training checkpoint.
+# torch < 1.13 has no `weights_only` and would pass it on to the unpickler.
+_LOAD_KWARGS = {"weights_only": False} if "weights_only" in inspect.signature(torch.load).parameters else {}
+
+
+def load_state(path, map_location="cpu"):
+    return torch.load(path, map_location=map_location, **_LOAD_KWARGS)
+
+
+def to_cpu(obj):
+    """
+    copy of a (nested) state dict with every tensor copied to host memory, so training can go on modifying it
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def rng_state():
+    state = {"torch": torch.get_rng_state(), "numpy": np.random.get_state(), "python": random.getstate()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def atomic_save(obj, path):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def atomic_write_json(obj, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class CheckpointManager:
+    def __init__(self, directory, keep_last=3, asynchronous=True):
+        self.directory = directory
+        self.keep_last = keep_last
+        self.asynchronous = asynchronous
+        os.makedirs(directory, exist_ok=True)
+        self.meta = self.read_meta()
+        # one save in flight at a time, a second one waits: bounds the host memory held by snapshots
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = None
+        self._error = None
+
+    def read_meta(self):
+        path = os.path.join(self.directory, "latest.json")
+        if not os.path.exists(path):
+            return {"latest": None, "checkpoints": [], "best": None, "best_loss": None}
+        with open(path) as f:
+            return json.load(f)
+
+    def load_latest(self, map_location="cpu"):
+        if self.meta["latest"] is None:
+            return None
+        return load_state(os.path.join(self.directory, self.meta["latest"]), map_location)
+
+    def load_best(self, map_location="cpu"):
+        if self.meta["best"] is None:
+            return None
+        return load_state(os.path.join(self.directory, "best.pt"), map_location)
+
+    def save(self, state, epoch, val_loss=None):
+        """
+        `state`: dict with the model weights under "model". copied to host memory here, written in the background.
+        """
+        if self._error is not None:
+            raise RuntimeError("A previous checkpoint could not be written") from self._error
+        job = (to_cpu(state), epoch, val_loss)
+        if not self.asynchronous:
+            self.write(*job)
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.work, name="checkpoint-writer", daemon=True)
+            self._thread.start()
+        self._queue.put(job)
+
+    def work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                self.write(*job)
+            except Exception as e:
+                logger.exception("Writing checkpoint failed")
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def write(self, state, epoch, val_loss):
+        name = "checkpoint_{:06d}.pt".format(epoch)
+        atomic_save(state, os.path.join(self.directory, name))
+
+        meta = dict(self.meta)
+        meta["checkpoints"] = [c for c in meta["checkpoints"] if c != name] + [name]
+        meta["latest"] = name
+        if val_loss is not None and (meta["best_loss"] is None or val_loss < meta["best_loss"]):
+            atomic_save(state, os.path.join(self.directory, "best.pt"))
+            atomic_save(state["model"], os.path.join(self.directory, "best_model.pt"))
+            meta["best"], meta["best_loss"] = name, val_loss
+        stale = meta["checkpoints"][:-self.keep_last] if self.keep_last else []
+        meta["checkpoints"] = meta["checkpoints"][len(stale):]
+        atomic_write_json(meta, os.path.join(self.directory, "latest.json"))
+        self.meta = meta
+
+        for old in stale:
+            os.remove(os.path.join(self.directory, old))
+        logger.info("Saved %s (val loss %s)", name, val_loss)
+
+    def wait(self):
+        """
+        blocks until every pending checkpoint is on disk
+        """
+        if self._thread is not None:
+            self._queue.join()
+        if self._error is not None:
+            raise RuntimeError("A checkpoint could not be written") from self._error
+
+    def close(self):
+        self.wait()
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,112 @@
+"""
+Data-parallel training on the CPU cores of one machine, with the gloo backend.
+
+    def main(rank, world_size, config):
+        init(rank, world_size)
+        loader = DataLoader(dataset, batch_size, sampler=shard_sampler(dataset, shuffle=True))
+        trainer = Trainer(model, loader, ...)      # wraps the model in DistributedDataParallel
+        ...
+        cleanup()
+
+    launch(main, world_size, config)
+
+Each rank is a process with `cpu_count // world_size` intra-op threads, trains on its own slice of the dataset,
+and gradients are all-reduced (averaged) in the backward pass. Only the main process (rank 0) logs and writes
+checkpoints. With world_size 1 everything runs in the calling process, without a process group.
+"""
+import os
+import socket
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
+
+
+def is_distributed():
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process():
+    return get_rank() == 0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def init(rank, world_size, backend="gloo"):
+    """
+    joins the process group. MASTER_ADDR / MASTER_PORT are set by `launch`, or by the environment (torchrun).
+    """
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    if world_size == 1:
+        return
+    os.environ.setdefault("MASTER_ADDR", "127.0.0.1")
+    os.environ.setdefault("MASTER_PORT", "29500")
+    dist.init_process_group(backend, rank=rank, world_size=world_size)
+
+
+def cleanup():
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def launch(fn, world_size, *args):
+    """
+    runs fn(rank, world_size, *args) in `world_size` processes
+    """
+    if world_size == 1:
+        return fn(0, 1, *args)
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(free_port())
+    mp.spawn(fn, args=(world_size,) + args, nprocs=world_size, join=True)
+
+
+def wrap_model(model, find_unused_parameters=False):
+    """
+    DistributedDataParallel model when a process group is running, the model itself otherwise.
+    find_unused_parameters is needed when some trainable parameters take no part in the loss.
+    """
+    if not is_distributed():
+        return model
+    return DistributedDataParallel(model, find_unused_parameters=find_unused_parameters)
+
+
+def shard_sampler(dataset, shuffle=True, seed=0):
+    """
+    sampler over this rank's share of `dataset`, the same number of samples on every rank.
+    shard datasets (`shard_starts`, e.g. VitalFeatureShardDataset) keep the shard-local shuffle of ShardShuffleSampler.
+    """
+    if shuffle and hasattr(dataset, "shard_starts"):
+        from neural_synth_modeler.train.vital.datasets import ShardShuffleSampler
+        return ShardShuffleSampler(dataset, seed=seed, num_replicas=get_world_size(), rank=get_rank())
+    return DistributedSampler(dataset, num_replicas=get_world_size(), rank=get_rank(), shuffle=shuffle, seed=seed,
+                              drop_last=True)
+
+
+def all_reduce_mean(value):
+    """
+    mean of a python number over all ranks
+    """
+    if not is_distributed() or value is None:
+        return value
+    t = torch.tensor(float(value), dtype=torch.float64)
+    dist.all_reduce(t)
+    return t.item() / get_world_size()
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
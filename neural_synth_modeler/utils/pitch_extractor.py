@@ -1,11 +1,15 @@
 """
 [WIP] Common class for pitch extraction across all synthesizers.
+
+Pitch trackers are registered in `PITCH_BACKENDS` and selected by name, either per call
+(`extract_pitch(..., backend="yin")`) or per deployment (`pitch.backend` in vital/config.yaml).
 """
 
 import numpy as np
 import os
-from torchcrepeV2 import ONNXTorchCrepePredictor
-import yaml 
+import librosa
+import yaml
+from neural_synth_modeler.utils.tracing import annotate, trace
 
 with open(
     os.path.join(
@@ -15,25 +19,153 @@ with open(
 ) as stream:
     config = yaml.safe_load(stream)
 
+default_backend = config["pitch"]["backend"]
+fmin = config["pitch"]["fmin"]
+fmax = config["pitch"]["fmax"]
 
-crepe_predictor = ONNXTorchCrepePredictor()
+# CREPE models are only loaded on first use, so deployments on a cheaper backend never pay for them
+_crepe_predictor = None
 
 
-def extract_pitch(signal, sampling_rate, block_size, model_capacity="full"):
-    length = signal.shape[-1] // block_size
-    f0 = crepe_predictor.predict(
-        audio=signal, 
-        sr=sampling_rate, 
-        viterbi=True, 
-        center=True, 
+def get_crepe_predictor():
+    global _crepe_predictor
+    if _crepe_predictor is None:
+        from torchcrepeV2 import ONNXTorchCrepePredictor
+        _crepe_predictor = ONNXTorchCrepePredictor()
+    return _crepe_predictor
+
+
+def fill_unvoiced(f0):
+    """
+    replace unvoiced (0 / nan) frames with the nearest voiced pitch.
+    downstream code divides by pitch (e.g. `infer_wavetables`), so f0 must stay positive.
+    """
+    f0 = np.asarray(f0, dtype=np.float64)
+    voiced = np.isfinite(f0) & (f0 > 0)
+    if not voiced.any():
+        return np.full(f0.shape, float(fmin))
+    idx = np.arange(len(f0))
+    return np.interp(idx, idx[voiced], f0[voiced])
+
+
+def crepe_full_pitch(signal, sampling_rate, block_size):
+    return get_crepe_predictor().predict(
+        audio=signal,
+        sr=sampling_rate,
+        viterbi=True,
+        center=True,
         step_size=int(1000 * block_size / sampling_rate),
     )
 
-    if f0.shape[-1] != length:
-        f0 = np.interp(
-            np.linspace(0, 1, length, endpoint=False),
-            np.linspace(0, 1, f0.shape[-1], endpoint=False),
-            f0,
-        )
 
-    return f0
\ No newline at end of file
+def crepe_tiny_pitch(signal, sampling_rate, block_size):
+    import torch
+    import torchcrepe
+
+    f0 = torchcrepe.predict(
+        torch.tensor(signal, dtype=torch.float32).unsqueeze(0),
+        sampling_rate,
+        hop_length=block_size,
+        fmin=fmin,
+        fmax=fmax,
+        model="tiny",
+        decoder=torchcrepe.decode.viterbi,
+        batch_size=512,
+        device="cpu",
+        pad=True,
+    )
+    return f0.squeeze(0).numpy()
+
+
+def yin_pitch(signal, sampling_rate, block_size):
+    return librosa.yin(
+        signal,
+        fmin=fmin,
+        fmax=fmax,
+        sr=sampling_rate,
+        frame_length=1024,
+        hop_length=block_size,
+        center=True,
+    )
+
+
+def pyin_pitch(signal, sampling_rate, block_size):
+    f0, _, _ = librosa.pyin(
+        signal,
+        fmin=fmin,
+        fmax=fmax,
+        sr=sampling_rate,
+        frame_length=1024,
+        hop_length=block_size,
+        center=True,
+    )
+    return fill_unvoiced(f0)
+
+
+def autocorr_pitch(signal, sampling_rate, block_size, frame_length=1024, threshold=0.3):
+    """
+    cheap normalized-autocorrelation tracker: one batched rfft over all frames,
+    peak pick within [sr / fmax, sr / fmin] lags, parabolic interpolation for sub-sample lag.
+    """
+    x = np.pad(np.asarray(signal, dtype=np.float32), frame_length // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(x, frame_length)[::block_size]
+    frames = frames - frames.mean(axis=1, keepdims=True)
+
+    spectrum = np.fft.rfft(frames, n=2 * frame_length, axis=1)
+    acf = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, axis=1)[:, :frame_length]
+    energy = acf[:, :1]
+    # unbiased normalization, otherwise long lags (low notes) are penalized
+    acf = acf / np.maximum(energy, 1e-10) * frame_length / (frame_length - np.arange(frame_length))
+
+    # only search past the first zero crossing, so the main lobe around lag 0 is never picked
+    min_lag = max(int(sampling_rate / fmax), 1)
+    max_lag = min(int(sampling_rate / fmin), frame_length - 2)
+    first_dip = np.argmax(acf < 0, axis=1)[:, None]
+    lags = np.arange(min_lag, max_lag + 1)
+    search = np.where(lags[None, :] >= first_dip, acf[:, min_lag:max_lag + 1], -np.inf)
+
+    # take the first local maximum close to the global one, later peaks are subharmonics
+    is_peak = (acf[:, lags] >= acf[:, lags - 1]) & (acf[:, lags] >= acf[:, lags + 1])
+    candidates = is_peak & (search >= 0.9 * search.max(axis=1, keepdims=True))
+    lag = np.where(candidates.any(axis=1), np.argmax(candidates, axis=1), np.argmax(search, axis=1)) + min_lag
+    peak = acf[np.arange(len(lag)), lag]
+
+    # parabolic interpolation around the peak
+    left = acf[np.arange(len(lag)), lag - 1]
+    right = acf[np.arange(len(lag)), lag + 1]
+    denom = left - 2 * peak + right
+    shift = np.divide(0.5 * (left - right), denom, out=np.zeros_like(denom), where=np.abs(denom) > 1e-10)
+    f0 = sampling_rate / (lag + np.clip(shift, -0.5, 0.5))
+
+    f0[(peak < threshold) | (energy[:, 0] < 1e-8)] = 0
+    return fill_unvoiced(f0)
+
+
+PITCH_BACKENDS = {
+    "crepe_full": crepe_full_pitch,
+    "crepe_tiny": crepe_tiny_pitch,
+    "yin": yin_pitch,
+    "pyin": pyin_pitch,
+    "autocorr": autocorr_pitch,
+}
+
+
+def extract_pitch(signal, sampling_rate, block_size, backend=None):
+    if backend is None:
+        backend = default_backend
+    if backend not in PITCH_BACKENDS:
+        raise ValueError("Pitch backend {} not available, choose from {}".format(backend, list(PITCH_BACKENDS)))
+
+    length = signal.shape[-1] // block_size
+    annotate("pitch_backend", backend)
+    with trace("pitch"):
+        f0 = PITCH_BACKENDS[backend](signal, sampling_rate, block_size)
+
+        if f0.shape[-1] != length:
+            f0 = np.interp(
+                np.linspace(0, 1, length, endpoint=False),
+                np.linspace(0, 1, f0.shape[-1], endpoint=False),
+                f0,
+            )
+
+    return f0
@@ -0,0 +1,148 @@
+"""
+Lightweight per-request stage tracing.
+
+`trace(name)` can be dropped anywhere in the pipeline: it records a named span on the `Tracer`
+that is active for the current request, and does nothing when no tracer is active.
+A tracer can optionally capture a `torch.profiler` profile, with every span showing up as a
+`record_function` block in it.
+`annotate(key, value)` attaches request attributes (e.g. input audio duration) to the active tracer the same way.
+Spans nest: a span opened inside another one is recorded as its child, and stages report self time (a span's
+duration minus its children's), so nested stages such as `adsr` inside `model_forward` are not counted twice.
+"""
+import contextvars
+import datetime
+import json
+import logging
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+_active_tracer = contextvars.ContextVar("active_tracer", default=None)
+# (tracer, span index) of the innermost open span
+_open_span = contextvars.ContextVar("open_span", default=None)
+
+
+class Tracer:
+    def __init__(self, name="request", profile=False, profile_dir=None):
+        """
+        profile: capture a torch.profiler CPU profile for the whole trace
+        profile_dir: if set, the profile is also exported there as a chrome trace
+        """
+        self.name = name
+        self.spans = []             # [name, start offset secs, duration secs, parent span index or None]
+        self.attributes = {}
+        self.total = None
+        self.profile = profile
+        self.profile_dir = profile_dir
+        self.profiler = None
+        self._start = None
+        self._token = None
+
+    def __enter__(self):
+        if self.profile:
+            import torch
+            self.profiler = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self.profiler.__enter__()
+        self._token = _active_tracer.set(self)
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.total = perf_counter() - self._start
+        _active_tracer.reset(self._token)
+        if self.profiler is not None:
+            self.profiler.__exit__(exc_type, exc_value, tb)
+            if self.profile_dir is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                self.profiler.export_chrome_trace(
+                    os.path.join(self.profile_dir, "{}_{}.json".format(
+                        self.name, datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")))
+                )
+        return False
+
+    def open(self, name, start, parent=None):
+        """
+        starts a span, its duration is set by `close`. returns the span index
+        """
+        self.spans.append([name, start - self._start, None, parent])
+        return len(self.spans) - 1
+
+    def close(self, idx, end):
+        self.spans[idx][2] = end - self._start - self.spans[idx][1]
+
+    def stages(self):
+        """
+        self seconds per stage name (time not spent in a child span), in first-seen order.
+        a stage can run several times, e.g. per batch item, so the stages sum up to the traced time.
+        """
+        stages = {}
+        for name, _, duration, _ in self.spans:
+            stages[name] = stages.get(name, 0.0) + (duration or 0.0)
+        for _, _, duration, parent in self.spans:
+            if parent is not None:
+                stages[self.spans[parent][0]] -= duration or 0.0
+        return stages
+
+    def as_dict(self):
+        return {
+            "total": self.total,
+            "stages": self.stages(),
+            "attributes": dict(self.attributes),
+        }
+
+    def server_timing(self):
+        return format_server_timing(self.stages())
+
+    def profile_table(self, row_limit=25):
+        if self.profiler is None:
+            return None
+        return self.profiler.key_averages().table(sort_by="cpu_time_total", row_limit=row_limit)
+
+    def log(self, **fields):
+        record = {"event": "trace", "name": self.name}
+        record.update(fields)
+        record.update(self.as_dict())
+        logger.info(json.dumps(record))
+
+
+def format_server_timing(stages):
+    """
+    {stage: secs} formatted as a `Server-Timing` HTTP header value, e.g. "pitch;dur=812.40, mfcc;dur=35.12"
+    """
+    return ", ".join("{};dur={:.2f}".format(name, secs * 1000) for name, secs in stages.items())
+
+
+def current_tracer():
+    return _active_tracer.get()
+
+
+def annotate(key, value):
+    tracer = _active_tracer.get()
+    if tracer is not None:
+        tracer.attributes[key] = value
+
+
+@contextmanager
+def trace(name):
+    tracer = _active_tracer.get()
+    if tracer is None:
+        yield
+        return
+
+    record_function = None
+    if tracer.profiler is not None:
+        import torch
+        record_function = torch.profiler.record_function(name)
+        record_function.__enter__()
+    open_span = _open_span.get()
+    idx = tracer.open(name, perf_counter(), parent=open_span[1] if open_span and open_span[0] is tracer else None)
+    token = _open_span.set((tracer, idx))
+    try:
+        yield
+    finally:
+        tracer.close(idx, perf_counter())
+        _open_span.reset(token)
+        if record_function is not None:
+            record_function.__exit__(None, None, None)
@@ -0,0 +1,67 @@
+import json
+import os
+import random
+import numpy as np
+import pytest
+import torch
+import yaml
+from neural_synth_modeler.benchmark.loader_benchmark import write_synthetic_dataset
+from neural_synth_modeler.train.vital.datasets import VitalFeatureShardDataset, pack_features
+from neural_synth_modeler.train.vital.trainer import Trainer, build_model, make_loader
+from neural_synth_modeler.utils.checkpoint import CheckpointManager, rng_state, set_rng_state
+
+with open("neural_synth_modeler/inferencer/vital/config.yaml") as f:
+    config = yaml.safe_load(f)
+
+
+def test_keep_last_and_best(tmp_path):
+    checkpoints = CheckpointManager(tmp_path, keep_last=2)
+    weights = torch.zeros(3)
+    for epoch, loss in enumerate([3.0, 1.0, 2.0, 4.0], start=1):
+        weights += 1
+        checkpoints.save({"model": {"w": weights}, "epoch": epoch}, epoch, loss)
+    checkpoints.close()
+
+    assert sorted(f for f in os.listdir(tmp_path) if f.startswith("checkpoint_")) == \
+        ["checkpoint_000003.pt", "checkpoint_000004.pt"]
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+    with open(tmp_path / "latest.json") as f:
+        meta = json.load(f)
+    assert meta["latest"] == "checkpoint_000004.pt" and meta["best_loss"] == 1.0
+
+    # snapshots are copies: later in-place updates do not leak into saved checkpoints
+    reopened = CheckpointManager(tmp_path)
+    assert reopened.load_latest()["model"]["w"].tolist() == [4.0] * 3
+    assert reopened.load_best()["epoch"] == 2
+    assert torch.load(tmp_path / "best_model.pt")["w"].tolist() == [2.0] * 3
+
+
+def test_rng_state_roundtrip():
+    state = rng_state()
+    expected = torch.rand(2), np.random.rand(), random.random()
+    set_rng_state(state)
+    assert torch.equal(torch.rand(2), expected[0])
+    assert np.random.rand() == expected[1] and random.random() == expected[2]
+
+
+def test_resume_training(tmp_path):
+    write_synthetic_dataset(tmp_path / "audio", tmp_path / "params", 4)
+    pack_features(tmp_path / "audio", tmp_path / "params", tmp_path / "shards")
+    dataset = VitalFeatureShardDataset(tmp_path / "shards")
+
+    torch.manual_seed(0)
+    trainer = Trainer(build_model(config, "cpu"), make_loader(dataset, 2, shuffle=True), make_loader(dataset, 2),
+                      train_config=config["train"])
+    history = trainer.fit(1, checkpoints=CheckpointManager(tmp_path / "ckpt"))
+    assert len(history) == 1
+
+    resumed = Trainer(build_model(config, "cpu"), make_loader(dataset, 2, shuffle=True), make_loader(dataset, 2),
+                      train_config=config["train"])
+    assert resumed.resume(CheckpointManager(tmp_path / "ckpt"))
+    assert (resumed.epoch, resumed.step) == (trainer.epoch, trainer.step)
+    for a, b in zip(trainer.model.state_dict().values(), resumed.model.state_dict().values()):
+        assert torch.equal(a, b)
+
+    # fit counts the epochs already done
+    assert len(resumed.fit(2, checkpoints=CheckpointManager(tmp_path / "ckpt"))) == 1
+    assert CheckpointManager(tmp_path / "ckpt").meta["latest"] == "checkpoint_000002.pt"
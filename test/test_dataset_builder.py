@@ -0,0 +1,68 @@
+import json
+import numpy as np
+import soundfile as sf
+from neural_synth_modeler.inferencer.dexed.models.ddx7.data_utils.h5_dataset import h5Dataset
+from neural_synth_modeler.inferencer.dexed.models.preprocessor import ProcessData
+
+
+def make_processor():
+    return ProcessData(
+        silence_thresh_dB=40, sr=16000, device="cpu", seq_len=0.25,
+        crepe_params={"model": "tiny", "confidence_threshold": 0.0, "batch_size": 128, "fmin": 50, "fmax": 2000},
+        loudness_params={"nfft": 2048}, rms_params={"frame_size": 2048}, hop_size=64, max_len=0.5, center=False
+    )
+
+
+def test_run_on_dirs_resumes(tmp_path):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    (input_dir / "flute").mkdir(parents=True)
+    t = np.arange(8000) / 16000
+    for i in range(3):
+        sf.write(input_dir / "flute" / f"{i}.wav", 0.5 * np.sin(2 * np.pi * (220 + 50 * i) * t), 16000)
+
+    report = make_processor().run_on_dirs(input_dir, output_dir, num_workers=2, shard_size=1)
+    assert report["files"] == 3 and report["blocks"] == 3
+    manifest = json.loads((output_dir / "manifest.json").read_text())
+    assert len(manifest["shards"]) == 3 and sum(manifest["shards"].values()) == 3
+    dataset = h5Dataset(16000, output_dir / "flute" / "16000_0000.h5", ["audio", "f0", "loudness", "rms"])
+    assert len(dataset) == 1 and dataset[0]["audio"].shape == (8000, 1)
+
+    # interrupted run: last shard lost before the manifest was saved, another one half-written
+    last_shard = manifest["files"].pop("flute/2.wav")
+    del manifest["shards"][last_shard]
+    (output_dir / "manifest.json").write_text(json.dumps(manifest))
+    (output_dir / "flute" / "16000_0003.h5.tmp").write_bytes(b"partial")
+
+    report = make_processor().run_on_dirs(input_dir, output_dir, num_workers=1, shard_size=1)
+    assert report["files"] == 1
+    manifest = json.loads((output_dir / "manifest.json").read_text())
+    assert sorted(manifest["files"]) == ["flute/0.wav", "flute/1.wav", "flute/2.wav"]
+    assert sorted(p.name for p in (output_dir / "flute").iterdir()) == ["16000_0000.h5", "16000_0001.h5", "16000_0002.h5"]
+
+
+def test_train_on_run_on_dirs_shards(tmp_path):
+    """
+    train_ddx7 reads the shard directory written by run_on_dirs as one dataset
+    """
+    from neural_synth_modeler.train.dexed.train_ddx7 import load_dataset
+    from neural_synth_modeler.train.dexed.trainer import DDX7Trainer, build_model, load_recipe, make_loader
+    from neural_synth_modeler.utils.checkpoint import CheckpointManager
+
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    for folder in ["flute", "violin"]:
+        (input_dir / folder).mkdir(parents=True)
+        t = np.arange(8000) / 16000
+        for i in range(2):
+            sf.write(input_dir / folder / f"{i}.wav", 0.5 * np.sin(2 * np.pi * (220 + 50 * i) * t), 16000)
+    make_processor().run_on_dirs(input_dir, output_dir, num_workers=1, shard_size=1)
+
+    dataset = load_dataset(str(output_dir), 16000)
+    assert len(dataset) == 4 and list(dataset.shard_starts) == [0, 1, 2, 3, 4]
+    assert len(load_dataset(str(output_dir / "manifest.json"), 16000)) == 4
+
+    checkpoints = CheckpointManager(tmp_path / "ckpt")
+    trainer = DDX7Trainer(build_model(load_recipe("model", "tcnres_f0ld_fmstr_noreverb")),
+                          make_loader(dataset, 2, shuffle=True))
+    trainer.fit(1, checkpoints=checkpoints)
+    checkpoints.close()
+    assert checkpoints.load_latest()["step"] == 2
@@ -0,0 +1,33 @@
+import librosa
+import numpy as np
+import pytest
+import scipy.signal
+import soundfile as sf
+from neural_synth_modeler.utils.audio import decode_file, load_audio, read_wav_memmap, resample
+
+
+@pytest.mark.parametrize("subtype,channels", [("PCM_16", 1), ("PCM_16", 2), ("FLOAT", 1), ("PCM_24", 2)])
+def test_decode_matches_librosa(tmp_path, subtype, channels):
+    fname = str(tmp_path / "clip.wav")
+    y = np.random.RandomState(0).uniform(-0.5, 0.5, (22050, channels)).astype(np.float32)
+    sf.write(fname, y, 22050, subtype=subtype)
+    decoded, sr = decode_file(fname)
+    expected, _ = librosa.load(fname, sr=None)
+    assert sr == 22050 and decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, expected, atol=1e-7)
+    # only 16-bit PCM and float WAVs are memory-mapped, the rest goes through soundfile
+    assert (read_wav_memmap(fname) is None) == (subtype == "PCM_24")
+
+
+def test_no_resample_at_model_rate(tmp_path):
+    fname = str(tmp_path / "clip.wav")
+    sf.write(fname, np.zeros(16000, dtype=np.float32), 16000, subtype="FLOAT")
+    y, sr = load_audio(fname, 16000)
+    assert sr == 16000 and isinstance(y, np.memmap)
+
+
+def test_polyphase_resample_matches_scipy():
+    y = np.random.RandomState(0).randn(44100).astype(np.float32)
+    resampled = resample(y, 44100, 16000, resampler="polyphase")
+    assert resampled.dtype == np.float32 and len(resampled) == 16000
+    np.testing.assert_allclose(resampled, scipy.signal.resample_poly(y, 160, 441), atol=1e-5)
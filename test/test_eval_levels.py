@@ -0,0 +1,66 @@
+import os
+import pytest
+import torch
+from neural_synth_modeler.inferencer.inferencer import get_eval_level
+from neural_synth_modeler.inferencer.vital.models.preprocessor import preprocess
+from neural_synth_modeler.inferencer.vital.vital_inferencer import VitalInferencer, VitalInferenceInput
+from neural_synth_modeler.inferencer.dexed import dexed_inferencer
+from neural_synth_modeler.inferencer.dexed.dexed_inferencer import DexedInferencer
+
+DEXED_CHECKPOINT = os.path.join(os.path.dirname(dexed_inferencer.__file__), DexedInferencer.checkpoint)
+
+
+def vital_input():
+    inference_input = VitalInferenceInput()
+    (inference_input.y, inference_input.pitch, inference_input.loudness,
+     inference_input.times, inference_input.onset_frames, inference_input.mfcc) = preprocess(
+        "test/test_audio/vital_test_synth_1.wav", 16000, 160, signal_length=64000, pitch_backend="yin")
+    return inference_input
+
+
+def test_eval_levels():
+    torch.manual_seed(0)
+    inferencer = VitalInferencer(device="cpu")
+    model = inferencer.build_model("cpu")
+    model.eval()
+
+    outputs = {level: inferencer.inference(model, vital_input(), "cpu", enable_eval=level)
+               for level in ["off", "loss", "full"]}
+
+    assert outputs["off"].eval_dict == {"loss": -1}
+    assert outputs["loss"].eval_dict["loss"] > 0 and "output" not in outputs["loss"].eval_dict
+    assert outputs["full"].eval_dict["loss"] > 0 and outputs["full"].eval_dict["output"].shape == (64000,)
+    # skipping synthesis must not change the preset
+    for key in ["attack", "decay", "sustain"]:
+        assert getattr(outputs["off"], key) == pytest.approx(getattr(outputs["full"], key))
+    assert (outputs["off"].wt_output == outputs["full"].wt_output).all()
+
+
+def test_eval_level_from_bool():
+    assert get_eval_level(True) == "full"
+    assert get_eval_level(False) == "off"
+    with pytest.raises(ValueError):
+        get_eval_level("fast")
+    with pytest.raises(ValueError):
+        get_eval_level("loss", supported=["off"])
+    assert get_eval_level(False, supported=["off"]) == "off"
+
+
+
+def test_dexed_eval_levels():
+    inferencer = DexedInferencer(device="cpu")
+    inference_input = inferencer.preprocess("test/test_audio/dexed_test_audio_1.wav", pitch_backend="yin")
+    model = inferencer.get_model(DEXED_CHECKPOINT, "cpu")
+
+    outputs = {level: inferencer.inference(model, inference_input, "cpu", enable_eval=level)
+               for level in ["off", "loss", "full"]}
+    assert outputs["off"].eval_dict == {"loss": -1}
+    assert outputs["loss"].eval_dict["loss"] > 0 and "output" not in outputs["loss"].eval_dict
+    assert outputs["full"].eval_dict["loss"] > 0 and outputs["full"].eval_dict["output"].shape == (64000,)
+
+
+def test_exported_runtime_rejects_eval():
+    from neural_synth_modeler.inferencer.vital.vital_inferencer import VitalTorchScriptInferencer
+
+    with pytest.raises(ValueError):
+        VitalTorchScriptInferencer(device="cpu").inference(None, vital_input(), "cpu", enable_eval="loss")
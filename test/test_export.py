@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+import torch
+from neural_synth_modeler.inferencer.inferencer import _model_cache, cached_model_bytes
+from neural_synth_modeler.inferencer.vital.models.export import example_inputs, export_onnx, export_torchscript
+from neural_synth_modeler.inferencer.vital.models.preprocessor import preprocess
+from neural_synth_modeler.inferencer.vital.vital_inferencer import (
+    VitalInferencer, VitalInferenceInput, VitalOnnxInferencer, VitalTorchScriptInferencer
+)
+
+
+def vital_input():
+    inference_input = VitalInferenceInput()
+    (inference_input.y, inference_input.pitch, inference_input.loudness,
+     inference_input.times, inference_input.onset_frames, inference_input.mfcc) = preprocess(
+        "test/test_audio/vital_test_synth_1.wav", 16000, 160, signal_length=64000, pitch_backend="yin")
+    return inference_input
+
+
+def assert_same_output(expected, actual):
+    np.testing.assert_allclose(actual.wt_output, expected.wt_output, atol=1e-6)
+    np.testing.assert_allclose(actual.attention_output, expected.attention_output, atol=1e-5)
+    for key in ["attack", "decay", "sustain"]:
+        assert getattr(actual, key) == pytest.approx(getattr(expected, key), abs=1e-5)
+
+
+@pytest.fixture(scope="module")
+def eager_model():
+    torch.manual_seed(0)
+    inferencer = VitalInferencer(device="cpu")
+    model = inferencer.build_model("cpu")
+    model.eval()
+    return model
+
+
+def test_torchscript_parity(eager_model, tmp_path):
+    fname = export_torchscript(eager_model, str(tmp_path / "model.ts.pt"), example_inputs())
+    expected = VitalInferencer(device="cpu").inference(eager_model, vital_input(), "cpu")
+
+    inferencer = VitalTorchScriptInferencer(device="cpu")
+    actual = inferencer.inference(inferencer.load_model(fname, "cpu"), vital_input(), "cpu")
+    assert_same_output(expected, actual)
+
+
+def test_onnx_parity(eager_model, tmp_path):
+    pytest.importorskip("onnxruntime")
+    fname = export_onnx(eager_model, str(tmp_path / "model.onnx"), example_inputs())
+    expected = VitalInferencer(device="cpu").inference(eager_model, vital_input(), "cpu")
+
+    inferencer = VitalOnnxInferencer(device="cpu")
+    actual = inferencer.inference(inferencer.load_model(fname, "cpu"), vital_input(), "cpu")
+    assert_same_output(expected, actual)
+
+
+def test_onnx_model_bytes(tmp_path):
+    """
+    an onnxruntime session has no parameters, its memory is the size of the model file
+    """
+    fname = tmp_path / "model.onnx"
+    fname.write_bytes(b"\0" * 4096)
+    key = (VitalOnnxInferencer.__name__, str(fname), "cpu")
+    _model_cache[key] = object()
+    try:
+        assert cached_model_bytes(VitalOnnxInferencer) == 4096
+    finally:
+        del _model_cache[key]
@@ -0,0 +1,55 @@
+import h5py
+import numpy as np
+import pytest
+import torch
+from torch.utils.data import DataLoader
+from neural_synth_modeler.inferencer.dexed.models.ddx7.data_utils.h5_dataset import (
+    convert_to_rows, h5Dataset, h5RowDataset
+)
+
+KEYS = ['audio', 'f0', 'loudness', 'rms']
+
+
+@pytest.fixture
+def legacy_h5(tmp_path):
+    path = tmp_path / "16000.h5"
+    rng = np.random.RandomState(0)
+    with h5py.File(path, 'w') as h5f:
+        for counter in range(5):
+            h5f.create_dataset(f'{counter}_audio', data=rng.randn(1024).astype(np.float32))
+            for k in KEYS[1:]:
+                h5f.create_dataset(f'{counter}_{k}', data=rng.randn(16).astype(np.float32))
+    return path
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_row_layout_matches_legacy(tmp_path, legacy_h5, compression):
+    rows = tmp_path / "rows.h5"
+    assert convert_to_rows(legacy_h5, rows, compression=compression) == 5
+
+    legacy = h5Dataset(16000, legacy_h5, KEYS)
+    dataset = h5RowDataset(16000, rows, KEYS)
+    assert len(dataset) == len(legacy)
+    for i in range(len(dataset)):
+        item, expected = dataset[i], legacy[i]
+        for k in KEYS:
+            assert torch.equal(item[k], expected[k])
+
+
+def test_rows_are_memory_mapped(tmp_path, legacy_h5):
+    rows = tmp_path / "rows.h5"
+    convert_to_rows(legacy_h5, rows)
+    dataset = h5RowDataset(16000, rows, KEYS)
+    dataset[0]
+    assert isinstance(dataset._features['audio'], np.memmap)
+    with pytest.raises(ValueError):
+        h5RowDataset(16000, legacy_h5, KEYS)
+
+
+def test_rows_with_workers(tmp_path, legacy_h5):
+    rows = tmp_path / "rows.h5"
+    convert_to_rows(legacy_h5, rows)
+    loader = DataLoader(h5RowDataset(16000, rows, KEYS), batch_size=2, num_workers=2)
+    batches = list(loader)
+    assert sum(len(b['audio']) for b in batches) == 5
+    assert batches[0]['f0'].shape == (2, 16, 1)
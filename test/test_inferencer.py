@@ -1,20 +1,44 @@
 import os
 import glob
 from neural_synth_modeler import infer_params
+from neural_synth_modeler.main import _synth_slots, synth_slot, warm_up
 
 
-# def test_dexed_inferencer():
-#     """
-#     just check if everything runs well for Dexed
-#     """
-#     output_params_file, eval_dict = infer_params(
-#         "test/test_audio/dexed_test_audio_1.wav", 
-#         "dexed", 
-#         enable_eval=True
-#     )
-#     assert os.path.exists(output_params_file)
+def test_dexed_inferencer():
+    """
+    just check if everything runs well for Dexed
+    """
+    output_params_file, eval_dict = infer_params(
+        "test/test_audio/dexed_test_audio_1.wav", 
+        "dexed", 
+        pitch_backend="yin"
+    )
+    assert output_params_file.endswith(".syx")
+    assert os.path.getsize(output_params_file) > 0
 
-#     os.remove(output_params_file)
+    os.remove(output_params_file)
+
+
+def test_dexed_warm_up():
+    """
+    the served dexed warms up on its own default pitch backend, not the multi-GB crepe_full
+    """
+    report = warm_up("dexed")
+    assert report["pitch_backend"] == "autocorr"
+    assert report["duration_secs"] > 0
+    assert report["model_memory_mb"] > 0
+
+
+def test_synth_slots_are_separate():
+    """
+    a busy dexed slot must not block vital requests
+    """
+    with synth_slot("dexed"):
+        assert not _synth_slots["dexed"].acquire(blocking=False)
+        assert _synth_slots["vital"].acquire(blocking=False)
+        _synth_slots["vital"].release()
+    assert _synth_slots["dexed"].acquire(blocking=False)
+    _synth_slots["dexed"].release()
 
 
 def test_vital_inferencer_1():
@@ -31,4 +55,12 @@ def test_vital_inferencer_1():
         )
         assert os.path.exists(output_params_file)
         assert eval_dict["loss"] < loss_lst[i]
-        os.remove(output_params_file)
\ No newline at end of file
+        os.remove(output_params_file)
+
+def test_vital_warm_up():
+    """
+    warm-up should leave the model cached with its memory reported
+    """
+    report = warm_up("vital")
+    assert report["duration_secs"] > 0
+    assert report["model_memory_mb"] > 0
@@ -0,0 +1,25 @@
+import pytest
+import torch
+from neural_synth_modeler.inferencer.vital.models.core import interpolate_frames
+
+
+@pytest.mark.parametrize("in_frames", [7, 126, 400, 401, 1000])
+def test_interpolate_frames_matches_bilinear_resize(in_frames):
+    """
+    should match the bilinear image resize of the (frames, features) plane it replaces
+    """
+    x = torch.randn(2, in_frames, 16)
+    expected = torch.nn.functional.interpolate(
+        x.unsqueeze(0), size=(400, 16), mode="bilinear", align_corners=False
+    ).squeeze(0)
+    torch.testing.assert_close(interpolate_frames(x, 400), expected, atol=1e-4, rtol=0)
+
+
+def test_interpolation_matrix_cached_under_trace():
+    from neural_synth_modeler.inferencer.vital.models.core import frame_interpolation_matrix
+
+    frame_interpolation_matrix.cache_clear()
+    for _ in range(2):
+        traced = torch.jit.trace(lambda x: interpolate_frames(x, 400), torch.randn(1, 126, 16))
+    torch.testing.assert_close(traced(torch.ones(1, 126, 16)), torch.ones(1, 400, 16))
+    assert frame_interpolation_matrix.cache_info().currsize == 1
@@ -0,0 +1,73 @@
+import os
+import zipfile
+import pytest
+from neural_synth_modeler import jobs
+from neural_synth_modeler.jobs import JobNotFound, JobQueue
+
+
+@pytest.fixture
+def fake_infer(monkeypatch):
+    def infer_params(input_audio_name, synth_name, output_fname=None, **kwargs):
+        if input_audio_name.endswith("broken.wav"):
+            raise RuntimeError("corrupt audio")
+        with open(output_fname, "w") as f:
+            f.write(os.path.basename(input_audio_name))
+        return output_fname, {"timings": {"total": 0.1, "stages": {}, "attributes": {}}}
+    monkeypatch.setattr(jobs, "infer_params", infer_params)
+
+
+def run_queued(queue):
+    while True:
+        job = queue.claim()
+        if job is None:
+            return
+        queue.run_job(job)
+
+
+def test_batch_job(tmp_path, fake_infer):
+    queue = JobQueue(str(tmp_path))
+    job_id = queue.submit([("a.wav", b"a"), ("broken.wav", b"b"), ("c.wav", b"c")], "vital")
+    assert queue.status(job_id)["status"] == "queued"
+    with pytest.raises(ValueError):
+        queue.result(job_id)
+
+    run_queued(queue)
+    status = queue.status(job_id)
+    assert status["status"] == "done"
+    assert [item["status"] for item in status["items"]] == ["done", "failed", "done"]
+    with zipfile.ZipFile(queue.result(job_id)) as zf:
+        assert sorted(zf.namelist()) == ["a.vital", "c.vital"]
+
+    assert queue.purge(older_than_secs=0) == 1
+    with pytest.raises(JobNotFound):
+        queue.status(job_id)
+
+
+def test_running_jobs_requeued_on_restart(tmp_path, fake_infer):
+    queue = JobQueue(str(tmp_path))
+    job_id = queue.submit([("a.wav", b"a")], "vital")
+    queue.claim()
+    assert queue.status(job_id)["status"] == "running"
+
+    queue = JobQueue(str(tmp_path), workers=1, poll_interval=0.01)
+    assert queue.status(job_id)["status"] == "queued"
+    queue.start()
+    try:
+        for _ in range(500):
+            if queue.status(job_id)["status"] == "done":
+                break
+            queue._stop.wait(0.01)
+    finally:
+        queue.stop()
+    with open(queue.result(job_id)) as f:
+        assert f.read() == "0_a.wav"
+
+
+def test_submit_validation(tmp_path):
+    queue = JobQueue(str(tmp_path))
+    with pytest.raises(ValueError):
+        queue.submit([("a.wav", b"a")], "serum")
+    with pytest.raises(ValueError):
+        queue.submit([], "vital")
+    with pytest.raises(ValueError):
+        queue.submit([("a.wav", b"a")], "vital", enable_eval="fast")
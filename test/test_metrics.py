@@ -0,0 +1,40 @@
+from prometheus_client import REGISTRY
+from neural_synth_modeler.inferencer.inferencer import Inferencer
+from neural_synth_modeler.metrics import observe_timings
+from neural_synth_modeler.utils.tracing import Tracer, annotate, trace
+
+
+class CountingInferencer(Inferencer):
+    loads = 0
+
+    def load_model(self, model_pt_fname, device="cuda"):
+        CountingInferencer.loads += 1
+        return object()
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_request_metrics_from_timings():
+    before = {
+        "stage": sample("nsm_stage_duration_seconds_count", synth="test", stage="model_load"),
+        "hit": sample("nsm_model_cache_total", synth="test", result="hit"),
+        "miss": sample("nsm_model_cache_total", synth="test", result="miss"),
+        "audio": sample("nsm_input_audio_duration_seconds_sum", synth="test"),
+    }
+
+    inferencer = CountingInferencer(device="cpu")
+    for _ in range(2):
+        with Tracer("test") as tracer:
+            annotate("audio_duration_secs", 4.0)
+            model = inferencer.get_model("test.pt", "cpu")
+            with trace("model_forward"):
+                pass
+        observe_timings("test", tracer.as_dict())
+
+    assert CountingInferencer.loads == 1
+    assert sample("nsm_stage_duration_seconds_count", synth="test", stage="model_load") == before["stage"] + 1
+    assert sample("nsm_model_cache_total", synth="test", result="hit") == before["hit"] + 1
+    assert sample("nsm_model_cache_total", synth="test", result="miss") == before["miss"] + 1
+    assert sample("nsm_input_audio_duration_seconds_sum", synth="test") == before["audio"] + 8.0
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+from neural_synth_modeler.utils.pitch_extractor import extract_pitch
+
+
+@pytest.mark.parametrize("backend", ["yin", "autocorr"])
+def test_fast_pitch_backends(backend):
+    """
+    cheap backends should track a steady tone to within a few cents
+    """
+    sr, block_size = 16000, 160
+    y = np.sin(2 * np.pi * 220.0 * np.arange(sr * 2) / sr).astype(np.float32)
+    f0 = extract_pitch(y, sr, block_size, backend=backend)
+
+    assert f0.shape == (len(y) // block_size,)
+    assert (f0 > 0).all()
+    cents = np.abs(1200 * np.log2(f0[5:-5] / 220.0))
+    assert np.median(cents) < 10
+
+
+def test_unknown_pitch_backend():
+    with pytest.raises(ValueError):
+        extract_pitch(np.zeros(16000, dtype=np.float32), 16000, 160, backend="nope")
@@ -0,0 +1,76 @@
+import json
+import os
+from neural_synth_modeler.train.vital.vital_preprocessor import (
+    PresetCatalog, build_and_save_preset_map, check_unrendered_presets
+)
+
+
+def write_preset(path, n_osc, style="Lead", seed=0):
+    settings = {f"osc_{i}_on": 1.0 if i <= n_osc else 0.0 for i in range(1, 4)}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"preset_style": style, "settings": settings, "seed": seed}, f)
+
+
+def test_incremental_scan(tmp_path):
+    src = tmp_path / "src"
+    write_preset(str(src / "a" / "Big Saw.vital"), 2, seed=1)
+    write_preset(str(src / "b" / "Soft Pad.vital"), 1, style="Pad", seed=2)
+    catalog = PresetCatalog(str(tmp_path / "catalog.sqlite"))
+
+    stats = catalog.scan(str(src), workers=1)
+    assert (stats["added"], stats["parsed"]) == (2, 2)
+    entries = {e["actual_name"]: e for e in catalog.entries()}
+    assert entries["1-Big Saw.vital"]["cleaned_name"] == "1-big-saw.vital"
+    assert entries["1-Big Saw.vital"]["osc_count"] == 2
+    assert os.path.exists(src / "a" / "1-Big Saw.vital")
+
+    # nothing changed: nothing is parsed again
+    assert catalog.scan(str(src), workers=1)["parsed"] == 0
+
+    # a moved preset keeps its index, a deleted one is flagged missing
+    os.rename(src / "a" / "1-Big Saw.vital", src / "b" / "1-Big Saw.vital")
+    os.remove(src / "b" / "2-Soft Pad.vital")
+    stats = catalog.scan(str(src), workers=1)
+    assert (stats["moved"], stats["missing"]) == (1, 1)
+    assert catalog.get(1)["full_path"] == str(src / "b" / "1-Big Saw.vital")
+    assert [e["idx"] for e in catalog.entries()] == [1]
+
+
+def test_rendered_status_and_map(tmp_path):
+    src, render_dir = tmp_path / "src", tmp_path / "renders"
+    for i, n_osc in enumerate([1, 2, 2]):
+        write_preset(str(src / f"preset {i}.vital"), n_osc, seed=i)
+    map_path = str(tmp_path / "preset_map.json")
+    catalog_path = str(tmp_path / "catalog.sqlite")
+    preset_map = build_and_save_preset_map(str(src), map_path, catalog_path=catalog_path, workers=1)
+    assert sorted(preset_map) == ["1", "2", "3"]
+
+    os.makedirs(render_dir / preset_map["2"]["cleaned_name"])
+    remaining = check_unrendered_presets(map_path, render_dir=str(render_dir),
+                                         output_path=str(tmp_path / "remaining.json"), catalog_path=catalog_path)
+    assert remaining["_summary"] == {"total_unrendered": 2, "total_rendered": 1, "total_presets": 3}
+
+    catalog = PresetCatalog(catalog_path)
+    assert catalog.is_rendered(2) and not catalog.is_rendered(3)
+    catalog.set_rendered(3)
+    assert catalog.unrendered() == [1] and catalog.unrendered(osc_count=2) == []
+
+    assert catalog.copy_flat(str(tmp_path / "flat"), workers=2) == 3
+    assert sorted(os.listdir(tmp_path / "flat")) == ["has_1_osc", "has_2_osc"]
+    assert catalog.copy_flat(str(tmp_path / "flat")) == 0
+
+
+def test_import_existing_map(tmp_path):
+    src = tmp_path / "src"
+    write_preset(str(src / "7-Keys.vital"), 3)
+    map_path = str(tmp_path / "preset_map.json")
+    with open(map_path, "w") as f:
+        json.dump({"7": {"actual_name": "7-Keys.vital", "cleaned_name": "7-keys.vital",
+                         "full_path": str(src / "7-Keys.vital"), "preset_style": "Keys"}}, f)
+
+    catalog = PresetCatalog(str(tmp_path / "catalog.sqlite"), map_path=map_path)
+    assert catalog.scan(str(src), workers=1)["updated"] == 1
+    write_preset(str(src / "New.vital"), 1)
+    catalog.scan(str(src), workers=1)
+    assert [e["actual_name"] for e in catalog.entries()] == ["7-Keys.vital", "8-New.vital"]
@@ -0,0 +1,77 @@
+import os
+import shutil
+import numpy as np
+import torch
+from neural_synth_modeler.inferencer.preset_index import (PresetIndex, audio_embedding, build_dexed_index,
+                                                          load_index, nearest_template)
+from neural_synth_modeler.inferencer.dexed.bank_renderer import BankRenderer
+from neural_synth_modeler.inferencer.dexed.dexed_inferencer import DexedInferencer, DexedInferenceOutput
+
+BANK = os.path.join(os.path.dirname(__file__), "../neural_synth_modeler/inferencer/dexed/Dexed_01.syx")
+
+
+def test_ivf_search_matches_brute_force(tmp_path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(2000, 64)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    ids = [f"preset {i}" for i in range(len(embeddings))]
+    brute = PresetIndex.build(embeddings, ids, ids)
+    ivf = PresetIndex.build(embeddings, ids, ids, n_lists=16)
+    assert brute.centroids is None and ivf.offsets[-1] == len(embeddings)
+
+    queries = embeddings[:20] + 0.05 * rng.normal(size=(20, 64)).astype(np.float32)
+    for i, (b, v) in enumerate(zip(brute.search(queries, k=3), ivf.search(queries, k=3, n_probe=16))):
+        assert b[0][0] == f"preset {i}"
+        assert [r[0] for r in b] == [r[0] for r in v]
+        assert b[0][3] >= b[1][3] >= b[2][3]
+
+    ivf.save(str(tmp_path / "index.npz"))
+    loaded = load_index(str(tmp_path / "index.npz"))
+    assert load_index(str(tmp_path / "index.npz")) is loaded
+    assert loaded.search(queries[0], k=3, n_probe=16) == ivf.search(queries[0], k=3, n_probe=16)
+    assert load_index(str(tmp_path / "missing.npz")) is None
+
+
+def test_audio_embedding():
+    t = torch.arange(64000) / 16000
+    sine = torch.sin(2 * np.pi * 220 * t)
+    embedding = audio_embedding(torch.stack([sine, 0.1 * sine, torch.sin(2 * np.pi * 1760 * t)]))
+    assert embedding.shape == (3, 192)
+    np.testing.assert_allclose(np.linalg.norm(embedding, axis=1), 1, rtol=1e-5)
+    # gain does not change the embedding, pitch does
+    assert embedding[0] @ embedding[1] > 0.99 > embedding[0] @ embedding[2]
+
+
+def test_dexed_template(tmp_path):
+    index_path = str(tmp_path / "dexed.npz")
+    index = build_dexed_index([BANK], index_path)
+    assert len(index) == 32
+
+    audio, names = BankRenderer().render_bank(BANK)
+    template = nearest_template(index_path, audio[7].numpy())
+    assert template[0].endswith(":" + names[7]) and template[2] == 7 and template[3] > 0.99
+
+    inference_output = DexedInferenceOutput()
+    inference_output.ol = torch.full((1, 1000, 6), 0.1)
+    params = DexedInferencer(device="cpu").convert_to_preset(inference_output, template=template)
+    default = DexedInferencer(device="cpu").convert_to_preset(inference_output)
+    assert params[0]["ALG"] == params[7]["ALG"]
+    assert params[0]["0_FC"] == params[7]["0_FC"] and params[0]["0_OL"] == default[0]["0_OL"]
+    assert params[0]["NAME CHAR 1"] == 83
+
+
+def test_template_paths_relative_to_index(tmp_path):
+    """
+    an index moved with its banks keeps finding them, a missing bank falls back to the default template
+    """
+    os.makedirs(tmp_path / "lib" / "banks")
+    shutil.copy(BANK, tmp_path / "lib" / "banks" / "bank.syx")
+    build_dexed_index([str(tmp_path / "lib" / "banks" / "bank.syx")], str(tmp_path / "lib" / "dexed.npz"))
+    shutil.move(str(tmp_path / "lib"), str(tmp_path / "moved"))
+
+    audio = BankRenderer().render_bank(BANK)[0][3].numpy()
+    template = nearest_template(str(tmp_path / "moved" / "dexed.npz"), audio)
+    assert os.path.samefile(template[1], tmp_path / "moved" / "banks" / "bank.syx") and template[2] == 3
+
+    os.remove(tmp_path / "moved" / "banks" / "bank.syx")
+    assert nearest_template(str(tmp_path / "moved" / "dexed.npz"), audio) is None
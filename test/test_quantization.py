@@ -0,0 +1,29 @@
+import torch
+from neural_synth_modeler.inferencer.inferencer import model_bytes
+from neural_synth_modeler.inferencer.vital.models.preprocessor import preprocess
+from neural_synth_modeler.inferencer.vital.vital_inferencer import VitalInferencer, VitalInferenceInput, quantize_model
+
+
+def test_quantized_vital_close_to_fp32():
+    """
+    int8 Linear / GRU layers should only move the predicted controls slightly
+    """
+    torch.manual_seed(0)
+    inferencer = VitalInferencer(device="cpu")
+    model = inferencer.build_model("cpu")
+    model.eval()
+    quantized = quantize_model(model)
+    assert isinstance(quantized.gru_mfcc, torch.nn.quantized.dynamic.GRU)
+    # packed int8 weights are not parameters, but still count towards the model memory
+    assert sum(p.numel() for p in quantized.gru_mfcc.parameters()) == 0
+    assert model_bytes(model, None) / 4 < model_bytes(quantized, None) < model_bytes(model, None)
+
+    inference_input = VitalInferenceInput()
+    (inference_input.y, inference_input.pitch, inference_input.loudness,
+     inference_input.times, inference_input.onset_frames, inference_input.mfcc) = preprocess(
+        "test/test_audio/vital_test_synth_1.wav", 16000, 160, signal_length=64000, pitch_backend="yin")
+
+    fp32 = inferencer.inference(model, inference_input, "cpu")
+    int8 = inferencer.inference(quantized, inference_input, "cpu")
+    for key in ["attack", "decay", "sustain"]:
+        assert abs(getattr(int8, key) - getattr(fp32, key)) < 0.05
@@ -0,0 +1,46 @@
+import torch
+from neural_synth_modeler.inferencer.vital.models.core import MultiscaleSpectralLoss, multiscale_fft
+
+SCALES = [2048, 512, 128]
+
+
+def reference_loss(target, output, scales):
+    loss = 0
+    for s_x, s_y in zip(multiscale_fft(target, scales, 0.75), multiscale_fft(output, scales, 0.75)):
+        loss = loss + (s_x - s_y).abs().mean()
+    return loss
+
+
+def test_spectral_loss_matches_reference():
+    torch.manual_seed(0)
+    target = torch.randn(3, 16000)
+    output = torch.randn(3, 16000, requires_grad=True)
+    loss_fn = MultiscaleSpectralLoss(SCALES, 0.75)
+
+    expected = reference_loss(target, output, SCALES)
+    with torch.no_grad():
+        torch.testing.assert_close(loss_fn(target, output), expected)
+    loss = loss_fn(target, output)
+    torch.testing.assert_close(loss, expected)
+    loss.backward()
+    assert output.grad is not None
+
+    with torch.no_grad():
+        torch.testing.assert_close(loss_fn(target, output, scales=[512]), reference_loss(target, output, [512]))
+
+
+def test_dexed_loss_keeps_target_out_of_the_graph():
+    from neural_synth_modeler.inferencer.dexed.models.ddx7 import core
+    from neural_synth_modeler.inferencer.dexed.models.ddx7.loss_functions import ddsp_msfft_loss
+
+    torch.manual_seed(0)
+    target = torch.randn(2, 16000, 1)
+    output = torch.randn(2, 16000, 1, requires_grad=True)
+    expected = 0
+    for s_x, s_y in zip(core.multiscale_fft(target.squeeze(-1), SCALES, 0.75),
+                        core.multiscale_fft(output.squeeze(-1), SCALES, 0.75)):
+        expected = expected + (s_x - s_y).abs().mean() + (core.safe_log(s_x) - core.safe_log(s_y)).abs().mean()
+    loss = ddsp_msfft_loss(target, output, SCALES)
+    torch.testing.assert_close(loss, expected)
+    loss.backward()
+    assert output.grad is not None
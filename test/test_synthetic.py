@@ -0,0 +1,44 @@
+import json
+import os
+import numpy as np
+import pytest
+from neural_synth_modeler.inferencer.dexed.models.ddx7.data_utils.h5_dataset import h5RowDataset
+from neural_synth_modeler.train.dexed.train_ddx7 import load_dataset
+from neural_synth_modeler.train.synthetic import generate
+from neural_synth_modeler.train.vital.datasets import VitalFeatureShardDataset
+
+
+def test_vital_shards(tmp_path):
+    index = generate("vital", str(tmp_path / "a"), 5, shard_size=3, seed=7)
+    assert index["stats"]["rendered_clips"] == 5
+
+    dataset = VitalFeatureShardDataset(str(tmp_path / "a"))
+    y, mfcc, pitch, loudness, times, onset_frames = dataset[4]
+    assert len(dataset) == 5 and y.shape == (64000,) and onset_frames.tolist() == [0]
+    assert np.isfinite(y.numpy()).all() and y.abs().max() > 0
+    assert np.load(tmp_path / "a" / "shard_0001" / "wavetables.npy").shape == (2, 10, 512)
+
+    # the same seed renders the same clips; existing shards are skipped on a rerun
+    generate("vital", str(tmp_path / "b"), 5, shard_size=3, seed=7)
+    assert np.array_equal(np.load(tmp_path / "a" / "shard_0000" / "y.npy"),
+                          np.load(tmp_path / "b" / "shard_0000" / "y.npy"))
+    assert generate("vital", str(tmp_path / "a"), 5, shard_size=3, seed=7)["stats"]["rendered_clips"] == 0
+    # a rerun with other settings would mix two datasets
+    for kwargs in [dict(shard_size=3, seed=8), dict(shard_size=2, seed=7)]:
+        with pytest.raises(ValueError, match="other settings"):
+            generate("vital", str(tmp_path / "a"), 5, **kwargs)
+    with pytest.raises(ValueError, match="synth: vital != dexed"):
+        generate("dexed", str(tmp_path / "a"), 5, shard_size=3, seed=7)
+
+
+def test_dexed_shards(tmp_path):
+    generate("dexed", str(tmp_path), 3, shard_size=2)
+    with open(tmp_path / "index.json") as f:
+        assert [s["rows"] for s in json.load(f)["shards"]] == [2, 1]
+
+    dataset = h5RowDataset(16000, os.path.join(tmp_path, "shard_0001.h5"), ["audio", "f0", "loudness", "rms"])
+    x = dataset[0]
+    assert x["audio"].shape == (64000, 1) and x["f0"].shape == (1000, 1)
+    assert x["audio"].abs().max() > 0
+    # train_ddx7 trains on the whole directory
+    assert len(load_dataset(str(tmp_path), 16000)) == 3
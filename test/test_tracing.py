@@ -0,0 +1,36 @@
+import time
+from neural_synth_modeler.utils.tracing import Tracer, trace
+
+
+def test_tracer_collects_stages():
+    with trace("outside"):      # no active tracer, must be a no-op
+        pass
+
+    with Tracer("test") as tracer:
+        for _ in range(2):
+            with trace("pitch"):
+                pass
+        with trace("mfcc"):
+            pass
+
+    timings = tracer.as_dict()
+    assert list(timings["stages"]) == ["pitch", "mfcc"]
+    assert len(tracer.spans) == 3
+    assert timings["total"] >= sum(timings["stages"].values())
+    assert tracer.server_timing().startswith("pitch;dur=")
+
+
+def test_nested_stages_report_self_time():
+    with Tracer("test") as tracer:
+        with trace("model_forward"):
+            time.sleep(0.02)
+            for _ in range(2):
+                with trace("adsr"):
+                    time.sleep(0.05)
+
+    forward, adsr, _ = tracer.spans
+    assert adsr[3] == 0 and forward[3] is None
+    stages = tracer.stages()
+    assert 0.1 <= stages["adsr"] < 0.15
+    assert 0.02 <= stages["model_forward"] < 0.05
+    assert abs(sum(stages.values()) - forward[2]) < 1e-9
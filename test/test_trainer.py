@@ -0,0 +1,62 @@
+import os
+import warnings
+import pytest
+import torch
+import yaml
+from neural_synth_modeler.benchmark.loader_benchmark import write_synthetic_dataset
+from neural_synth_modeler.train.vital.datasets import VitalFeatureShardDataset, pack_features
+from neural_synth_modeler.train.vital.trainer import Trainer, build_model, collate_batch, make_loader
+
+with open("neural_synth_modeler/inferencer/vital/config.yaml") as f:
+    config = yaml.safe_load(f)
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp("vital_train")
+    write_synthetic_dataset(tmp_path / "audio", tmp_path / "params", 4)
+    pack_features(tmp_path / "audio", tmp_path / "params", tmp_path / "shards")
+    return VitalFeatureShardDataset(tmp_path / "shards")
+
+
+def test_grad_accumulation_and_schedule(dataset):
+    torch.manual_seed(0)
+    model = build_model(config, "cpu")
+    train_config = dict(config["train"], grad_accum_steps=2, start_lr=1e-3, stop_lr=1e-4, decay_over=1)
+    trainer = Trainer(model, make_loader(dataset, 2, shuffle=True), train_config=train_config)
+    before = [p.detach().clone() for p in model.parameters()]
+
+    stats = trainer.train_epoch()
+    assert trainer.step == 1 and stats["lr"] == pytest.approx(1e-3)
+    assert stats["samples_per_sec"] > 0 and stats["steps_per_sec"] > 0
+    assert any(not torch.equal(b, p) for b, p in zip(before, model.parameters()))
+
+    # decay_over is reached after the first epoch's optimizer step
+    assert trainer.train_epoch()["lr"] == pytest.approx(1e-4)
+
+
+def test_bf16_step(dataset):
+    trainer = Trainer(build_model(config, "cpu"), make_loader(dataset, 2), train_config=dict(config["train"], precision="bf16"))
+    loss, batch_size = trainer.compute_loss(next(iter(trainer.train_loader)))
+    assert loss.dtype == torch.float32 and batch_size == 2 and torch.isfinite(loss)
+
+
+def test_invalid_configs(dataset):
+    with pytest.raises(ValueError):
+        make_loader(dataset, 1)
+    with pytest.raises(ValueError):
+        Trainer(build_model(config, "cpu"), make_loader(dataset, 2), train_config={"precision": "fp16"})
+
+
+def test_collate_warns_on_mixed_onsets(dataset):
+    """
+    a batch shares one time grid and onset list, samples with other onsets are not trained on silently
+    """
+    samples = [dataset[0], dataset[1]]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        collate_batch([samples[0], samples[0]])
+    shifted = list(samples[0])
+    shifted[5] = torch.as_tensor(shifted[5]) + 1
+    with pytest.warns(UserWarning, match="onset_frames"):
+        assert torch.equal(collate_batch([samples[0], tuple(shifted)])[5], torch.as_tensor(samples[0][5]))
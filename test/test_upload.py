@@ -0,0 +1,68 @@
+import io
+import numpy as np
+import pytest
+import soundfile as sf
+from neural_synth_modeler.utils.audio import decode_audio, probe_duration
+
+pytest.importorskip("httpx")
+from starlette.testclient import TestClient
+from neural_synth_modeler import upload
+from neural_synth_modeler.upload import MAX_DURATION_SECS, upload_app
+
+
+def encode(duration_secs, fmt="WAV", sr=44100, channels=2):
+    buffer = io.BytesIO()
+    sf.write(buffer, np.zeros((int(sr * duration_secs), channels), dtype=np.float32), sr, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["WAV", "FLAC"])
+def test_probe_duration_from_header(fmt):
+    assert probe_duration(encode(10, fmt)[:64 * 1024]) == pytest.approx(10)
+
+
+def test_decode_audio_mono_float32():
+    y, sr = decode_audio(io.BytesIO(encode(1.5, "FLAC")))
+    assert sr == 44100 and y.dtype == np.float32 and y.shape == (66150,)
+
+
+def test_upload_rejections():
+    client = TestClient(upload_app)
+    too_long = client.post("/predict", content=encode(MAX_DURATION_SECS + 10), headers={"Content-Type": "audio/wav"})
+    assert too_long.status_code == 413
+    assert client.post("/predict", content=b"not audio", headers={"Content-Type": "text/plain"}).status_code == 415
+    assert client.post("/predict", content=b"not audio" * 100, headers={"Content-Type": "audio/wav"}).status_code == 415
+    missing_field = client.post("/predict", files={"file": ("clip.wav", encode(1), "audio/wav")})
+    assert missing_field.status_code == 400
+    unknown_synth = client.post("/predict?synth=serum", content=encode(1), headers={"Content-Type": "audio/wav"})
+    assert unknown_synth.status_code == 400
+
+
+def test_upload_size_limits(monkeypatch):
+    monkeypatch.setattr(upload, "MAX_UPLOAD_BYTES", 100 * 1024)
+    client = TestClient(upload_app)
+    boundary = "nsm-boundary"
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"audio\"; filename=\"clip.wav\"\r\n"
+            f"Content-Type: audio/wav\r\n\r\n").encode() + encode(2) + f"\r\n--{boundary}--\r\n".encode()
+
+    def chunked():
+        for start in range(0, len(body), 16 * 1024):
+            yield body[start:start + 16 * 1024]
+
+    # no Content-Length: the multipart body is capped while it streams
+    response = client.post("/predict", content=chunked(),
+                           headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+    invalid_length = client.post("/predict", content=encode(1), headers={"Content-Type": "audio/wav",
+                                                                         "Content-Length": "abc"})
+    assert invalid_length.status_code == 400
+
+
+def test_dexed_rejects_long_audio():
+    """
+    Dexed converts 4s clips, a longer upload is rejected instead of silently cut
+    """
+    client = TestClient(upload_app)
+    response = client.post("/predict?synth=dexed&eval_level=off&pitch_backend=yin", content=encode(6, sr=16000),
+                           headers={"Content-Type": "audio/wav"})
+    assert response.status_code == 413 and "4s" in response.text